@@ -11,9 +11,15 @@ import logging
 from logging.handlers import RotatingFileHandler
 from app.utils.errors import register_error_handlers
 from app.services.cache_service import init_cache
+from app.services.email_service import mail
+from app.services.email_queue import email_queue
+from app.services.notification_broker import broker as notification_broker
+from app.services.user_cache import load_cached_user
 from app.utils.rate_limit import init_limiter
 from app.utils.monitoring import monitoring_bp
 from app.utils.filters import init_filters
+from app.utils.requests import EndpointLimitedRequest
+from app.utils.commands import register_commands
 
 login_manager = LoginManager()
 csrf = CSRFProtect()
@@ -23,11 +29,12 @@ def load_user(user_id):
     """Load user by ID."""
     if not hasattr(g, 'db_service'):
         g.db_service = DatabaseService()
-    return g.db_service.get_user_by_id(user_id)
+    return load_cached_user(user_id, g.db_service.get_user_by_id)
 
 def create_app(config_name=None):
     """Create and configure the Flask application."""
     app = Flask(__name__)
+    app.request_class = EndpointLimitedRequest
     
     # Load configuration
     if config_name is None:
@@ -87,6 +94,13 @@ def create_app(config_name=None):
     # Initialize caching
     init_cache(app)
     
+    # Initialize mail and the outbound email queue
+    mail.init_app(app)
+    email_queue.init_app(app)
+    
+    # Initialize notification push
+    notification_broker.configure(app)
+    
     # Initialize rate limiting
     init_limiter(app)
     
@@ -113,6 +127,9 @@ def create_app(config_name=None):
     # Register error handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     @app.before_request
     def before_request():
         """Set up request context"""
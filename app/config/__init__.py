@@ -31,6 +31,17 @@ class BaseConfig:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_MAX_EMAILS = int(os.environ.get('MAIL_MAX_EMAILS', 50))  # Messages per SMTP connection
+    APP_BASE_URL = os.environ.get('APP_BASE_URL', os.environ.get('RENDER_EXTERNAL_URL', ''))
+    
+    # Outbound email queue
+    EMAIL_SPOOL_DIR = os.environ.get('EMAIL_SPOOL_DIR')  # Defaults to <instance>/mail_spool
+    EMAIL_QUEUE_SIZE = 1000
+    EMAIL_QUEUE_WORKERS = 2
+    EMAIL_MAX_ATTEMPTS = 5
+    EMAIL_RETRY_BASE_DELAY = 30
+    EMAIL_RETRY_MAX_DELAY = 1800
+    EMAIL_DEDUP_TTL = 86400
     
     # Rate limiting
     RATELIMIT_DEFAULT = "100/hour"
@@ -46,4 +57,51 @@ class BaseConfig:
     
     # File upload configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'} 
\ No newline at end of file
+    # Bulk enrollment archives hold thousands of photos
+    BULK_ENROLL_MAX_ARCHIVE_MB = int(os.environ.get('BULK_ENROLL_MAX_ARCHIVE_MB', 512))
+    MAX_CONTENT_LENGTH_BY_ENDPOINT = {
+        'recognition.register_bulk': BULK_ENROLL_MAX_ARCHIVE_MB * 1024 * 1024
+    }
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    
+    # Bulk face enrollment
+    BULK_ENROLL_WORKERS = int(os.environ.get('BULK_ENROLL_WORKERS', 8))
+    BULK_ENROLL_REKOGNITION_CONCURRENCY = int(os.environ.get('BULK_ENROLL_REKOGNITION_CONCURRENCY', 4))
+    BULK_ENROLL_BATCH_SIZE = 200
+    BULK_ENROLL_HEARTBEAT_SECONDS = 30
+    # Running jobs without a heartbeat for this long are treated as dead
+    BULK_ENROLL_STALE_SECONDS = 300
+    
+    # Dashboard
+    DASHBOARD_DEADLINE_SECONDS = 5
+    
+    # Bulk attendance changes matching more records than this run in the background
+    BULK_ATTENDANCE_SYNC_LIMIT = 500
+    
+    # Two-tier cache: per-worker LRU in front of the shared cache
+    CACHE_LOCAL_SIZE = 2048
+    CACHE_LOCAL_TTL = 30
+    CACHE_INVALIDATION_CHANNEL = 'cache-invalidation'
+    CACHE_TTL_JITTER = 0.1
+    CACHE_LOCK_TIMEOUT = 10
+    
+    # Cached user loader
+    USER_CACHE_TTL = 300
+    
+    # Low attendance alerts
+    LOW_ATTENDANCE_THRESHOLD = 75
+    LOW_ATTENDANCE_MIN_DAYS = 5  # Recorded days before a student can be alerted
+    LOW_ATTENDANCE_WINDOW_MONTHS = 3
+    LOW_ATTENDANCE_ALERT_WORKERS = 4
+    
+    # Notification streams (server-sent events)
+    NOTIFICATION_CHANNEL_PREFIX = 'notifications'
+    # Events reach streams in other processes (workers, crons) only through Redis;
+    # falls back to CACHE_REDIS_URL when the cache runs on Redis
+    NOTIFICATION_REDIS_URL = os.environ.get('NOTIFICATION_REDIS_URL')
+    # Per process. Each open stream holds one gunicorn thread for up to
+    # NOTIFICATION_STREAM_MAX_AGE seconds, so with --threads 8 two streams
+    # leave six threads for requests; further clients poll instead
+    NOTIFICATION_STREAM_MAX_CONNECTIONS = 2
+    NOTIFICATION_STREAM_HEARTBEAT = 15
+    NOTIFICATION_STREAM_MAX_AGE = 300
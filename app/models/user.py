@@ -36,11 +36,11 @@ class User(UserMixin):
     
     def can_access_subject(self, subject_id):
         """Check if user can access a subject"""
-        from app.services.firebase_service import get_user_subjects
+        from app.services.subject_cache import subject_exists
         
         try:
-            subjects = get_user_subjects(self.id)
-            return any(subject.get('id') == subject_id for subject in subjects)
+            # All users can see all subjects; this is an in-memory lookup
+            return subject_exists(subject_id)
         except Exception:
             return False
     
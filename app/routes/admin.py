@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, send_file
 from flask_login import login_required, current_user
 from app.services.db_service import DatabaseService
+from app.services.user_cache import invalidate_user
+from app.services.cache_service import invalidate_cache
+from app.services.subject_cache import get_subjects as get_cached_subjects, invalidate_subjects
 from app.utils.decorators import role_required
 from functools import wraps
 from werkzeug.security import generate_password_hash
@@ -11,6 +14,7 @@ import firebase_admin
 from firebase_admin import auth
 from firebase_admin import firestore
 import os
+import threading
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -72,6 +76,7 @@ def manage_subjects():
             }
             
             doc_ref = current_app.db.collection('subjects').add(subject_data)
+            invalidate_subjects()
             return jsonify({
                 'message': 'Subject added successfully',
                 'id': doc_ref[1].id
@@ -131,6 +136,7 @@ def delete_subject(subject_id):
     """Delete a subject"""
     try:
         current_app.db.collection("subjects").document(subject_id).delete()
+        invalidate_subjects()
         return {'message': 'Subject deleted successfully'}, 200
     except Exception as e:
         return {'error': str(e)}, 500
@@ -201,10 +207,13 @@ def update_student(student_id):
             'student_id': student_id_new,
             'class': class_num,
             'division': division,
+            'class_id': f"{class_num}-{division}",
             'updated_at': datetime.utcnow().isoformat()
         }
         
         student_ref.update(update_data)
+        invalidate_user(student_id)
+        invalidate_cache('students')
         current_app.logger.info(f"Successfully updated student {student_id}")
         return jsonify({'message': 'Student updated successfully.'}), 200
         
@@ -261,6 +270,7 @@ def create_student():
             'student_id': student_id,
             'class': class_num,
             'division': division,
+            'class_id': f"{class_num}-{division}",
             'role': 'student',
             'created_at': datetime.utcnow().isoformat()
         }
@@ -268,6 +278,7 @@ def create_student():
         # Add to database
         doc_ref = current_app.db.collection('users').add(student_data)
         current_app.logger.info(f"Created student with ID: {doc_ref[1].id}")
+        invalidate_cache('students')
         
         return jsonify({'message': 'Student created successfully', 'id': doc_ref[1].id}), 201
         
@@ -491,6 +502,9 @@ def update_user(user_id):
         
         # Update Firestore document
         doc_ref.update(update_data)
+        invalidate_user(user_id)
+        if 'student' in (data['role'], current_data.get('role')):
+            invalidate_cache('students')
         
         return jsonify({'message': 'User updated successfully'})
         
@@ -511,6 +525,8 @@ def delete_user(user_id):
         
         # Delete user
         doc_ref.delete()
+        invalidate_user(user_id)
+        invalidate_cache('students')
         
         return jsonify({'message': 'User deleted successfully'})
         
@@ -523,18 +539,14 @@ def delete_user(user_id):
 def list_subjects():
     """List all subjects with their class associations"""
     try:
-        subjects_ref = current_app.db.collection('subjects')
-        subjects = []
-        
-        for doc in subjects_ref.stream():
-            subject_data = doc.to_dict()
-            subjects.append({
-                'id': doc.id,
-                'name': subject_data.get('name', ''),
-                'class_id': subject_data.get('class_id', '')
-            })
-        
-        return jsonify(subjects)
+        class_id = request.args.get('class_id')
+        subjects, version = get_cached_subjects([class_id] if class_id else None)
+        
+        return _conditional_json([{
+            'id': subject['id'],
+            'name': subject.get('name', ''),
+            'class_id': subject.get('class_id', '')
+        } for subject in subjects], version)
     except Exception as e:
         current_app.logger.error(f"Error listing subjects: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -543,17 +555,22 @@ def list_subjects():
 @login_required
 def get_subjects():
     try:
-        subjects_ref = current_app.db.collection('subjects')
-        subjects = subjects_ref.stream()
-        subject_list = [{'id': doc.id, **doc.to_dict()} for doc in subjects]
+        subject_list, version = get_cached_subjects()
 
         current_app.logger.info(f"Found {len(subject_list)} subjects")
-        return jsonify({'subjects': subject_list}), 200
+        return _conditional_json({'subjects': subject_list}, version)
 
     except Exception as e:
         current_app.logger.error(f"Error getting subjects: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _conditional_json(payload, version):
+    """JSON response tagged with the subjects version, or 304 if the client has it"""
+    response = jsonify(payload)
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 @admin_bp.route('/api/subjects', methods=['POST'])
 @login_required
 @role_required(['admin'])
@@ -575,6 +592,7 @@ def create_subject():
         # Add subject to Firestore
         doc_ref = current_app.db.collection('subjects').document()
         doc_ref.set(subject_data)
+        invalidate_subjects()
 
         return jsonify({
             'message': 'Subject created successfully',
@@ -672,6 +690,7 @@ def update_teacher(teacher_id):
             
         # Update document
         teacher_ref.update(update_data)
+        invalidate_user(teacher_id)
         
         return jsonify({'message': 'Teacher updated successfully'}), 200
         
@@ -698,6 +717,7 @@ def delete_teacher(teacher_id):
             
         # Delete the document
         teacher_ref.delete()
+        invalidate_user(teacher_id)
         
         return jsonify({'message': 'Teacher deleted successfully'}), 200
         
@@ -746,4 +766,115 @@ def register_face_api():
         
     except Exception as e:
         current_app.logger.error(f"Error processing face registration: {str(e)}")
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/api/maintenance/reconcile-faces', methods=['POST'])
+@login_required
+@role_required(['admin'])
+def reconcile_faces():
+    """Run face collection reconciliation and return drift metrics"""
+    try:
+        from app.services.reconciliation_service import FaceReconciliationService
+        
+        data = request.get_json(silent=True) or {}
+        report = FaceReconciliationService(current_app.db).run(
+            dry_run=bool(data.get('dry_run', False)),
+            force=bool(data.get('force', False))
+        )
+        return jsonify(report), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error reconciling faces: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/api/maintenance/finalize-attendance', methods=['POST'])
+@login_required
+@role_required(['admin'])
+def finalize_attendance():
+    """Mark rostered students without a record as ABSENT for a day"""
+    try:
+        from app.services.finalization_service import AttendanceFinalizationService
+        
+        data = request.get_json(silent=True) or {}
+        date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
+        try:
+            datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        summaries = AttendanceFinalizationService(current_app.db, marked_by=current_user.email).finalize_day(
+            date, data.get('class_ids') or None
+        )
+        return jsonify({'date': date, 'classes': summaries}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error finalizing attendance: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _run_low_attendance_alerts(app, run_id, threshold, start_month, end_month, dry_run):
+    """Run a low attendance alert run in the background"""
+    with app.app_context():
+        from app.services.alert_service import ALERT_RUNS_COLLECTION, LowAttendanceAlertService
+        
+        try:
+            LowAttendanceAlertService(app.db, threshold=threshold).run(run_id, start_month, end_month, dry_run=dry_run)
+        except Exception as e:
+            app.logger.error(f"Low attendance alert run {run_id} failed: {str(e)}")
+            app.db.collection(ALERT_RUNS_COLLECTION).document(run_id).update({
+                'status': 'failed',
+                'error': str(e)
+            })
+
+@admin_bp.route('/api/alerts/low-attendance', methods=['POST'])
+@login_required
+@role_required(['admin'])
+def send_low_attendance_alerts():
+    """Start a low attendance alert run"""
+    try:
+        from app.services.alert_service import LowAttendanceAlertService, alert_window
+        
+        data = request.get_json(silent=True) or {}
+        months = int(data.get('months') or current_app.config.get('LOW_ATTENDANCE_WINDOW_MONTHS', 3))
+        threshold = data.get('threshold')
+        if months < 1 or (threshold is not None and not 0 < float(threshold) <= 100):
+            return jsonify({'error': 'months must be positive and threshold between 0 and 100'}), 400
+        threshold = float(threshold) if threshold is not None else None
+        dry_run = bool(data.get('dry_run'))
+        
+        service = LowAttendanceAlertService(current_app.db, threshold=threshold)
+        start_month, end_month = alert_window(months)
+        run_id = service.start_run(start_month, end_month, started_by=current_user.email, dry_run=dry_run)
+        threading.Thread(
+            target=_run_low_attendance_alerts,
+            args=(current_app._get_current_object(), run_id, threshold, start_month, end_month, dry_run),
+            daemon=True
+        ).start()
+        
+        return jsonify({
+            'message': 'Low attendance alert run started',
+            'run_id': run_id,
+            'status_url': url_for('admin.low_attendance_alert_status', run_id=run_id)
+        }), 202
+        
+    except (TypeError, ValueError):
+        return jsonify({'error': 'months and threshold must be numbers'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error starting low attendance alerts: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/api/alerts/low-attendance/<run_id>')
+@login_required
+@role_required(['admin'])
+def low_attendance_alert_status(run_id):
+    """Get progress of a low attendance alert run"""
+    try:
+        from app.services.alert_service import LowAttendanceAlertService
+        
+        run = LowAttendanceAlertService(current_app.db).get_run(run_id)
+        if not run:
+            return jsonify({'error': 'Alert run not found'}), 404
+        return jsonify(run)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting low attendance alert run: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -1,11 +1,27 @@
-from flask import Blueprint, render_template, request, jsonify, current_app, send_file
+from flask import Blueprint, render_template, request, jsonify, current_app, send_file, Response, stream_with_context, url_for
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import pandas as pd
 import io
+import base64
+import csv
+import json
+import tempfile
+import os
+import shutil
+import zipfile
+import threading
+from openpyxl import Workbook
 from app.utils.decorators import role_required
 from app.services.db_service import DatabaseService
 from app.services.rekognition_service import RekognitionService
+from app.services.rollup_service import upsert_daily_attendance, update_record
+from app.services.attendance_import import AttendanceImportService
+from app.services.bulk_attendance_service import BulkAttendanceService
+from app.services.attendance_repository import AttendanceRepository
+from app.services.bitmap_service import student_summary, class_summary
+from app.services.report_engine import get_class_report
+from app.utils.queries import FIRESTORE_IN_LIMIT
 
 attendance_bp = Blueprint('attendance', __name__, url_prefix='/attendance')
 
@@ -16,33 +32,27 @@ def view_attendance():
         # Get filter parameters
         date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
         
-        # Base query
-        query = current_app.db.collection('attendance')
+        repository = AttendanceRepository()
+        student_id = None
+        class_ids = None
         
-        # Apply date filter
-        query = query.where('date', '==', date)
-        
-        # For students, only show their own records
+        # Students only see their own records
         if current_user.role == 'student':
-            query = query.where('student_id', '==', current_user.student_id)
-            
-        # Execute query
-        records = []
-        for doc in query.stream():
-            record = doc.to_dict()
-            record['doc_id'] = doc.id
-            
-            # For teachers, only show their assigned classes
-            if current_user.role == 'teacher':
-                if not hasattr(current_user, 'classes') or not current_user.classes:
-                    current_app.logger.warning(f"Teacher {current_user.email} has no assigned classes")
-                    continue
-                    
-                class_division = f"{record.get('class', '')}-{record.get('division', '')}"
-                if class_division not in current_user.classes:
-                    continue
-                    
-            records.append(record)
+            student_id = getattr(current_user, 'student_id', None)
+            if not student_id:
+                return render_template('attendance/view.html',
+                                     records=[],
+                                     date=date,
+                                     user_role=current_user.role,
+                                     error="Your account has no student ID."), 403
+        
+        # For teachers, only fetch their assigned classes
+        if current_user.role == 'teacher':
+            class_ids = getattr(current_user, 'classes', None) or []
+            if not class_ids:
+                current_app.logger.warning(f"Teacher {current_user.email} has no assigned classes")
+        
+        records = repository.list_by_date(date, student_id=student_id, class_ids=class_ids)
             
         current_app.logger.info(f"Found {len(records)} attendance records for date {date}")
         return render_template('attendance/view.html', 
@@ -96,38 +106,31 @@ def mark_attendance():
             'student_name': student_data.get('name', ''),
             'class': student_class,
             'division': student_division,
+            'class_id': class_division,
             'status': status,
             'date': datetime.now().strftime('%Y-%m-%d'),
             'timestamp': datetime.now().isoformat(),
             'marked_by': current_user.email
         }
         
-        # Check if attendance already exists for today
-        today = datetime.now().strftime('%Y-%m-%d')
-        existing_attendance = current_app.db.collection('attendance').where(
-            'student_id', '==', student_id
-        ).where('date', '==', today).get()
-        
-        if existing_attendance:
-            # Update existing attendance
-            doc = existing_attendance[0]
-            doc.reference.update({
-                'status': status,
-                'timestamp': datetime.now().isoformat(),
-                'marked_by': current_user.email
-            })
+        # Update today's record if one exists, otherwise add a new one
+        doc_id, created = upsert_daily_attendance(attendance_data, {
+            'status': status,
+            'timestamp': datetime.now().isoformat(),
+            'marked_by': current_user.email
+        })
+        
+        if not created:
             current_app.logger.info(f"Updated attendance for student {student_id} in class {class_division}")
             return jsonify({
                 'message': 'Attendance updated successfully',
-                'id': doc.id
+                'id': doc_id
             }), 200
         else:
-            # Add new attendance record
-            doc_ref = current_app.db.collection('attendance').add(attendance_data)
             current_app.logger.info(f"Marked new attendance for student {student_id} in class {class_division}")
             return jsonify({
                 'message': 'Attendance marked successfully',
-                'id': doc_ref[1].id
+                'id': doc_id
             }), 201
         
     except Exception as e:
@@ -145,106 +148,168 @@ def update_attendance(record_id):
         if not status:
             return jsonify({'error': 'Status is required'}), 400
             
-        # Get the attendance record
-        record_ref = current_app.db.collection('attendance').document(record_id)
-        record = record_ref.get()
-        
-        if not record.exists:
-            return jsonify({'error': 'Attendance record not found'}), 404
-            
-        record_data = record.to_dict()
-        
-        # For teachers, validate they have access to this class
-        if current_user.role == 'teacher' and record_data['subject_id'] not in current_user.classes:
-            return jsonify({'error': 'You are not authorized to update attendance for this class'}), 403
-            
-        # Update the record
-        record_ref.update({
+        update_data = {
             'status': status,
             'updated_at': datetime.now().isoformat(),
             'updated_by': current_user.email
-        })
+        }
+        
+        def apply(record_data):
+            if record_data is None:
+                raise LookupError('Attendance record not found')
+            # For teachers, validate they have access to this class
+            if current_user.role == 'teacher' and record_data.get('subject_id') not in current_user.classes:
+                raise PermissionError('You are not authorized to update attendance for this class')
+            return {**record_data, **update_data}
+        
+        # Read and update the record, its rollups and bitmap in one transaction
+        record_ref = current_app.db.collection('attendance').document(record_id)
+        update_record(current_app.db, record_ref, apply)
         
         return jsonify({'message': 'Attendance updated successfully'}), 200
         
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
         current_app.logger.error(f"Error updating attendance: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+CURSOR_FIELDS = ['date', 'timestamp']
+
+def _build_attendance_query(args):
+    """Build the filtered, ordered attendance query for the request arguments
+
+    Raises:
+        ValueError: If a custom date range is malformed
+    """
+    date_range = args.get('date_range', 'today')
+    date_from = args.get('date_from')
+    date_to = args.get('date_to')
+    status = args.get('status')
+
+    # Build query
+    query = AttendanceRepository().query()
+    
+    # For students, only show their own records
+    if current_user.role == 'student':
+        query = query.where('student_id', '==', current_user.student_id)
+    
+    # Apply filters
+    if status:
+        query = query.where('status', '==', status)
+
+    # Date range filter
+    today = datetime.now().date()
+    if date_range == 'today':
+        query = query.where('date', '==', today.strftime('%Y-%m-%d'))
+    elif date_range == 'week':
+        start_of_week = today - timedelta(days=today.weekday())
+        end_of_week = start_of_week + timedelta(days=7)
+        query = query.where('date', '>=', start_of_week.strftime('%Y-%m-%d'))
+        query = query.where('date', '<', end_of_week.strftime('%Y-%m-%d'))
+    elif date_range == 'month':
+        start_of_month = today.replace(day=1)
+        if today.month == 12:
+            end_of_month = today.replace(year=today.year + 1, month=1, day=1)
+        else:
+            end_of_month = today.replace(month=today.month + 1, day=1)
+        query = query.where('date', '>=', start_of_month.strftime('%Y-%m-%d'))
+        query = query.where('date', '<', end_of_month.strftime('%Y-%m-%d'))
+    elif date_range == 'custom' and date_from and date_to:
+        from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+        to_date = datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1)
+        query = query.where('date', '>=', from_date.strftime('%Y-%m-%d'))
+        query = query.where('date', '<', to_date.strftime('%Y-%m-%d'))
+    elif date_range != 'all':  # Default to today if no valid date range is specified
+        query = query.where('date', '==', today.strftime('%Y-%m-%d'))
+
+    # Always order by date and timestamp, with the document ID as tie-breaker
+    return AttendanceRepository.order_for_listing(query)
+
+def _encode_cursor(record):
+    """Encode the keyset position of a record as an opaque cursor"""
+    position = {field: record.get(field) for field in CURSOR_FIELDS}
+    position['doc_id'] = record['doc_id']
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decode an opaque cursor into start_after values for the ordered query"""
+    position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    values = {field: position[field] for field in CURSOR_FIELDS}
+    values['__name__'] = AttendanceRepository().document(position['doc_id'])
+    return values
+
+def _fetch_attendance_page(query, page_size, cursor=None, fields=None):
+    """Fetch one page of records after the cursor and the cursor of the next page"""
+    if fields:
+        # The cursor fields are always needed to build next_cursor
+        fields = sorted(set(fields) | set(CURSOR_FIELDS))
+    if cursor:
+        query = query.start_after(_decode_cursor(cursor))
+    # Fetch one extra record to know whether another page exists
+    query = query.limit(page_size + 1)
+
+    # For teachers, only fetch their assigned classes
+    class_ids = current_user.classes if current_user.role == 'teacher' else None
+    records = list(AttendanceRepository().stream('page', query, class_ids, fields))
+    
+    # Chunked class queries are each ordered; restore the global order
+    if class_ids is not None and len(class_ids) > FIRESTORE_IN_LIMIT:
+        AttendanceRepository.sort_for_listing(records)
+
+    next_cursor = None
+    if len(records) > page_size:
+        records = records[:page_size]
+        next_cursor = _encode_cursor(records[-1])
+    return records, next_cursor
+
 @attendance_bp.route('/api/attendance')
 @login_required
 def get_attendance():
-    """Get attendance records with filters"""
-    try:
-        date_range = request.args.get('date_range', 'today')
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        status = request.args.get('status')
-        search = request.args.get('search')
+    """Get attendance records with filters
 
-        # Build query
-        query = current_app.db.collection('attendance')
+    Passing ``page_size`` or ``cursor`` returns one page as
+    ``{"records": [...], "next_cursor": ...}``; ``fields`` limits the
+    returned fields. Without them the full result is returned as a list.
+    """
+    try:
+        try:
+            query = _build_attendance_query(request.args)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
         
-        # For students, only show their own records
-        if current_user.role == 'student':
-            query = query.where('student_id', '==', current_user.student_id)
-        
-        # Apply filters
-        if status:
-            query = query.where('status', '==', status)
-
-        # Date range filter
-        today = datetime.now().date()
-        if date_range == 'today':
-            query = query.where('date', '==', today.strftime('%Y-%m-%d'))
-        elif date_range == 'week':
-            start_of_week = today - timedelta(days=today.weekday())
-            end_of_week = start_of_week + timedelta(days=7)
-            query = query.where('date', '>=', start_of_week.strftime('%Y-%m-%d'))
-            query = query.where('date', '<', end_of_week.strftime('%Y-%m-%d'))
-        elif date_range == 'month':
-            start_of_month = today.replace(day=1)
-            if today.month == 12:
-                end_of_month = today.replace(year=today.year + 1, month=1, day=1)
-            else:
-                end_of_month = today.replace(month=today.month + 1, day=1)
-            query = query.where('date', '>=', start_of_month.strftime('%Y-%m-%d'))
-            query = query.where('date', '<', end_of_month.strftime('%Y-%m-%d'))
-        elif date_range == 'custom' and date_from and date_to:
+        cursor = request.args.get('cursor')
+        page_size = request.args.get('page_size', type=int)
+        paginated = bool(page_size or cursor)
+        
+        if current_user.role == 'teacher' and not getattr(current_user, 'classes', None):
+            current_app.logger.warning(f"Teacher {current_user.email} has no assigned classes")
+            return jsonify({'records': [], 'next_cursor': None} if paginated else [])
+        
+        if paginated:
+            page_size = max(1, min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+            fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
             try:
-                from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-                to_date = datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1)
-                query = query.where('date', '>=', from_date.strftime('%Y-%m-%d'))
-                query = query.where('date', '<', to_date.strftime('%Y-%m-%d'))
-            except ValueError:
-                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
-        elif date_range != 'all':  # Default to today if no valid date range is specified
-            query = query.where('date', '==', today.strftime('%Y-%m-%d'))
-
-        # Always order by date and timestamp
-        query = query.order_by('date', direction='DESCENDING')
-        query = query.order_by('timestamp', direction='DESCENDING')
-        
-        # Execute query and format results
-        records = []
-        docs = list(query.stream())
-        current_app.logger.info(f"Found {len(docs)} records before filtering")
-
-        for doc in docs:
-            record = doc.to_dict()
-            record['doc_id'] = doc.id
-            
-            # For teachers, only show their assigned classes
-            if current_user.role == 'teacher':
-                if not hasattr(current_user, 'classes') or not current_user.classes:
-                    current_app.logger.warning(f"Teacher {current_user.email} has no assigned classes")
-                    continue
-                    
-                class_division = f"{record.get('class', '')}-{record.get('division', '')}"
-                if class_division not in current_user.classes:
-                    continue
-            
-            records.append(record)
+                records, next_cursor = _fetch_attendance_page(query, page_size, cursor, fields)
+            except (ValueError, KeyError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            return jsonify({
+                'records': records,
+                'next_cursor': next_cursor,
+                'page_size': page_size
+            })
+        
+        # For teachers, only fetch their assigned classes
+        class_ids = current_user.classes if current_user.role == 'teacher' else None
+        records = list(AttendanceRepository().stream('list', query, class_ids))
+        
+        # Chunked class queries are each ordered; restore the global order
+        if class_ids is not None and len(class_ids) > FIRESTORE_IN_LIMIT:
+            AttendanceRepository.sort_for_listing(records)
         
         current_app.logger.info(f"Returning {len(records)} records after all filters")
         return jsonify(records)
@@ -264,19 +329,9 @@ def bulk_update_attendance():
         if not doc_id:
             return jsonify({'error': 'Missing doc_id'}), 400
                 
-        # Verify permissions
-        doc_ref = current_app.db.collection('attendance').document(doc_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            return jsonify({'error': 'Record not found'}), 404
-                
-        doc_data = doc.to_dict()
-        if current_user.role == 'teacher':
-            # Teachers can only update status
-            if set(data.keys()) - {'status'}:
-                return jsonify({'error': 'Teachers can only update attendance status'}), 403
-            if doc_data.get('subject_id') not in current_user.classes:
-                return jsonify({'error': 'Unauthorized to update this record'}), 403
+        # Teachers can only update status
+        if current_user.role == 'teacher' and set(data.keys()) - {'status'}:
+            return jsonify({'error': 'Teachers can only update attendance status'}), 403
             
         # Add metadata
         data.update({
@@ -284,9 +339,21 @@ def bulk_update_attendance():
             'updated_by': current_user.id
         })
         
-        # Update record
-        doc_ref.update(data)
+        def apply(doc_data):
+            if doc_data is None:
+                raise LookupError('Record not found')
+            if current_user.role == 'teacher' and doc_data.get('subject_id') not in current_user.classes:
+                raise PermissionError('Unauthorized to update this record')
+            return {**doc_data, **data}
+        
+        # Read and update the record, its rollups and bitmap in one transaction
+        doc_ref = current_app.db.collection('attendance').document(doc_id)
+        update_record(current_app.db, doc_ref, apply)
         return jsonify({'message': 'Record updated successfully'})
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
         current_app.logger.error(f"Error updating attendance: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -296,12 +363,118 @@ def bulk_update_attendance():
 def delete_attendance(doc_id):
     """Delete an attendance record"""
     try:
+        def apply(record):
+            if record is None:
+                raise LookupError('Record not found')
+            return None
+        
+        # Delete the record and update its rollups and bitmap in one transaction
         doc_ref = current_app.db.collection('attendance').document(doc_id)
-        doc_ref.delete()
+        update_record(current_app.db, doc_ref, apply)
         return jsonify({'message': 'Record deleted successfully'})
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         current_app.logger.error(f"Error deleting attendance: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+def _run_bulk_attendance_job(app, job_id, role, classes, user_id, filters, fields, delete):
+    """Run a filtered bulk change in the background"""
+    with app.app_context():
+        try:
+            BulkAttendanceService(app.db, role, classes, user_id).run_job(job_id, filters, fields, delete)
+        except Exception as e:
+            app.logger.error(f"Bulk attendance job {job_id} failed: {str(e)}")
+            app.db.collection('attendance_bulk_jobs').document(job_id).set({
+                'status': 'failed',
+                'error': str(e)
+            }, merge=True)
+
+def _bulk_change(delete):
+    """Validate a bulk request once, then apply it inline or start a background job"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    doc_ids = data.get('doc_ids')
+    filters = data.get('filters')
+    fields = None if delete else data.get('fields')
+    
+    if bool(doc_ids) == bool(filters):
+        return jsonify({'error': 'Provide either doc_ids or filters'}), 400
+    if doc_ids is not None and (not isinstance(doc_ids, list)
+                                or not all(isinstance(doc_id, str) and doc_id for doc_id in doc_ids)):
+        return jsonify({'error': 'doc_ids must be a list of IDs'}), 400
+    
+    service = BulkAttendanceService(
+        current_app.db,
+        current_user.role,
+        classes=getattr(current_user, 'classes', None),
+        user_id=current_user.id
+    )
+    try:
+        if not delete:
+            service.validate_update(fields)
+        if filters:
+            service.validate_filter(filters)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if filters:
+        filters = {key: filters[key] for key in ('class_id', 'start_date', 'end_date')}
+        matches = service.count_matches(filters)
+        if matches > current_app.config.get('BULK_ATTENDANCE_SYNC_LIMIT', 500):
+            job_id = service.start_job(filters, fields, delete, started_by=current_user.email)
+            threading.Thread(
+                target=_run_bulk_attendance_job,
+                args=(current_app._get_current_object(), job_id, current_user.role,
+                      list(getattr(current_user, 'classes', None) or []), current_user.id,
+                      filters, fields, delete),
+                daemon=True
+            ).start()
+            return jsonify({
+                'message': f'Bulk change of {matches} records started',
+                'job_id': job_id,
+                'status_url': url_for('attendance.bulk_attendance_status', job_id=job_id)
+            }), 202
+    
+    summary = service.apply(doc_ids=doc_ids, filters=filters, fields=fields, delete=delete)
+    return jsonify({'message': 'Bulk change completed', **summary})
+
+@attendance_bp.route('/api/attendance/bulk/update', methods=['POST'])
+@role_required(['admin', 'teacher'])
+def bulk_update_records():
+    """Apply the same update to records given by ID or by class and date range"""
+    try:
+        return _bulk_change(delete=False)
+    except Exception as e:
+        current_app.logger.error(f"Error bulk updating attendance: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@attendance_bp.route('/api/attendance/bulk/delete', methods=['POST'])
+@role_required(['admin'])
+def bulk_delete_records():
+    """Delete records given by ID or by class and date range"""
+    try:
+        return _bulk_change(delete=True)
+    except Exception as e:
+        current_app.logger.error(f"Error bulk deleting attendance: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@attendance_bp.route('/api/attendance/bulk/<job_id>', methods=['GET'])
+@role_required(['admin', 'teacher'])
+def bulk_attendance_status(job_id):
+    """Get the status and summary of a background bulk change"""
+    try:
+        job = BulkAttendanceService(current_app.db, current_user.role).get_job(job_id)
+        if not job or (current_user.role == 'teacher' and job.get('started_by') != current_user.email):
+            return jsonify({'error': 'Bulk job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        current_app.logger.error(f"Error getting bulk attendance status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @attendance_bp.route('/api/attendance/template')
 @role_required(['admin', 'teacher'])
 def download_template():
@@ -328,33 +501,233 @@ def download_template():
         download_name='attendance_template.xlsx'
     )
 
+EXPORT_COLUMNS = [
+    'doc_id', 'date', 'timestamp', 'student_id', 'student_name', 'class', 'division',
+    'class_id', 'status', 'subject_id', 'subject_name', 'marked_by', 'confidence'
+]
+EXPORT_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def _iter_attendance_records(query):
+    """Yield every record of the query, reading one page at a time"""
+    cursor = None
+    while True:
+        records, cursor = _fetch_attendance_page(query, EXPORT_PAGE_SIZE, cursor)
+        yield from records
+        if not cursor:
+            break
+
+def _export_row(record):
+    """Flatten a record into the export column order"""
+    return ['' if record.get(column) is None else record.get(column) for column in EXPORT_COLUMNS]
+
+def _stream_csv(query):
+    """Stream the records as CSV, one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for record in _iter_attendance_records(query):
+        writer.writerow(_export_row(record))
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _columnar_archive(query, export_format):
+    """Write month-partitioned Parquet/Arrow files and zip them into a temp file"""
+    from app.services.columnar_export import write_partitioned
+
+    work_dir = tempfile.mkdtemp(prefix='attendance_export_')
+    try:
+        paths = write_partitioned(_iter_attendance_records(query), work_dir, export_format)
+        output = tempfile.TemporaryFile()
+        # Partition files are already compressed, so store them as-is
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+            for path in paths:
+                archive.write(path, os.path.relpath(path, work_dir))
+        return output
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _stream_file(file_obj):
+    """Stream a file in fixed-size chunks and close it afterwards"""
+    try:
+        file_obj.seek(0)
+        for chunk in iter(lambda: file_obj.read(EXPORT_CHUNK_SIZE), b''):
+            yield chunk
+    finally:
+        file_obj.close()
+
 @attendance_bp.route('/api/attendance/export')
 @login_required
 def export_attendance():
-    """Export attendance records to Excel"""
-    # Reuse get_attendance logic to get filtered records
-    response = get_attendance()
-    if isinstance(response, tuple):
-        return response
+    """Export attendance records to Excel, CSV, Parquet or Arrow
+
+    Records are paged out of Firestore and written row by row, so memory
+    stays flat regardless of the date range. ``format=csv`` streams rows as
+    they are read; the default XLSX is written with a write-only workbook to
+    a temporary file and streamed from there. ``format=parquet`` and
+    ``format=arrow`` return a zip of ``month=YYYY-MM`` partitions with a
+    typed schema for analytics tools.
+    """
+    try:
+        query = _build_attendance_query(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    records = response.get_json()
+    if current_user.role == 'teacher' and not getattr(current_user, 'classes', None):
+        return jsonify({'error': 'No classes assigned to your account'}), 403
     
-    # Convert to DataFrame
-    df = pd.DataFrame(records)
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format == 'csv':
+        return Response(
+            stream_with_context(_stream_csv(query)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=attendance_export.csv'}
+        )
     
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    output.seek(0)
+    if export_format in ('parquet', 'arrow'):
+        try:
+            output = _columnar_archive(query, export_format)
+        except ImportError:
+            return jsonify({'error': 'Columnar export requires pyarrow to be installed'}), 501
+        except Exception as e:
+            current_app.logger.error(f"Error exporting attendance: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+        
+        return Response(
+            _stream_file(output),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=attendance_export_{export_format}.zip'}
+        )
     
-    return send_file(
-        output,
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Attendance')
+        sheet.append(EXPORT_COLUMNS)
+        for record in _iter_attendance_records(query):
+            sheet.append(_export_row(record))
+        
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+    except Exception as e:
+        current_app.logger.error(f"Error exporting attendance: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    return Response(
+        _stream_file(output),
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name='attendance_export.xlsx'
+        headers={'Content-Disposition': 'attachment; filename=attendance_export.xlsx'}
     )
 
+@attendance_bp.route('/api/attendance/summary/student/<student_id>')
+@login_required
+def student_attendance_summary(student_id):
+    """Attendance percentage and streaks of a student from monthly bitmaps
+
+    ``start`` and ``end`` are months (YYYY-MM) and default to the current one.
+    """
+    try:
+        if current_user.role == 'student' and current_user.student_id != student_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        current_month = datetime.now().strftime('%Y-%m')
+        start = request.args.get('start', current_month)
+        end = request.args.get('end', current_month)
+        try:
+            datetime.strptime(start, '%Y-%m')
+            datetime.strptime(end, '%Y-%m')
+        except ValueError:
+            return jsonify({'error': 'Invalid month format. Use YYYY-MM'}), 400
+        
+        if current_user.role == 'teacher':
+            student = current_app.db.collection('users').where('student_id', '==', student_id)\
+                .select(['class_id']).limit(1).get()
+            if not student or student[0].to_dict().get('class_id') not in current_user.classes:
+                return jsonify({'error': 'Unauthorized'}), 403
+        
+        return jsonify(student_summary(student_id, start, end))
+    except Exception as e:
+        current_app.logger.error(f"Error getting student attendance summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@attendance_bp.route('/api/attendance/summary/class/<class_id>')
+@role_required(['admin', 'teacher'])
+def class_attendance_summary(class_id):
+    """Per-student percentages and a daily heatmap for a class-month"""
+    try:
+        if current_user.role == 'teacher' and class_id not in current_user.classes:
+            return jsonify({'error': 'Unauthorized for this class'}), 403
+        
+        month = request.args.get('month', datetime.now().strftime('%Y-%m'))
+        try:
+            datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            return jsonify({'error': 'Invalid month format. Use YYYY-MM'}), 400
+        
+        return jsonify(class_summary(class_id, month))
+    except Exception as e:
+        current_app.logger.error(f"Error getting class attendance summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _class_report_from_request(class_id):
+    """Load the cached class report for the request's start/end (default: last 30 days)"""
+    end = request.args.get('end', datetime.now().strftime('%Y-%m-%d'))
+    start = request.args.get(
+        'start', (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=29)).strftime('%Y-%m-%d')
+    )
+    return get_class_report(class_id, start, end)
+
+def _class_report_response(class_id, render):
+    """Check access, load the report and render it, answering 304 when unchanged"""
+    if current_user.role == 'teacher' and class_id not in current_user.classes:
+        return jsonify({'error': 'Unauthorized for this class'}), 403
+    try:
+        report = _class_report_from_request(class_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = render(report)
+    response.set_etag(report.version)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@attendance_bp.route('/api/reports/class/<class_id>')
+@role_required(['admin', 'teacher'])
+def class_report(class_id):
+    """Students × days attendance matrix of a class with daily and per-student rates"""
+    try:
+        return _class_report_response(class_id, lambda report: jsonify(report.to_json()))
+    except Exception as e:
+        current_app.logger.error(f"Error building class report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@attendance_bp.route('/api/reports/class/<class_id>/chart')
+@role_required(['admin', 'teacher'])
+def class_report_chart(class_id):
+    """Chart series for a class report"""
+    try:
+        return _class_report_response(class_id, lambda report: jsonify(report.to_chart()))
+    except Exception as e:
+        current_app.logger.error(f"Error building class report chart: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@attendance_bp.route('/api/reports/class/<class_id>/export')
+@role_required(['admin', 'teacher'])
+def class_report_export(class_id):
+    """Download a class report as an Excel workbook"""
+    try:
+        return _class_report_response(class_id, lambda report: send_file(
+            report.to_xlsx(),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=f"attendance_report_{class_id}_{report.dates[0]}_{report.dates[-1]}.xlsx"
+        ))
+    except Exception as e:
+        current_app.logger.error(f"Error exporting class report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @attendance_bp.route('/api/attendance/upload', methods=['POST'])
 @role_required(['admin', 'teacher'])
 def upload_attendance():
@@ -366,26 +739,32 @@ def upload_attendance():
     if not file.filename.endswith(('.xlsx', '.xls')):
         return jsonify({'error': 'Invalid file format. Please upload an Excel file'}), 400
     
+    if current_user.role == 'teacher' and not getattr(current_user, 'classes', None):
+        return jsonify({'error': 'No classes assigned to your account'}), 403
+    
     try:
-        # Read Excel file
-        df = pd.read_excel(file)
-        
-        # Validate columns
-        required_columns = ['student_id', 'name', 'subject_id', 'subject_name', 'timestamp', 'status']
-        if not all(col in df.columns for col in required_columns):
-            return jsonify({'error': 'Invalid template format. Please use the provided template'}), 400
-        
-        # Process records
-        records = df.to_dict('records')
-        for record in records:
-            # Verify teacher permissions
-            if current_user.role == 'teacher' and record['subject_id'] not in current_user.classes:
-                continue
-            
-            # Add record
-            current_app.db.collection('attendance').add(record)
+        # Read every cell as text so IDs are not turned into floats
+        df = pd.read_excel(file, dtype=str)
         
-        return jsonify({'message': 'Records uploaded successfully'})
+        importer = AttendanceImportService(
+            current_app.db,
+            current_user.role,
+            classes=getattr(current_user, 'classes', None),
+            marked_by=current_user.email
+        )
+        missing = importer.missing_columns(df)
+        if missing:
+            return jsonify({
+                'error': 'Invalid template format. Please use the provided template',
+                'missing_columns': missing
+            }), 400
+        
+        report = importer.run(df)
+        current_app.logger.info(
+            f"Attendance upload by {current_user.email}: {report['created']} created, "
+            f"{report['updated']} updated, {report['failed']} failed"
+        )
+        return jsonify({'message': 'Records uploaded successfully', **report})
     except Exception as e:
         current_app.logger.error(f"Error uploading attendance: {str(e)}")
         return jsonify({'error': str(e)}), 500 
@@ -433,22 +812,25 @@ def update_attendance_status(doc_id):
         if not new_status or new_status not in ['PRESENT', 'ABSENT']:
             return jsonify({'error': 'Invalid status provided'}), 400
             
-        # Get the attendance document
-        doc_ref = current_app.db.collection('attendance').document(doc_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return jsonify({'error': 'Attendance record not found'}), 404
-            
-        # Update the status
-        doc_ref.update({
+        update_data = {
             'status': new_status,
             'updated_at': datetime.now().isoformat(),
             'updated_by': current_user.email
-        })
+        }
+        
+        def apply(record_data):
+            if record_data is None:
+                raise LookupError('Attendance record not found')
+            return {**record_data, **update_data}
+        
+        # Read and update the status, its rollups and bitmap in one transaction
+        doc_ref = current_app.db.collection('attendance').document(doc_id)
+        update_record(current_app.db, doc_ref, apply)
         
         return jsonify({'message': 'Status updated successfully'})
         
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         current_app.logger.error(f"Error updating attendance status: {str(e)}")
         return jsonify({'error': 'Failed to update attendance status'}), 500
@@ -1,76 +1,105 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from app.services.notification_service import NotificationService
+from app.services.notification_broker import broker
+from app.services.async_firestore import get_async_db, run_async
 from functools import wraps
+import json
+import queue
+import time
 
 notification_bp = Blueprint('notification', __name__)
 
 def init_service(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        from app import get_db
-        notification_service = NotificationService(get_db())
+        notification_service = NotificationService(get_async_db())
         return f(notification_service, *args, **kwargs)
     return decorated_function
 
 @notification_bp.route('/api/notifications')
 @login_required
 @init_service
-async def get_notifications(notification_service):
+def get_notifications(notification_service):
     """Get user's notifications."""
     limit = request.args.get('limit', 50, type=int)
-    notifications = await notification_service.get_user_notifications(current_user.id, limit)
-    return jsonify([n.to_dict() for n in notifications])
+    notifications = run_async(notification_service.get_user_notifications(current_user.id, limit))
+    return jsonify([{"id": n.id, **n.to_dict()} for n in notifications])
 
 @notification_bp.route('/api/notifications/unread-count')
 @login_required
 @init_service
-async def get_unread_count(notification_service):
+def get_unread_count(notification_service):
     """Get count of unread notifications."""
-    count = await notification_service.get_unread_count(current_user.id)
+    count = run_async(notification_service.get_unread_count(current_user.id))
     return jsonify({"count": count})
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@notification_bp.route('/api/notifications/stream')
+@login_required
+@init_service
+def stream_notifications(notification_service):
+    """Push notification events to the browser over server-sent events."""
+    config = current_app.config
+    if broker.connections() >= config.get('NOTIFICATION_STREAM_MAX_CONNECTIONS', 2):
+        # Every stream holds a worker thread; clients fall back to polling
+        return jsonify({"error": "Too many open notification streams"}), 503, {'Retry-After': '30'}
+    
+    user_id = current_user.id
+    heartbeat = config.get('NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_age = config.get('NOTIFICATION_STREAM_MAX_AGE', 300)
+    unread = run_async(notification_service.get_unread_count(user_id))
+    subscriber = broker.subscribe(user_id)
+    
+    def generate():
+        try:
+            # Reconnect delay for EventSource, then the badge to start from
+            yield f"retry: {heartbeat * 1000}\n"
+            yield _sse('unread', {"count": unread})
+            # Streams end periodically so worker threads are recycled; the browser reconnects
+            deadline = time.monotonic() + max_age
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield _sse(event.get('event', 'message'), event)
+        finally:
+            broker.unsubscribe(user_id, subscriber)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @notification_bp.route('/api/notifications/<notification_id>/read', methods=['POST'])
 @login_required
 @init_service
-async def mark_as_read(notification_service, notification_id):
+def mark_as_read(notification_service, notification_id):
     """Mark a notification as read."""
-    await notification_service.mark_as_read(notification_id)
+    if not run_async(notification_service.mark_as_read(notification_id, current_user.id)):
+        return jsonify({"error": "Notification not found"}), 404
     return jsonify({"message": "Notification marked as read"})
 
 @notification_bp.route('/api/notifications/<notification_id>/archive', methods=['POST'])
 @login_required
 @init_service
-async def archive_notification(notification_service, notification_id):
+def archive_notification(notification_service, notification_id):
     """Archive a notification."""
-    await notification_service.archive_notification(notification_id)
+    if not run_async(notification_service.archive_notification(notification_id, current_user.id)):
+        return jsonify({"error": "Notification not found"}), 404
     return jsonify({"message": "Notification archived"})
 
 # Attendance dispute routes
 @notification_bp.route('/api/attendance/dispute', methods=['POST'])
 @login_required
-@init_service
-async def file_attendance_dispute(notification_service):
-    """File an attendance dispute."""
-    data = request.get_json()
-    
-    # Create dispute record (implement this based on your data model)
-    dispute_id = "implement_dispute_creation"
-    
-    # Get teacher information (implement this based on your data model)
-    teacher_id = "implement_get_teacher"
-    
-    # Notify teacher about the dispute
-    student_info = {
-        "name": current_user.name,
-        "id": current_user.id,
-        "class": data.get("class"),
-        "date": data.get("date")
-    }
-    
-    await notification_service.notify_dispute_filed(dispute_id, teacher_id, student_info)
-    
-    return jsonify({
-        "message": "Dispute filed successfully",
-        "dispute_id": dispute_id
-    }) 
\ No newline at end of file
+def file_attendance_dispute():
+    """File an attendance dispute.
+
+    Disputes have no data model yet and there is no way to find the teacher
+    responsible for a record, so nothing is stored or notified until both exist.
+    """
+    return jsonify({"error": "Attendance disputes are not available yet"}), 501
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, current_app, render_template, flash, redirect, url_for
+from flask import Blueprint, jsonify, request, current_app, render_template, flash, redirect, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
 from app.utils.decorators import role_required
 from datetime import datetime, timedelta
@@ -11,7 +11,15 @@ import logging
 import boto3
 import os
 import time
-from app.services.rekognition_service import RekognitionService
+import json
+import tempfile
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.rekognition_service import RekognitionService, enhance_image
+from app.services.enrollment_service import BulkEnrollmentService, EnrollmentJobRunning
+from app.services.rollup_service import upsert_daily_attendance
+from app.services.attendance_repository import AttendanceRepository
 from flask_wtf.csrf import generate_csrf
 
 recognition_bp = Blueprint('recognition', __name__)
@@ -26,23 +34,6 @@ rekognition_client = boto3.client(
 
 COLLECTION_ID = "students"  # Hardcode the collection ID to match the example code
 
-def enhance_image(pil_image):
-    """
-    Enhance image quality to improve face detection in distant group photos.
-    This includes increasing brightness and contrast.
-    """
-    # Convert PIL image to OpenCV format
-    cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-
-    # Increase brightness and contrast
-    alpha = 1.2  # Contrast control (1.0-3.0)
-    beta = 30    # Brightness control (0-100)
-    enhanced_cv_image = cv2.convertScaleAbs(cv_image, alpha=alpha, beta=beta)
-
-    # Convert back to PIL Image
-    enhanced_pil_image = Image.fromarray(cv2.cvtColor(enhanced_cv_image, cv2.COLOR_BGR2RGB))
-    return enhanced_pil_image
-
 @recognition_bp.route('/register', methods=['GET'])
 @login_required
 @role_required(['admin', 'teacher'])
@@ -182,6 +173,7 @@ def register_face():
             'student_id': student_id,
             'class': student_class,
             'division': student_division.upper(),
+            'class_id': f"{student_class}-{student_division.upper()}",
             'role': 'student',
             'created_at': datetime.utcnow().isoformat(),
             'face_id': external_image_id,  # This must match the ExternalImageId used in AWS
@@ -220,11 +212,204 @@ def register_face():
         current_app.logger.error(f"Error registering face: {str(e)}")
         return jsonify({"error": "An unexpected error occurred. Please try again"}), 500
 
+def _run_bulk_enrollment(app, job_id, archive_path, manifest_bytes, allowed_classes, started_by):
+    """Run a bulk enrollment job in the background and clean up the archive"""
+    with app.app_context():
+        try:
+            BulkEnrollmentService(app.db).run(
+                job_id, archive_path, manifest_bytes,
+                allowed_classes=allowed_classes, started_by=started_by
+            )
+        except EnrollmentJobRunning as e:
+            # Another worker owns the job; leave its status alone
+            app.logger.info(str(e))
+        except Exception as e:
+            app.logger.error(f"Bulk enrollment {job_id} failed: {str(e)}")
+            app.db.collection('enrollment_jobs').document(job_id).set({
+                'status': 'failed',
+                'error': str(e)
+            }, merge=True)
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+
+@recognition_bp.route('/register/bulk', methods=['POST'])
+@login_required
+@role_required(['admin', 'teacher'])
+def register_bulk():
+    """Start a bulk enrollment job from a ZIP of photos and a CSV manifest"""
+    try:
+        archive = request.files.get('archive')
+        if not archive or not archive.filename.lower().endswith('.zip'):
+            return jsonify({"error": "A ZIP archive of photos is required"}), 400
+
+        manifest = request.files.get('manifest')
+        manifest_bytes = manifest.read() if manifest else None
+
+        fd, archive_path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(fd, 'wb') as f:
+            archive.save(f)
+
+        if not zipfile.is_zipfile(archive_path):
+            os.remove(archive_path)
+            return jsonify({"error": "Invalid ZIP archive"}), 400
+
+        allowed_classes = current_user.classes if current_user.role == 'teacher' else None
+        job_id = BulkEnrollmentService.job_id_for(archive_path, manifest_bytes or b'')
+
+        threading.Thread(
+            target=_run_bulk_enrollment,
+            args=(current_app._get_current_object(), job_id, archive_path,
+                  manifest_bytes, allowed_classes, current_user.email),
+            daemon=True
+        ).start()
+
+        return jsonify({
+            "message": "Bulk enrollment started",
+            "job_id": job_id,
+            "status_url": url_for('recognition.register_bulk_status', job_id=job_id)
+        }), 202
+
+    except Exception as e:
+        current_app.logger.error(f"Error starting bulk enrollment: {str(e)}")
+        return jsonify({"error": "Failed to start bulk enrollment. Please try again"}), 500
+
+@recognition_bp.route('/register/bulk/<job_id>', methods=['GET'])
+@login_required
+@role_required(['admin', 'teacher'])
+def register_bulk_status(job_id):
+    """Get progress and the per-row report for a bulk enrollment job"""
+    try:
+        job = BulkEnrollmentService(current_app.db).get_job(job_id)
+        # Reports list student names and IDs, so teachers only see their own jobs
+        if not job or (current_user.role == 'teacher' and job.get('started_by') != current_user.email):
+            return jsonify({"error": "Enrollment job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        current_app.logger.error(f"Error getting bulk enrollment status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _process_recognized_face(rekognition_service, face, image_bytes, role, marked_by, teacher_classes):
+    """Search a single detected face and mark attendance for the matched student"""
+    try:
+        match = rekognition_service.search_face(face, image_bytes)
+        if not match:
+            return {
+                'message': 'No match found for this face'
+            }
+
+        student_id = match['student_id']
+        confidence = match['confidence']
+
+        # Get student details
+        student_ref = current_app.db.collection('users').where('student_id', '==', student_id).limit(1).get()
+        if not student_ref:
+            return {
+                'message': f'Student {student_id} not found in database'
+            }
+
+        student_doc = student_ref[0]
+        student_data = student_doc.to_dict()
+        student_class = f"{student_data.get('class')}-{student_data.get('division')}"
+        student_name = student_data.get('name', '')
+
+        # For teachers, check if they can mark attendance for this student
+        if role == 'teacher' and student_class not in teacher_classes:
+            return {
+                'student_id': student_id,
+                'name': student_name,
+                'class': student_data.get('class', ''),
+                'division': student_data.get('division', ''),
+                'message': f'Not authorized to mark attendance for student in class {student_class}'
+            }
+
+        # Mark attendance
+        attendance_data = {
+            'student_id': student_id,
+            'student_name': student_name,
+            'name': student_name,
+            'class': student_data.get('class', ''),
+            'division': student_data.get('division', ''),
+            'class_id': student_class,  # Add class_id for filtering
+            'status': 'PRESENT',
+            'date': datetime.now().strftime('%Y-%m-%d'),
+            'timestamp': datetime.now().isoformat(),
+            'marked_by': marked_by,
+            'confidence': confidence
+        }
+
+        # Update today's record if one exists, otherwise add a new one
+        _, created = upsert_daily_attendance(attendance_data, {
+            'status': 'PRESENT',
+            'timestamp': datetime.now().isoformat(),
+            'marked_by': marked_by,
+            'confidence': confidence
+        })
+        if created:
+            current_app.logger.info(f"Created new attendance record for student {student_id}")
+        else:
+            current_app.logger.info(f"Updated attendance for student {student_id}")
+
+        return {
+            'student_id': student_id,
+            'name': student_name,
+            'class': student_data.get('class', ''),
+            'division': student_data.get('division', ''),
+            'confidence': confidence,
+            'message': 'Attendance marked successfully'
+        }
+    except Exception as e:
+        current_app.logger.error(f"Error processing face: {str(e)}")
+        return {
+            'message': f'Error processing face: {str(e)}'
+        }
+
+def _wants_stream(data):
+    """Check whether the client asked for NDJSON streaming results"""
+    if data.get('stream') or request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def _stream_recognition(rekognition_service, faces, image_bytes, teacher_classes):
+    """Yield one NDJSON line per face as soon as it is processed, then a summary line"""
+    app = current_app._get_current_object()
+    role = current_user.role
+    marked_by = current_user.email
+
+    def process(face_index, face):
+        with app.app_context():
+            result = _process_recognized_face(
+                rekognition_service, face, image_bytes, role, marked_by, teacher_classes
+            )
+        result['face_index'] = face_index
+        return result
+
+    max_workers = min(len(faces), app.config.get('RECOGNITION_STREAM_WORKERS', 8))
+    marked = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process, i, face) for i, face in enumerate(faces)]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.get('confidence') is not None:
+                marked += 1
+            yield json.dumps({'type': 'face', **result}) + '\n'
+
+    yield json.dumps({
+        'type': 'summary',
+        'message': 'Recognition complete',
+        'total_faces': len(faces),
+        'marked_count': marked
+    }) + '\n'
+
 @recognition_bp.route('/recognize', methods=['POST'])
 @login_required
 @role_required(['admin', 'teacher'])
 def recognize():
-    """Recognize faces in an image and mark attendance"""
+    """Recognize faces in an image and mark attendance
+
+    Send ``"stream": true`` (or ``Accept: application/x-ndjson``) to receive
+    one NDJSON line per face as it completes, followed by a summary line.
+    """
     try:
         data = request.json
         image_data = data.get('image')
@@ -258,93 +443,21 @@ def recognize():
                 return jsonify({
                     'error': 'No classes assigned to your account'
                 }), 403
+
+        if _wants_stream(data):
+            return Response(
+                stream_with_context(_stream_recognition(rekognition_service, faces, image_bytes, teacher_classes)),
+                mimetype='application/x-ndjson',
+                headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+            )
             
         # Search for each face in the collection
         identified_people = []
         for face in faces:
-            try:
-                match = rekognition_service.search_face(face, image_bytes)
-                if match:
-                    student_id = match['student_id']
-                    confidence = match['confidence']
-                    
-                    # Get student details
-                    student_ref = current_app.db.collection('users').where('student_id', '==', student_id).limit(1).get()
-                    if not student_ref:
-                        identified_people.append({
-                            'message': f'Student {student_id} not found in database'
-                        })
-                        continue
-
-                    student_doc = student_ref[0]
-                    student_data = student_doc.to_dict()
-                    student_class = f"{student_data.get('class')}-{student_data.get('division')}"
-                    student_name = student_data.get('name', '')
-                    
-                    # For teachers, check if they can mark attendance for this student
-                    if current_user.role == 'teacher' and student_class not in teacher_classes:
-                        identified_people.append({
-                            'student_id': student_id,
-                            'name': student_name,
-                            'class': student_data.get('class', ''),
-                            'division': student_data.get('division', ''),
-                            'message': f'Not authorized to mark attendance for student in class {student_class}'
-                        })
-                        continue
-                    
-                    # Mark attendance
-                    attendance_data = {
-                        'student_id': student_id,
-                        'student_name': student_name,
-                        'name': student_name,
-                        'class': student_data.get('class', ''),
-                        'division': student_data.get('division', ''),
-                        'class_id': student_class,  # Add class_id for filtering
-                        'status': 'PRESENT',
-                        'date': datetime.now().strftime('%Y-%m-%d'),
-                        'timestamp': datetime.now().isoformat(),
-                        'marked_by': current_user.email,
-                        'confidence': confidence
-                    }
-                    
-                    # Check if attendance already exists for today
-                    today = datetime.now().strftime('%Y-%m-%d')
-                    existing_attendance = current_app.db.collection('attendance').where(
-                        'student_id', '==', student_id
-                    ).where('date', '==', today).get()
-                    
-                    if existing_attendance:
-                        # Update existing attendance
-                        doc = existing_attendance[0]
-                        doc.reference.update({
-                            'status': 'PRESENT',
-                            'timestamp': datetime.now().isoformat(),
-                            'marked_by': current_user.email,
-                            'confidence': confidence
-                        })
-                        current_app.logger.info(f"Updated attendance for student {student_id}")
-                    else:
-                        # Add new attendance record
-                        doc_ref = current_app.db.collection('attendance').add(attendance_data)
-                        current_app.logger.info(f"Created new attendance record for student {student_id}")
-                    
-                    identified_people.append({
-                        'student_id': student_id,
-                        'name': student_name,
-                        'class': student_data.get('class', ''),
-                        'division': student_data.get('division', ''),
-                        'confidence': confidence,
-                        'message': 'Attendance marked successfully'
-                    })
-                else:
-                    identified_people.append({
-                        'message': 'No match found for this face'
-                    })
-            except Exception as e:
-                current_app.logger.error(f"Error processing face: {str(e)}")
-                identified_people.append({
-                    'message': f'Error processing face: {str(e)}'
-                })
+            identified_people.append(_process_recognized_face(
+                rekognition_service, face, image_bytes,
+                current_user.role, current_user.email, teacher_classes
+            ))
                 
         return jsonify({
             'message': 'Recognition complete',
@@ -428,26 +541,17 @@ def verify_attendance():
             'confidence': match['confidence']
         }
         
-        # Check if attendance already exists for today
-        today = datetime.now().strftime('%Y-%m-%d')
-        existing_attendance = current_app.db.collection('attendance').where(
-            'student_id', '==', student_id
-        ).where('date', '==', today).get()
-        
-        if existing_attendance:
-            # Update existing attendance
-            doc = existing_attendance[0]
-            doc.reference.update({
-                'status': 'PRESENT',
-                'timestamp': datetime.now().isoformat(),
-                'marked_by': 'self',
-                'confidence': match['confidence']
-            })
-            current_app.logger.info(f"Updated attendance for student {student_id}")
-        else:
-            # Add new attendance record
-            doc_ref = current_app.db.collection('attendance').add(attendance_data)
+        # Update today's record if one exists, otherwise add a new one
+        _, created = upsert_daily_attendance(attendance_data, {
+            'status': 'PRESENT',
+            'timestamp': datetime.now().isoformat(),
+            'marked_by': 'self',
+            'confidence': match['confidence']
+        })
+        if created:
             current_app.logger.info(f"Created new attendance record for student {student_id}")
+        else:
+            current_app.logger.info(f"Updated attendance for student {student_id}")
             
         return jsonify({
             'message': 'Attendance marked successfully',
@@ -524,8 +628,9 @@ def detect_faces():
                     if len(list(student_ref)) > 0:
                         student = student_ref[0].to_dict()
                         # Check if attendance is already marked
-                        attendance_ref = current_app.db.collection('attendance').where('student_id', '==', student_id).where('date', '>=', today).limit(1).get()
-                        already_marked = len(list(attendance_ref)) > 0
+                        already_marked = AttendanceRepository().find_for_student_on_date(
+                            student_id, today.strftime('%Y-%m-%d'), fields=['status']
+                        ) is not None
                         
                         face_data['match'] = {
                             'student_id': student_id,
@@ -587,24 +692,14 @@ def mark_classroom_attendance():
                 'method': 'classroom'
             }
 
-            # Check if attendance already exists for today
-            existing_attendance = current_app.db.collection('attendance').where(
-                'student_id', '==', student_id
-            ).where('date', '==', today_str).get()
-
-            if existing_attendance:
-                # Update existing attendance
-                doc = existing_attendance[0]
-                doc.reference.update({
-                    'status': 'PRESENT',
-                    'timestamp': now.isoformat(),
-                    'marked_by': current_user.email,
-                    'confidence': student.get('confidence', 0),
-                    'method': 'classroom'
-                })
-            else:
-                # Add new attendance record
-                current_app.db.collection('attendance').add(attendance_data)
+            # Update today's record if one exists, otherwise add a new one
+            upsert_daily_attendance(attendance_data, {
+                'status': 'PRESENT',
+                'timestamp': now.isoformat(),
+                'marked_by': current_user.email,
+                'confidence': student.get('confidence', 0),
+                'method': 'classroom'
+            })
             
             marked_count += 1
 
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, current_app, jsonify, request
 from flask_login import login_required, current_user
 from functools import wraps
+from app.utils.queries import stream_where_in
+from app.services.cache_service import invalidate_cache
+from app.services.user_cache import invalidate_user
 
 teacher_bp = Blueprint('teacher', __name__)
 
@@ -27,19 +30,14 @@ def students():
             flash('No classes assigned to your account.', 'error')
             return redirect(url_for('main.dashboard'))
             
-        # Get all students
-        students_ref = current_app.db.collection('users').where('role', '==', 'student').get()
-        
-        # Filter students based on teacher's classes
-        for doc in students_ref:
+        # Get students in the teacher's classes
+        students_query = current_app.db.collection('users').where('role', '==', 'student')
+        for doc in stream_where_in(students_query, 'class_id', teacher_classes):
             student_data = doc.to_dict()
-            class_division = f"{student_data.get('class')}-{student_data.get('division')}"
-            
-            if class_division in teacher_classes:
-                student_data['doc_id'] = doc.id
-                student_data['has_portal'] = True if student_data.get('email') else False
-                student_data['email'] = student_data.get('email', '')
-                students.append(student_data)
+            student_data['doc_id'] = doc.id
+            student_data['has_portal'] = True if student_data.get('email') else False
+            student_data['email'] = student_data.get('email', '')
+            students.append(student_data)
                 
         return render_template('teacher/view_students.html', students=students)
         
@@ -101,8 +99,11 @@ def update_student(student_id):
         new_class_division = f"{update_data['class']}-{update_data['division']}"
         if new_class_division not in current_user.classes:
             return jsonify({'error': 'You cannot assign student to a class you do not teach'}), 403
+        update_data['class_id'] = new_class_division
             
         student_ref.update(update_data)
+        invalidate_user(student_id)
+        invalidate_cache('students')
         return jsonify({'message': 'Student updated successfully'})
         
     except Exception as e:
@@ -123,19 +124,14 @@ def view_students():
             flash('No classes assigned to your account.', 'error')
             return redirect(url_for('main.dashboard'))
             
-        # Get all students
-        students_ref = current_app.db.collection('users').where('role', '==', 'student').get()
-        
-        # Filter students based on teacher's classes
-        for doc in students_ref:
+        # Get students in the teacher's classes
+        students_query = current_app.db.collection('users').where('role', '==', 'student')
+        for doc in stream_where_in(students_query, 'class_id', teacher_classes):
             student_data = doc.to_dict()
-            class_division = f"{student_data.get('class')}-{student_data.get('division')}"
-            
-            if class_division in teacher_classes:
-                student_data['doc_id'] = doc.id
-                student_data['has_portal'] = True if student_data.get('email') else False
-                student_data['email'] = student_data.get('email', '')
-                students.append(student_data)
+            student_data['doc_id'] = doc.id
+            student_data['has_portal'] = True if student_data.get('email') else False
+            student_data['email'] = student_data.get('email', '')
+            students.append(student_data)
                 
         return render_template('teacher/view_students.html', students=students)
         
@@ -0,0 +1,196 @@
+"""Low attendance alert pipeline.
+
+Percentages of every student are computed in one pass over the attendance
+bitmaps. Students below the threshold get an alert rendered from a single
+compiled template, and messages are sent in batches of ``MAIL_MAX_EMAILS``
+by a small worker pool where each batch reuses one SMTP connection. Run
+progress and failures are recorded in ``low_attendance_alert_runs``.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from flask_mail import Message
+from firebase_admin import firestore
+from app.services.bitmap_service import student_totals
+from app.services.email_service import mail
+from app.utils.queries import chunked
+
+ALERT_RUNS_COLLECTION = 'low_attendance_alert_runs'
+ALERT_TEMPLATE = 'email/low_attendance_alert'
+MAX_RECORDED_ERRORS = 100
+
+def alert_window(months):
+    """First and last month of a window ending with the current month"""
+    today = datetime.now()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}", today.strftime('%Y-%m')
+
+class LowAttendanceAlertService:
+    """Select students below a threshold and email them in pooled batches"""
+
+    def __init__(self, db, threshold=None, min_days=None):
+        config = current_app.config
+        self.db = db
+        self.threshold = threshold if threshold is not None else config.get('LOW_ATTENDANCE_THRESHOLD', 75)
+        self.min_days = min_days if min_days is not None else config.get('LOW_ATTENDANCE_MIN_DAYS', 5)
+
+    def candidates(self, start_month, end_month):
+        """Students below the threshold with enough recorded days
+
+        Returns:
+            list: Dicts with student_id, name, email, class_id, percentage,
+            recorded_days and present_days, lowest percentage first
+        """
+        totals = student_totals(start_month, end_month)
+        low = {}
+        for student_id, (recorded, present) in totals.items():
+            if recorded < self.min_days:
+                continue
+            percentage = round(present / recorded * 100, 2)
+            if percentage < self.threshold:
+                low[student_id] = (recorded, present, percentage)
+        if not low:
+            return []
+
+        students = self.db.collection('users')\
+            .where('role', '==', 'student')\
+            .select(['student_id', 'name', 'email', 'class_id'])
+        selected = []
+        for doc in students.stream():
+            data = doc.to_dict()
+            if data.get('student_id') in low and data.get('email'):
+                recorded, present, percentage = low[data['student_id']]
+                selected.append({
+                    'student_id': data['student_id'],
+                    'name': data.get('name', ''),
+                    'email': data['email'],
+                    'class_id': data.get('class_id'),
+                    'recorded_days': recorded,
+                    'present_days': present,
+                    'percentage': percentage
+                })
+        return sorted(selected, key=lambda s: s['percentage'])
+
+    def build_messages(self, students, start_month, end_month):
+        """Render one message per student from templates compiled once"""
+        config = current_app.config
+        html_template = current_app.jinja_env.get_template(f'{ALERT_TEMPLATE}.html')
+        text_template = current_app.jinja_env.get_template(f'{ALERT_TEMPLATE}.txt')
+        shared = {
+            'subject_name': f'All subjects ({start_month} to {end_month})',
+            'minimum_required': self.threshold,
+            'records_url': f"{config.get('APP_BASE_URL', '').rstrip('/')}/attendance/view",
+            'school_email': config.get('MAIL_DEFAULT_SENDER') or '',
+            'school_phone': config.get('SCHOOL_PHONE', '')
+        }
+
+        messages = []
+        for student in students:
+            context = dict(shared, student_name=student['name'], attendance_percentage=student['percentage'])
+            msg = Message(
+                subject='Low Attendance Alert',
+                recipients=[student['email']],
+                sender=config['MAIL_DEFAULT_SENDER']
+            )
+            msg.html = html_template.render(**context)
+            msg.body = text_template.render(**context)
+            messages.append((student['student_id'], msg))
+        return messages
+
+    def start_run(self, start_month, end_month, started_by='system', dry_run=False):
+        """Create the run document and return its ID"""
+        run_id = uuid.uuid4().hex
+        self.db.collection(ALERT_RUNS_COLLECTION).document(run_id).set({
+            'status': 'running',
+            'start_month': start_month,
+            'end_month': end_month,
+            'threshold': self.threshold,
+            'dry_run': dry_run,
+            'candidates': 0,
+            'sent': 0,
+            'failed': 0,
+            'errors': [],
+            'started_by': started_by,
+            'started_at': datetime.utcnow().isoformat()
+        })
+        return run_id
+
+    def _send_batch(self, app, run_ref, batch):
+        """Send a batch over one SMTP connection and record its outcome"""
+        delivered, errors = set(), []
+        with app.app_context():
+            try:
+                with mail.connect() as connection:
+                    for student_id, msg in batch:
+                        try:
+                            connection.send(msg)
+                            delivered.add(student_id)
+                        except Exception as e:
+                            errors.append({'student_id': student_id, 'error': str(e)})
+            except Exception as e:
+                # The connection could not be opened, so nothing left in the batch went out
+                failed = delivered | {error['student_id'] for error in errors}
+                errors.extend(
+                    {'student_id': student_id, 'error': str(e)}
+                    for student_id, _ in batch if student_id not in failed
+                )
+                app.logger.error(f"Low attendance alert batch failed: {str(e)}")
+
+            sent = len(delivered)
+            update = {'sent': firestore.Increment(sent), 'failed': firestore.Increment(len(errors))}
+            if errors:
+                update['errors'] = firestore.ArrayUnion(errors[:MAX_RECORDED_ERRORS])
+            run_ref.update(update)
+        return sent, len(errors)
+
+    def run(self, run_id, start_month, end_month, dry_run=False):
+        """Select students and send their alerts, recording progress on the run
+
+        Returns:
+            dict: candidates, sent and failed counts
+        """
+        run_ref = self.db.collection(ALERT_RUNS_COLLECTION).document(run_id)
+        students = self.candidates(start_month, end_month)
+        run_ref.update({'candidates': len(students)})
+
+        sent = failed = 0
+        if students and not dry_run:
+            messages = self.build_messages(students, start_month, end_month)
+            app = current_app._get_current_object()
+            batch_size = current_app.config.get('MAIL_MAX_EMAILS') or 50
+            workers = current_app.config.get('LOW_ATTENDANCE_ALERT_WORKERS', 4)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    lambda batch: self._send_batch(app, run_ref, batch),
+                    chunked(messages, batch_size)
+                )
+                for batch_sent, batch_failed in results:
+                    sent += batch_sent
+                    failed += batch_failed
+
+        run_ref.update({
+            'status': 'completed',
+            'finished_at': datetime.utcnow().isoformat()
+        })
+        current_app.logger.info(f"Low attendance alert run {run_id}: {len(students)} candidates, {sent} sent, {failed} failed")
+        return {'candidates': len(students), 'sent': sent, 'failed': failed}
+
+    def get_run(self, run_id):
+        doc = self.db.collection(ALERT_RUNS_COLLECTION).document(run_id).get()
+        return {'id': doc.id, **doc.to_dict()} if doc.exists else None
+
+def run_low_attendance_alerts(db, months=None, threshold=None, started_by='system', dry_run=False):
+    """Start and run an alert run over the last ``months`` months
+
+    Returns:
+        tuple: (run_id, summary dict)
+    """
+    service = LowAttendanceAlertService(db, threshold=threshold)
+    start_month, end_month = alert_window(months or current_app.config.get('LOW_ATTENDANCE_WINDOW_MONTHS', 3))
+    run_id = service.start_run(start_month, end_month, started_by=started_by, dry_run=dry_run)
+    try:
+        return run_id, service.run(run_id, start_month, end_month, dry_run=dry_run)
+    except Exception as e:
+        db.collection(ALERT_RUNS_COLLECTION).document(run_id).update({'status': 'failed', 'error': str(e)})
+        raise
@@ -1,10 +1,11 @@
 from typing import List, Optional
+from datetime import datetime
 from app.models.approval import ApprovalRequest, ApprovalStatus, ApprovalType
 from app.services.notification_service import NotificationService
 from google.cloud import firestore
 
 class ApprovalService:
-    def __init__(self, db: firestore.Client, notification_service: NotificationService):
+    def __init__(self, db: firestore.AsyncClient, notification_service: NotificationService):
         self.db = db
         self.notification_service = notification_service
         self._approval_ref = self.db.collection('approvals')
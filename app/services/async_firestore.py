@@ -0,0 +1,65 @@
+"""Firestore AsyncClient on a shared event loop for synchronous Flask views.
+
+The async client's gRPC channel is bound to the event loop it first runs on,
+so each process keeps a single loop in a daemon thread and every coroutine
+is submitted to it. Views call ``run_async(service.method(...))`` and block
+until the result is ready.
+"""
+import asyncio
+import os
+import threading
+import firebase_admin
+from google.cloud import firestore
+
+ASYNC_TIMEOUT = 30
+
+class AsyncRunner:
+    """Event loop running in a daemon thread, started once per process"""
+
+    def __init__(self):
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        # A forked worker inherits the attribute but not the thread, so check the PID
+        if self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-runner', daemon=True).start()
+                self._loop = loop
+                self._pid = os.getpid()
+        return self._loop
+
+    def run(self, coro, timeout=ASYNC_TIMEOUT):
+        """Run a coroutine on the shared loop and return its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+runner = AsyncRunner()
+_clients = {}
+_clients_lock = threading.Lock()
+
+def run_async(coro, timeout=ASYNC_TIMEOUT):
+    """Run a coroutine on the shared event loop from synchronous code"""
+    return runner.run(coro, timeout)
+
+async def _create_client():
+    app = firebase_admin.get_app()
+    return firestore.AsyncClient(project=app.project_id, credentials=app.credential.get_credential())
+
+def get_async_db():
+    """Get the process's AsyncClient, created on the shared loop with the Firebase app's credentials"""
+    pid = os.getpid()
+    if pid not in _clients:
+        with _clients_lock:
+            if pid not in _clients:
+                _clients.clear()
+                _clients[pid] = run_async(_create_client())
+    return _clients[pid]
@@ -0,0 +1,193 @@
+"""Batched import of attendance records from an uploaded spreadsheet."""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from flask import current_app
+from app.services.rollup_service import commit_record_changes
+from app.utils.queries import stream_where_in
+
+REQUIRED_COLUMNS = ['student_id', 'name', 'subject_id', 'subject_name', 'timestamp', 'status']
+REQUIRED_VALUES = ['student_id', 'subject_id', 'timestamp', 'status']
+VALID_STATUSES = ['PRESENT', 'ABSENT']
+CHUNK_ROWS = 250
+WRITE_WORKERS = 8
+
+class AttendanceImportService:
+    """Validate a sheet of attendance rows in pandas and write it in batches.
+
+    Every row gets a document ID derived from student, date and subject, so
+    uploading the same sheet twice updates the same documents instead of
+    duplicating them. Rows that already match what is stored are skipped.
+    Rollup counters are staged in the same transaction as the records they
+    count. Rows are grouped by class and each class is written by a single
+    worker: rollups are per class-day and bitmaps per student-month, and a
+    student belongs to one class, so concurrent transactions never touch the
+    same rollup or bitmap and do not contend with each other.
+    """
+
+    def __init__(self, db, role, classes=None, marked_by=None):
+        self.db = db
+        self.role = role
+        self.classes = list(classes or [])
+        self.marked_by = marked_by
+
+    @staticmethod
+    def missing_columns(df):
+        """Get the template columns absent from the sheet"""
+        columns = {str(c).strip().lower() for c in df.columns}
+        return [c for c in REQUIRED_COLUMNS if c not in columns]
+
+    def normalise(self, df):
+        """Trim, upper-case and parse the sheet columns"""
+        df = df.rename(columns=lambda c: str(c).strip().lower())[REQUIRED_COLUMNS].copy()
+        df['row'] = df.index + 2  # Spreadsheet rows start at 1 under the header
+
+        for column in ['student_id', 'name', 'subject_id', 'subject_name', 'status']:
+            df[column] = df[column].astype('string').str.strip().replace('', pd.NA)
+        df['status'] = df['status'].str.upper()
+
+        # Parse as UTC so a sheet mixing offsets and naive times keeps a datetime
+        # dtype; times with an offset become naive UTC, naive times are unchanged
+        timestamps = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed', utc=True).dt.tz_convert(None)
+        df['timestamp'] = timestamps
+        df['date'] = timestamps.dt.strftime('%Y-%m-%d').astype('string')
+        return df
+
+    def lookup_students(self, student_ids):
+        """Fetch class details for the given student IDs"""
+        query = self.db.collection('users')\
+            .where('role', '==', 'student')\
+            .select(['student_id', 'name', 'class', 'division', 'class_id'])
+        students = {}
+        for doc in stream_where_in(query, 'student_id', student_ids):
+            data = doc.to_dict()
+            data['class_id'] = data.get('class_id') or f"{data.get('class', '')}-{data.get('division', '')}"
+            students[data.get('student_id')] = data
+        return students
+
+    def validate(self, df):
+        """Attach an ``error`` column describing why each invalid row is rejected
+
+        Returns:
+            tuple: (normalised DataFrame, students by ID)
+        """
+        error = pd.Series(pd.NA, index=df.index, dtype='object')
+
+        def reject(mask, message):
+            nonlocal error
+            error = error.mask(error.isna() & mask.fillna(False).astype(bool), message)
+
+        for column in REQUIRED_VALUES:
+            reject(df[column].isna(), f"Missing {column}")
+        reject(df['timestamp'].isna(), 'Invalid timestamp')
+        reject(~df['status'].isin(VALID_STATUSES), f"Status must be one of {', '.join(VALID_STATUSES)}")
+
+        students = self.lookup_students(df.loc[error.isna(), 'student_id'].dropna().unique().tolist())
+        df['class_id'] = df['student_id'].map({sid: s['class_id'] for sid, s in students.items()})
+        reject(df['class_id'].isna(), 'Unknown student')
+        if self.role == 'teacher':
+            reject(~df['class_id'].isin(self.classes), "Not authorized for this student's class")
+
+        # Deterministic IDs make re-uploading the same sheet idempotent
+        df['doc_id'] = (df['student_id'] + '|' + df['date'] + '|' + df['subject_id']).map(
+            lambda key: hashlib.sha1(key.encode('utf-8')).hexdigest() if isinstance(key, str) else pd.NA
+        )
+        reject(df['doc_id'].notna() & df.duplicated('doc_id', keep='last'),
+               'Duplicate of a later row for the same student, date and subject')
+
+        df['error'] = error
+        return df, students
+
+    def build_record(self, row, student):
+        return {
+            'student_id': row['student_id'],
+            'student_name': row['name'] if pd.notna(row['name']) else student.get('name', ''),
+            'class': student.get('class', ''),
+            'division': student.get('division', ''),
+            'class_id': row['class_id'],
+            'subject_id': row['subject_id'],
+            'subject_name': row['subject_name'] if pd.notna(row['subject_name']) else '',
+            'status': row['status'],
+            'date': row['date'],
+            'timestamp': row['timestamp'].isoformat(),
+            'marked_by': self.marked_by,
+            'source': 'upload'
+        }
+
+    @staticmethod
+    def partition(items):
+        """Group (doc_id, record) pairs by class, largest group first
+
+        No two groups share a class-day rollup or a student-month bitmap, so
+        groups can be written concurrently without contention.
+        """
+        groups = {}
+        for doc_id, record in items:
+            groups.setdefault(record['class_id'], []).append((doc_id, record))
+        return sorted(groups.values(), key=len, reverse=True)
+
+    def _write_chunk(self, items):
+        """Write one chunk of (doc_id, record) pairs with its rollup changes
+
+        Returns:
+            dict: created, updated and unchanged counts
+        """
+        collection = self.db.collection('attendance')
+        refs = [collection.document(doc_id) for doc_id, _ in items]
+        existing = {doc.id: doc.to_dict() for doc in self.db.get_all(refs) if doc.exists}
+        changes = [
+            (collection.document(doc_id), existing.get(doc_id), record)
+            for doc_id, record in items if existing.get(doc_id) != record
+        ]
+        written = commit_record_changes(self.db, changes)
+        updated = sum(1 for old_record, _ in written if old_record is not None)
+        return {
+            'created': len(written) - updated,
+            'updated': updated,
+            'unchanged': len(items) - len(written)
+        }
+
+    def run(self, df):
+        """Import a sheet and report the outcome per row
+
+        Args:
+            df: DataFrame read from the uploaded template
+
+        Returns:
+            dict: created, updated, unchanged and failed counts plus row errors
+        """
+        df, students = self.validate(self.normalise(df))
+        invalid = df[df['error'].notna()]
+        valid = df[df['error'].isna()]
+
+        items = [
+            (row['doc_id'], self.build_record(row, students[row['student_id']]))
+            for row in valid.to_dict('records')
+        ]
+        groups = self.partition(items)
+        app = current_app._get_current_object()
+
+        def write_group(group_items):
+            counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+            with app.app_context():
+                for i in range(0, len(group_items), CHUNK_ROWS):
+                    for key, value in self._write_chunk(group_items[i:i + CHUNK_ROWS]).items():
+                        counts[key] += value
+            return counts
+
+        report = {'created': 0, 'updated': 0, 'unchanged': 0}
+        with ThreadPoolExecutor(max_workers=max(1, min(WRITE_WORKERS, len(groups)))) as executor:
+            for counts in executor.map(write_group, groups):
+                for key, value in counts.items():
+                    report[key] += value
+
+        report['failed'] = len(invalid)
+        report['errors'] = [
+            {
+                'row': int(row['row']),
+                'student_id': None if pd.isna(row['student_id']) else row['student_id'],
+                'error': row['error']
+            }
+            for row in invalid.to_dict('records')
+        ]
+        return report
@@ -0,0 +1,147 @@
+"""Attendance queries in one place, with field projection and timing."""
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+from flask import current_app
+from app.utils.queries import stream_where_in, FIRESTORE_IN_LIMIT
+
+COLLECTION = 'attendance'
+
+# Listing order shared by the attendance table, pagination and exports. It is
+# served by the (date DESC, timestamp DESC) index, and by the
+# (class_id, date DESC, timestamp DESC) index when filtering by class.
+LIST_ORDER = [('date', 'DESCENDING'), ('timestamp', 'DESCENDING'), ('__name__', 'DESCENDING')]
+
+# Projections for hot paths that only need a few fields
+STATUS_FIELDS = ['date', 'status', 'student_id', 'class_id']
+ROLLUP_FIELDS = ['date', 'status', 'class_id', 'class', 'division']
+RECENT_FIELDS = ['student_id', 'student_name', 'name', 'class_id', 'subject_name', 'status', 'date', 'timestamp']
+
+SLOW_QUERY_SECONDS = 1.0
+
+class AttendanceRepository:
+    """Typed attendance queries with ``select()`` projection and per-query timing.
+
+    Methods return plain record dicts with the document ID under ``doc_id``.
+    ``class_ids`` restricts results to those "class-division" IDs using
+    chunked ``in`` filters; ``None`` means no class restriction.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or current_app.db
+
+    def query(self):
+        """Base query for filters that have no dedicated method"""
+        return self.db.collection(COLLECTION)
+
+    def document(self, doc_id: str):
+        return self.db.collection(COLLECTION).document(doc_id)
+
+    @staticmethod
+    def order_for_listing(query):
+        """Apply the shared listing order, with the document ID as tie-breaker"""
+        for field, direction in LIST_ORDER:
+            query = query.order_by(field, direction=direction)
+        return query
+
+    @staticmethod
+    def sort_for_listing(records: List[Dict]) -> List[Dict]:
+        """Restore the listing order across the results of chunked class queries"""
+        records.sort(key=lambda r: (r.get('date', ''), r.get('timestamp', ''), r.get('doc_id', '')), reverse=True)
+        return records
+
+    def stream(self, name: str, query, class_ids: Optional[Sequence[str]] = None,
+               fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Run a query and yield its records, logging how long it took
+
+        Args:
+            name: Label for the timing log
+            query: Firestore query to run
+            class_ids: Optional classes to restrict the query to
+            fields: Optional projection; only these fields are fetched
+        """
+        if fields:
+            query = query.select(list(fields))
+        docs = query.stream() if class_ids is None else stream_where_in(query, 'class_id', class_ids)
+
+        started = time.perf_counter()
+        count = 0
+        try:
+            for doc in docs:
+                count += 1
+                record = doc.to_dict()
+                record['doc_id'] = doc.id
+                yield record
+        finally:
+            elapsed = time.perf_counter() - started
+            message = f"Attendance query {name}: {count} records in {elapsed:.3f}s"
+            if elapsed >= SLOW_QUERY_SECONDS:
+                current_app.logger.warning(message)
+            else:
+                current_app.logger.debug(message)
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        """Get one record by document ID"""
+        doc = self.document(doc_id).get()
+        if not doc.exists:
+            return None
+        return {**doc.to_dict(), 'doc_id': doc.id}
+
+    def student_on_date_query(self, student_id: str, date: str):
+        """Query for a student's records on a date, e.g. to run in a transaction"""
+        return self.query()\
+            .where('student_id', '==', student_id)\
+            .where('date', '==', date)
+
+    def find_for_student_on_date(self, student_id: str, date: str,
+                                 fields: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """Get a student's record for a date, if any"""
+        query = self.student_on_date_query(student_id, date).limit(1)
+        return next(self.stream('student_on_date', query, fields=fields), None)
+
+    def list_by_date(self, date: str, student_id: Optional[str] = None,
+                     class_ids: Optional[Sequence[str]] = None,
+                     fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get all records for one date"""
+        query = self.query().where('date', '==', date)
+        if student_id is not None:
+            query = query.where('student_id', '==', student_id)
+        return list(self.stream('by_date', query, class_ids, fields))
+
+    def list_in_range(self, start_date: str, end_date: str, student_id: Optional[str] = None,
+                      class_ids: Optional[Sequence[str]] = None,
+                      fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Stream records with dates between start_date and end_date, inclusive"""
+        query = self.query()\
+            .where('date', '>=', start_date)\
+            .where('date', '<=', end_date)
+        if student_id is not None:
+            query = query.where('student_id', '==', student_id)
+        return self.stream('in_range', query, class_ids, fields)
+
+    def list_recent(self, limit: int, student_id: Optional[str] = None,
+                    class_ids: Optional[Sequence[str]] = None,
+                    fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get the newest records by timestamp"""
+        query = self.query()
+        if student_id is not None:
+            query = query.where('student_id', '==', student_id)
+        query = query.order_by('timestamp', direction='DESCENDING').limit(limit)
+
+        records = list(self.stream('recent', query, class_ids, fields))
+        if class_ids is not None and len(class_ids) > FIRESTORE_IN_LIMIT:
+            # Each chunk returns its own newest records; merge them
+            records.sort(key=lambda r: r.get('timestamp', ''), reverse=True)
+        return records[:limit]
+
+    def list_by_timestamp(self, student_id: Optional[str] = None, start=None, end=None,
+                          fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get records between two datetimes, newest first"""
+        query = self.query()
+        if student_id is not None:
+            query = query.where('student_id', '==', student_id)
+        if start:
+            query = query.where('timestamp', '>=', start.isoformat())
+        if end:
+            query = query.where('timestamp', '<=', end.isoformat())
+        query = query.order_by('timestamp', direction='DESCENDING')
+        return list(self.stream('by_timestamp', query, fields=fields))
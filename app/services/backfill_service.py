@@ -0,0 +1,48 @@
+"""One-off data backfills for fields newer code relies on."""
+from flask import current_app
+
+def backfill_class_ids(collection_name, page_size=500):
+    """Write class_id on documents that only have class and division
+
+    Pages through the collection by document ID so memory stays bounded, and
+    commits one batch per page.
+
+    Args:
+        collection_name: Collection to backfill, e.g. 'users' or 'attendance'
+        page_size: Documents read and written per page (at most 500)
+
+    Returns:
+        dict: Number of documents scanned and updated
+    """
+    db = current_app.db
+    page_size = min(page_size, 500)
+    base_query = db.collection(collection_name)\
+        .select(['class', 'division', 'class_id'])\
+        .order_by('__name__')\
+        .limit(page_size)
+
+    scanned = updated = 0
+    last_doc = None
+    while True:
+        query = base_query.start_after(last_doc) if last_doc else base_query
+        docs = list(query.stream())
+        if not docs:
+            break
+
+        batch = db.batch()
+        pending = 0
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get('class_id') or data.get('class') in (None, '') or not data.get('division'):
+                continue
+            batch.update(doc.reference, {'class_id': f"{data['class']}-{data['division']}"})
+            pending += 1
+        if pending:
+            batch.commit()
+
+        scanned += len(docs)
+        updated += pending
+        last_doc = docs[-1]
+        current_app.logger.info(f"Backfilled class_id on {updated} of {scanned} {collection_name} documents")
+
+    return {'scanned': scanned, 'updated': updated}
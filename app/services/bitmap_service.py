@@ -0,0 +1,311 @@
+"""Per-student, per-month attendance bitmaps.
+
+Each ``attendance_bitmaps/{student_id}_{YYYY-MM}`` document holds two packed
+4-byte bitmaps where bit ``d - 1`` stands for day ``d`` of the month:
+``recorded`` marks days with an attendance record and ``present`` marks days
+the student was present. Attendance writers stage bitmap updates in the
+same transaction as the record, so percentages, streaks and class heatmaps
+are computed from a handful of small documents with NumPy instead of
+scanning records.
+"""
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from app.services.rollup_service import class_id_for
+from app.utils.queries import chunked, stream_where_in
+
+BITMAP_COLLECTION = 'attendance_bitmaps'
+BITMAP_BITS = 32  # Days 1-31, packed into 4 bytes
+EMPTY_BITMAP = bytes(BITMAP_BITS // 8)
+
+def bitmap_ref(db, student_id, month):
+    """Get the bitmap document of a student-month"""
+    return db.collection(BITMAP_COLLECTION).document(f"{student_id}_{month}")
+
+def decode(data):
+    """Unpack bitmap bytes into a boolean array indexed by day - 1"""
+    return np.unpackbits(np.frombuffer(data or EMPTY_BITMAP, dtype=np.uint8), bitorder='little').astype(bool)
+
+def encode(bits):
+    """Pack a boolean array indexed by day - 1 into bitmap bytes"""
+    return np.packbits(np.asarray(bits, dtype=np.uint8), bitorder='little').tobytes()
+
+def decode_many(blobs):
+    """Unpack many bitmaps at once into a (len(blobs), 32) boolean matrix"""
+    if not blobs:
+        return np.zeros((0, BITMAP_BITS), dtype=bool)
+    packed = np.frombuffer(b''.join(b or EMPTY_BITMAP for b in blobs), dtype=np.uint8)
+    return np.unpackbits(packed.reshape(len(blobs), -1), axis=1, bitorder='little').astype(bool)
+
+def _position(record):
+    """Get (student_id, month, day index) of a record, or None"""
+    if not record or not record.get('student_id') or not record.get('date'):
+        return None
+    try:
+        day = datetime.strptime(record['date'], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    return record['student_id'], day.strftime('%Y-%m'), day.day - 1
+
+def _removed_days(changes):
+    """(student_id, date) pairs a change takes a record away from"""
+    days = set()
+    for old_record, new_record in changes:
+        old_position = _position(old_record)
+        if old_position and old_position != _position(new_record):
+            days.add((old_record['student_id'], old_record['date']))
+    return days
+
+def read_bitmap_state(db, transaction, changes, changed_paths):
+    """Read inside a transaction everything ``stage_bitmap_changes`` needs
+
+    Args:
+        db: Firestore client
+        transaction: Transaction the record writes use
+        changes: List of (old_record, new_record) pairs
+        changed_paths: Document paths of the records being changed, which
+            are not counted as surviving records of their day
+
+    Returns:
+        tuple: (bitmap snapshots by document ID, surviving records by
+        (student_id, date) for every day a record is removed from)
+    """
+    refs = [bitmap_ref(db, *key) for key in bitmap_keys(changes)]
+    snapshots = {doc.id: doc for doc in transaction.get_all(refs)} if refs else {}
+
+    survivors = {}
+    for student_id, date in _removed_days(changes):
+        query = db.collection('attendance')\
+            .where('student_id', '==', student_id)\
+            .where('date', '==', date)\
+            .select(['status', 'timestamp'])
+        survivors[(student_id, date)] = [
+            doc.to_dict() for doc in transaction.get(query) if doc.reference.path not in changed_paths
+        ]
+    return snapshots, survivors
+
+def stage_bitmap_changes(db, transaction, changes, snapshots, survivors):
+    """Stage bitmap updates for attendance record changes in a transaction
+
+    Snapshots and survivors must come from ``read_bitmap_state`` on the same
+    transaction, so concurrent writers to a student-month retry instead of
+    overwriting each other. A day loses its ``recorded`` bit only when no
+    other record of the student remains on it; otherwise the latest
+    surviving record decides ``present``.
+
+    Args:
+        db: Firestore client
+        transaction: Transaction the record writes use
+        changes: Iterable of (old_record, new_record); None for created/deleted
+        snapshots: Bitmap snapshots by document ID
+        survivors: Remaining records by (student_id, date) for removed days
+
+    Returns:
+        int: Number of bitmap writes staged
+    """
+    removals = {}
+    additions = {}
+    for old_record, new_record in changes:
+        old_position = _position(old_record)
+        new_position = _position(new_record)
+        if old_position and old_position != new_position:
+            remaining = survivors.get((old_record['student_id'], old_record['date']), [])
+            latest = max(remaining, key=lambda r: str(r.get('timestamp', '')), default=None)
+            removals.setdefault(old_position[:2], []).append(
+                (old_position[2], None if latest is None else latest.get('status') == 'PRESENT', None)
+            )
+        if new_position:
+            additions.setdefault(new_position[:2], []).append(
+                (new_position[2], new_record.get('status') == 'PRESENT', class_id_for(new_record))
+            )
+    keys = set(removals) | set(additions)
+    if not keys:
+        return 0
+
+    for key in keys:
+        ref = bitmap_ref(db, *key)
+        doc = snapshots.get(ref.id)
+        data = doc.to_dict() if doc is not None and doc.exists else {}
+        recorded = decode(data.get('recorded'))
+        present = decode(data.get('present'))
+        class_id = data.get('class_id')
+
+        # Removals first, so a record moved onto a day is not cleared by one moved off it
+        for day, is_present, record_class_id in removals.get(key, []) + additions.get(key, []):
+            recorded[day] = is_present is not None
+            present[day] = bool(is_present)
+            class_id = record_class_id or class_id
+
+        transaction.set(ref, {
+            'student_id': key[0],
+            'month': key[1],
+            'class_id': class_id,
+            'recorded': encode(recorded),
+            'present': encode(present),
+            'updated_at': datetime.utcnow().isoformat()
+        })
+    return len(keys)
+
+def bitmap_keys(changes):
+    """Distinct (student_id, month) pairs touched by record changes"""
+    keys = set()
+    for old_record, new_record in changes:
+        for record in (old_record, new_record):
+            position = _position(record)
+            if position:
+                keys.add(position[:2])
+    return keys
+
+def _months(start_month, end_month):
+    months = []
+    year, month = map(int, start_month.split('-'))
+    end_year, end = map(int, end_month.split('-'))
+    while (year, month) <= (end_year, end):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def _streaks(present_days):
+    """Longest and current run of present days among recorded days"""
+    if not len(present_days):
+        return 0, 0
+    # Runs of True are delimited by the edges of a padded diff
+    padded = np.concatenate(([0], present_days.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    runs = edges[1::2] - edges[::2]
+    longest = int(runs.max()) if len(runs) else 0
+    current = int(runs[-1]) if len(runs) and edges[-1] == len(present_days) else 0
+    return longest, current
+
+def student_summary(student_id, start_month, end_month):
+    """Attendance percentage and streaks of a student over a range of months
+
+    Returns:
+        dict: recorded_days, present_days, percentage, longest_streak,
+        current_streak and per-month counts
+    """
+    db = current_app.db
+    months = _months(start_month, end_month)
+    docs = {doc.id: doc.to_dict() for doc in db.get_all([bitmap_ref(db, student_id, m) for m in months]) if doc.exists}
+
+    blobs = [docs.get(f"{student_id}_{m}", {}) for m in months]
+    recorded = decode_many([b.get('recorded') for b in blobs])
+    present = decode_many([b.get('present') for b in blobs])
+
+    # Streaks only count school days, i.e. days with a record
+    longest, current = _streaks(present[recorded])
+    recorded_days = int(recorded.sum())
+    present_days = int(present.sum())
+    return {
+        'student_id': student_id,
+        'recorded_days': recorded_days,
+        'present_days': present_days,
+        'percentage': round(present_days / recorded_days * 100, 2) if recorded_days else 0.0,
+        'longest_streak': longest,
+        'current_streak': current,
+        'months': {
+            month: {'recorded': int(r), 'present': int(p)}
+            for month, r, p in zip(months, recorded.sum(axis=1), present.sum(axis=1))
+        }
+    }
+
+def student_totals(start_month, end_month):
+    """Recorded and present day counts of every student over a range of months
+
+    Returns:
+        dict: student_id -> (recorded_days, present_days)
+    """
+    query = current_app.db.collection(BITMAP_COLLECTION).select(['student_id', 'recorded', 'present'])
+    docs = [doc.to_dict() for doc in stream_where_in(query, 'month', _months(start_month, end_month))]
+    if not docs:
+        return {}
+
+    student_ids, rows = np.unique([d['student_id'] for d in docs], return_inverse=True)
+    recorded = np.bincount(rows, weights=decode_many([d.get('recorded') for d in docs]).sum(axis=1))
+    present = np.bincount(rows, weights=decode_many([d.get('present') for d in docs]).sum(axis=1))
+    return {sid: (int(r), int(p)) for sid, r, p in zip(student_ids.tolist(), recorded, present)}
+
+def class_month_matrix(class_id, month):
+    """Decode every bitmap of a class-month into student × day matrices
+
+    Returns:
+        tuple: (student IDs, recorded matrix, present matrix), matrices of
+        shape (students, 32) with column d - 1 for day d
+    """
+    query = current_app.db.collection(BITMAP_COLLECTION)\
+        .where('class_id', '==', class_id)\
+        .where('month', '==', month)
+    docs = sorted((doc.to_dict() for doc in query.stream()), key=lambda d: d['student_id'])
+    student_ids = [d['student_id'] for d in docs]
+    return student_ids, decode_many([d.get('recorded') for d in docs]), decode_many([d.get('present') for d in docs])
+
+def class_summary(class_id, month):
+    """Per-student percentages and a per-day heatmap for a class-month"""
+    student_ids, recorded, present = class_month_matrix(class_id, month)
+    recorded_per_student = recorded.sum(axis=1)
+    present_per_student = present.sum(axis=1)
+    recorded_per_day = recorded.sum(axis=0)
+    present_per_day = present.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        student_rates = np.where(recorded_per_student > 0, present_per_student / recorded_per_student * 100, 0.0)
+        day_rates = np.where(recorded_per_day > 0, present_per_day / recorded_per_day * 100, np.nan)
+
+    return {
+        'class_id': class_id,
+        'month': month,
+        'students': [
+            {'student_id': sid, 'recorded_days': int(r), 'present_days': int(p), 'percentage': round(float(rate), 2)}
+            for sid, r, p, rate in zip(student_ids, recorded_per_student, present_per_student, student_rates)
+        ],
+        'heatmap': {
+            f"{month}-{day + 1:02d}": round(float(day_rates[day]), 2)
+            for day in np.flatnonzero(recorded_per_day)
+        }
+    }
+
+def rebuild_bitmaps(start_date, end_date):
+    """Recompute bitmaps of the months covering a date range from attendance records
+
+    Returns:
+        int: Number of bitmap documents written
+    """
+    from app.services.attendance_repository import AttendanceRepository
+
+    db = current_app.db
+    months = _months(start_date[:7], end_date[:7])
+    first = f"{months[0]}-01"
+    last = f"{months[-1]}-31"
+
+    bitmaps = {}
+    records = AttendanceRepository(db).list_in_range(
+        first, last, fields=['student_id', 'date', 'status', 'class_id', 'class', 'division', 'timestamp']
+    )
+    # Apply records oldest first so the latest mark of a day wins
+    for record in sorted(records, key=lambda r: (r.get('date', ''), str(r.get('timestamp', '')))):
+        position = _position(record)
+        if not position:
+            continue
+        student_id, month, day = position
+        entry = bitmaps.setdefault((student_id, month), {
+            'recorded': np.zeros(BITMAP_BITS, dtype=bool),
+            'present': np.zeros(BITMAP_BITS, dtype=bool),
+            'class_id': None
+        })
+        entry['recorded'][day] = True
+        entry['present'][day] = record.get('status') == 'PRESENT'
+        entry['class_id'] = class_id_for(record) or entry['class_id']
+
+    for chunk in chunked(list(bitmaps.items()), 500):
+        batch = db.batch()
+        for (student_id, month), entry in chunk:
+            batch.set(bitmap_ref(db, student_id, month), {
+                'student_id': student_id,
+                'month': month,
+                'class_id': entry['class_id'],
+                'recorded': encode(entry['recorded']),
+                'present': encode(entry['present']),
+                'updated_at': datetime.utcnow().isoformat()
+            })
+        batch.commit()
+    return len(bitmaps)
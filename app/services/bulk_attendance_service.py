@@ -0,0 +1,173 @@
+"""Bulk update and delete of attendance records by ID list or filter."""
+import uuid
+from datetime import datetime
+from flask import current_app
+from app.services.rollup_service import class_id_for, commit_record_changes
+from app.utils.queries import chunked
+
+JOBS_COLLECTION = 'attendance_bulk_jobs'
+VALID_STATUSES = ['PRESENT', 'ABSENT']
+# The only fields a bulk update may set
+EDITABLE_FIELDS = {'status', 'remarks'}
+GET_ALL_CHUNK = 300
+WRITE_CHUNK = 250
+
+class BulkAttendanceService:
+    """Apply one update or a delete to many attendance records.
+
+    Targets are either explicit document IDs or a filter of ``class_id`` and
+    a date range. Permissions are checked once per request for filters and
+    against the loaded records for ID lists, and changes are committed with
+    their rollups in chunked batches.
+    """
+
+    def __init__(self, db, role, classes=None, user_id=None):
+        self.db = db
+        self.role = role
+        self.classes = list(classes or [])
+        self.user_id = user_id
+
+    def validate_update(self, fields):
+        """Check the fields of a bulk update, raising ValueError or PermissionError"""
+        if not isinstance(fields, dict):
+            raise ValueError('fields must be an object')
+        if not fields:
+            raise ValueError('No fields to update')
+        if set(fields) - EDITABLE_FIELDS:
+            raise ValueError(f"Cannot update {', '.join(sorted(set(fields) - EDITABLE_FIELDS))}")
+        if self.role == 'teacher' and set(fields) - {'status'}:
+            raise PermissionError('Teachers can only update attendance status')
+        if 'status' in fields and fields['status'] not in VALID_STATUSES:
+            raise ValueError('Invalid status provided')
+        if 'remarks' in fields and not isinstance(fields['remarks'], str):
+            raise ValueError('remarks must be a string')
+
+    def validate_filter(self, filters):
+        """Check a filter once up front, raising ValueError or PermissionError"""
+        if not isinstance(filters, dict):
+            raise ValueError('filters must be an object')
+        class_id = filters.get('class_id')
+        start_date = filters.get('start_date')
+        end_date = filters.get('end_date')
+        if not class_id or not start_date or not end_date:
+            raise ValueError('Filters require class_id, start_date and end_date')
+        try:
+            datetime.strptime(start_date, '%Y-%m-%d')
+            datetime.strptime(end_date, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError('Invalid date format. Use YYYY-MM-DD')
+        if self.role == 'teacher' and class_id not in self.classes:
+            raise PermissionError('Unauthorized for this class')
+
+    def filter_query(self, filters):
+        return self.db.collection('attendance')\
+            .where('class_id', '==', filters['class_id'])\
+            .where('date', '>=', filters['start_date'])\
+            .where('date', '<=', filters['end_date'])
+
+    def matching_ids(self, filters):
+        """IDs of the records matching a filter, read in full before any write"""
+        return [doc.id for doc in self.filter_query(filters).select([]).stream()]
+
+    def count_matches(self, filters):
+        """Count records matching a filter with a server-side aggregation"""
+        result = self.filter_query(filters).count(alias='total').get()
+        return int(result[0][0].value)
+
+    def _load_by_ids(self, doc_ids):
+        collection = self.db.collection('attendance')
+        for chunk in chunked(doc_ids, GET_ALL_CHUNK):
+            yield from self.db.get_all([collection.document(doc_id) for doc_id in chunk])
+
+    def _allowed(self, record):
+        return self.role != 'teacher' or class_id_for(record) in self.classes
+
+    def apply(self, doc_ids=None, filters=None, fields=None, delete=False, progress=None):
+        """Update or delete every targeted record
+
+        Args:
+            doc_ids: Attendance document IDs to change
+            filters: Dict of class_id, start_date and end_date, used when no IDs are given
+            fields: Fields to set on each record when updating
+            delete: Delete the records instead of updating them
+            progress: Optional callback receiving the summary after each chunk
+
+        Returns:
+            dict: matched, updated, deleted, not_found and forbidden counts
+        """
+        summary = {'matched': 0, 'updated': 0, 'deleted': 0, 'not_found': 0, 'forbidden': []}
+        if doc_ids is not None:
+            doc_ids = list(dict.fromkeys(doc_ids))
+        else:
+            # Collect the IDs first, so the query stream is closed before writing
+            doc_ids = self.matching_ids(filters)
+        snapshots = self._load_by_ids(doc_ids)
+
+        metadata = {
+            'updated_at': datetime.now().isoformat(),
+            'updated_by': self.user_id
+        }
+        changes = []
+        for doc in snapshots:
+            if not doc.exists:
+                summary['not_found'] += 1
+                continue
+            record = doc.to_dict()
+            if not self._allowed(record):
+                summary['forbidden'].append(doc.id)
+                continue
+
+            summary['matched'] += 1
+            new_record = None if delete else {**record, **fields, **metadata}
+            changes.append((doc.reference, record, new_record))
+            if len(changes) >= WRITE_CHUNK:
+                self._commit(changes, delete, summary, progress)
+                changes = []
+
+        self._commit(changes, delete, summary, progress)
+        return summary
+
+    def _commit(self, changes, delete, summary, progress):
+        if not changes:
+            return
+        written = commit_record_changes(self.db, changes)
+        summary['deleted' if delete else 'updated'] += len(written)
+        if progress:
+            progress(summary)
+
+    def start_job(self, filters, fields=None, delete=False, started_by=None):
+        """Create a job document for a bulk change that runs in the background"""
+        job_id = uuid.uuid4().hex
+        self.db.collection(JOBS_COLLECTION).document(job_id).set({
+            'status': 'queued',
+            'action': 'delete' if delete else 'update',
+            'filters': filters,
+            'fields': fields or {},
+            'started_by': started_by,
+            'created_at': datetime.utcnow().isoformat()
+        })
+        return job_id
+
+    def run_job(self, job_id, filters, fields=None, delete=False):
+        """Apply a filtered bulk change, recording progress on the job document"""
+        job_ref = self.db.collection(JOBS_COLLECTION).document(job_id)
+        job_ref.set({'status': 'running', 'started_at': datetime.utcnow().isoformat()}, merge=True)
+
+        def record_progress(summary):
+            job_ref.set({'summary': {**summary, 'forbidden': len(summary['forbidden'])}}, merge=True)
+
+        summary = self.apply(filters=filters, fields=fields, delete=delete, progress=record_progress)
+        job_ref.set({
+            'status': 'completed',
+            'summary': {**summary, 'forbidden': len(summary['forbidden'])},
+            'completed_at': datetime.utcnow().isoformat()
+        }, merge=True)
+        current_app.logger.info(f"Bulk attendance job {job_id} finished: {summary['matched']} records")
+        return summary
+
+    def get_job(self, job_id):
+        """Return a bulk job's status and summary"""
+        doc = self.db.collection(JOBS_COLLECTION).document(job_id).get()
+        if not doc.exists:
+            return None
+        return {'job_id': job_id, **doc.to_dict()}
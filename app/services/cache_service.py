@@ -1,11 +1,45 @@
-"""Caching service for the application."""
+"""Caching service for the application.
+
+Values are cached in two tiers: a per-process LRU in front of the shared
+flask-caching backend (Redis in production). Entries can carry tags such as
+``class:5-A`` or ``subjects``; invalidating a tag bumps its version in the
+shared backend, so shared entries written under the old version are ignored,
+and broadcasts the tag over Redis pub/sub so every worker drops its local
+copies. Without a Redis backend the shared tier, tag versions, invalidation
+broadcasts and ``cache.add`` deduplication are all per process, so with
+several workers an invalidation only reaches the worker that issued it and
+the others serve their copies until ``CACHE_LOCAL_TTL`` or the entry's
+timeout expires.
+"""
 from flask_caching import Cache
 from functools import wraps
 from flask import current_app
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import random
 import threading
+import time
+import uuid
+import redis
 
 cache = Cache()
 _cache_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+TAG_PREFIX = 'cache-tag'
+MAX_KEY_LENGTH = 200
+
+# Striped re-entrant locks bound memory while letting nested cached calls proceed
+LOCK_STRIPES = 256
+_local_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
 
 def init_cache(app):
     """Initialize the cache with the application."""
@@ -14,112 +48,493 @@ def init_cache(app):
             'CACHE_TYPE': app.config.get('CACHE_TYPE', 'simple'),
             'CACHE_DEFAULT_TIMEOUT': app.config.get('CACHE_DEFAULT_TIMEOUT', 300),
         }
-        
+
         if app.config.get('CACHE_TYPE') == 'redis':
             cache_config.update({
                 'CACHE_REDIS_URL': app.config.get('CACHE_REDIS_URL'),
             })
-        
+
         if not hasattr(app, '_cache_initialized'):
             cache.init_app(app, config=cache_config)
             app._cache_initialized = True
-        
+            two_tier.configure(app)
+            if cache_config['CACHE_TYPE'] != 'redis' and not (app.debug or app.testing):
+                app.logger.warning(
+                    "CACHE_TYPE is not 'redis': cache invalidation, user session invalidation "
+                    "and email deduplication only apply within each worker process"
+                )
+
         return cache
 
-def cached_with_key(key_prefix, timeout=None):
-    """Custom caching decorator with dynamic key generation."""
+class LocalLRU:
+    """Thread-safe LRU with per-entry expiry and a tag index"""
+
+    def __init__(self, maxsize=2048, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None, tags=()):
+        ttl = min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class TwoTierCache:
+    """Per-process LRU in front of the shared cache, with tag invalidation.
+
+    Cached values are shared between requests of a worker, so callers must
+    treat them as read-only.
+    """
+
+    def __init__(self):
+        self.local = LocalLRU()
+        self.node_id = uuid.uuid4().hex
+        self.channel = 'cache-invalidation'
+        self._redis_url = None
+        self._redis = None
+        self._subscriber_pid = None
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def configure(self, app):
+        self.local = LocalLRU(
+            maxsize=app.config.get('CACHE_LOCAL_SIZE', 2048),
+            ttl=app.config.get('CACHE_LOCAL_TTL', 30)
+        )
+        self.channel = app.config.get('CACHE_INVALIDATION_CHANNEL', 'cache-invalidation')
+        if app.config.get('CACHE_TYPE') == 'redis':
+            self._redis_url = app.config.get('CACHE_REDIS_URL')
+
+    # Statistics
+
+    def _record(self, namespace, outcome):
+        with self._stats_lock:
+            counters = self._stats.setdefault(namespace, {'local_hits': 0, 'shared_hits': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def stats(self):
+        """Hit counters and hit ratio per namespace for this worker"""
+        with self._stats_lock:
+            report = {}
+            for namespace, counters in self._stats.items():
+                lookups = sum(counters.values())
+                hits = counters['local_hits'] + counters['shared_hits']
+                report[namespace] = {
+                    **counters,
+                    'hit_ratio': round(hits / lookups, 4) if lookups else 0.0
+                }
+            return report
+
+    # Reads and writes
+
+    @staticmethod
+    def _key(namespace, key):
+        return f"{namespace}:{key}"
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return {}
+        keys = [f"{TAG_PREFIX}:{tag}" for tag in tags]
+        return dict(zip(tags, cache.get_many(*keys)))
+
+    def get(self, namespace, key):
+        """Get a value from the local tier, then the shared tier, or None"""
+        self._ensure_subscriber()
+        full_key = self._key(namespace, key)
+        value = self.local.get(full_key)
+        if value is not None:
+            self._record(namespace, 'local_hits')
+            return value
+
+        try:
+            entry = cache.get(full_key)
+            if entry is not None and entry['tags'] == self._tag_versions(list(entry['tags'])):
+                self.local.set(full_key, entry['value'], tags=entry['tags'].keys())
+                self._record(namespace, 'shared_hits')
+                return entry['value']
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {full_key}: {str(e)}")
+
+        self._record(namespace, 'misses')
+        return None
+
+    def tag_versions(self, tags):
+        """Current versions of tags, creating missing ones, or None if unavailable
+
+        Capture them before computing a value and pass them to ``set``, so a
+        tag invalidated during the computation is not cached under its new
+        version.
+        """
+        try:
+            versions = self._tag_versions(list(tags or ()))
+            for tag, version in versions.items():
+                if version is None:
+                    version = uuid.uuid4().hex
+                    # Another worker may have created the tag meanwhile; keep theirs
+                    if not cache.add(f"{TAG_PREFIX}:{tag}", version, timeout=0):
+                        version = cache.get(f"{TAG_PREFIX}:{tag}")
+                    versions[tag] = version
+            return versions
+        except Exception as e:
+            logger.warning(f"Tag version read failed for {', '.join(tags)}: {str(e)}")
+            return None
+
+    def set(self, namespace, key, value, timeout=None, tags=(), versions=None):
+        """Store a value in both tiers under the version of its tags
+
+        ``versions`` are the tag versions from ``tag_versions`` taken before
+        the value was computed; if a tag was invalidated since, the value is
+        not cached. Without them the current versions are used.
+        """
+        self._ensure_subscriber()
+        full_key = self._key(namespace, key)
+        tags = list(tags or ())
+        # Cache locally before reading the versions, so an invalidation from
+        # here on removes the entry and one before it shows as a new version
+        self.local.set(full_key, value, ttl=timeout, tags=tags)
+        current = self.tag_versions(tags)
+        if current is None:
+            return
+        if versions is not None and versions != current:
+            self.local.delete(full_key)
+            return
+        try:
+            cache.set(full_key, {'value': value, 'tags': current}, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {full_key}: {str(e)}")
+
+    def delete(self, namespace, key):
+        """Delete one key from both tiers and from other workers' local tier"""
+        full_key = self._key(namespace, key)
+        self.local.delete(full_key)
+        try:
+            cache.delete(full_key)
+        except Exception as e:
+            logger.warning(f"Shared cache delete failed for {full_key}: {str(e)}")
+        self._publish(keys=[full_key])
+
+    def invalidate_tags(self, *tags):
+        """Invalidate every entry tagged with any of the tags, in every worker"""
+        # Bump the versions before dropping local entries, so a value being
+        # cached concurrently either sees the new version or is dropped here
+        try:
+            cache.set_many({f"{TAG_PREFIX}:{tag}": uuid.uuid4().hex for tag in tags}, timeout=0)
+        except Exception as e:
+            logger.warning(f"Tag invalidation failed for {', '.join(tags)}: {str(e)}")
+        self.local.invalidate_tags(tags)
+        self._publish(tags=list(tags))
+
+    # Cross-worker invalidation
+
+    def _publish(self, tags=None, keys=None):
+        if not self._redis_url:
+            return
+        message = json.dumps({'origin': self.node_id, 'tags': tags or [], 'keys': keys or []})
+        try:
+            self._client().publish(self.channel, message)
+        except Exception as e:
+            logger.warning(f"Cache invalidation broadcast failed: {str(e)}")
+
+    def shared_lock(self, name, timeout):
+        """Redis lock shared by all workers, or None without a Redis backend"""
+        if not self._redis_url:
+            return None
+        return self._client().lock(f"cache-lock:{name}", timeout=timeout)
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(self._redis_url)
+        return self._redis
+
+    def _ensure_subscriber(self):
+        """Start the invalidation listener once per process, including after a fork"""
+        if not self._redis_url or self._subscriber_pid == os.getpid():
+            return
+        with _cache_lock:
+            if self._subscriber_pid == os.getpid():
+                return
+            self._subscriber_pid = os.getpid()
+            self._redis = None
+            threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(self._redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self._handle(message.get('data'))
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener reconnecting: {str(e)}")
+                # Entries cached while disconnected may have missed invalidations
+                self.local.clear()
+                time.sleep(1)
+
+    def _handle(self, data):
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if payload.get('origin') == self.node_id:
+            return
+        self.local.invalidate_tags(payload.get('tags', []))
+        for key in payload.get('keys', []):
+            self.local.delete(key)
+
+two_tier = TwoTierCache()
+
+def _key_default(obj):
+    """Reduce values JSON cannot encode to a stable representation"""
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, 'get_id'):
+        return f"{type(obj).__name__}:{obj.get_id()}"
+    if hasattr(obj, 'id'):
+        return f"{type(obj).__name__}:{obj.id}"
+    raise TypeError(f"Cannot build a cache key from {type(obj).__name__}")
+
+def make_cache_key(*args, **kwargs):
+    """Build a canonical cache key from call arguments
+
+    Keyword order does not matter, sets are sorted, dates use ISO format and
+    model objects are reduced to their ID. Long keys are hashed.
+    """
+    key = json.dumps([args, kwargs], sort_keys=True, default=_key_default, separators=(',', ':'))
+    if len(key) > MAX_KEY_LENGTH:
+        key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return key
+
+def jittered(timeout):
+    """Spread expiry times so keys cached together do not expire together"""
+    jitter = current_app.config.get('CACHE_TTL_JITTER', 0.1)
+    return max(1, int(timeout * random.uniform(1 - jitter, 1 + jitter)))
+
+@contextmanager
+def single_flight(name, blocking=True, timeout=None):
+    """Hold the process-local and Redis locks for a key
+
+    Yields True when both locks were acquired. Callers that could not get the
+    lock in time still run, so a stuck holder cannot block the key for good.
+    """
+    timeout = timeout or current_app.config.get('CACHE_LOCK_TIMEOUT', 10)
+    local_lock = _local_locks[hash(name) % LOCK_STRIPES]
+    if not local_lock.acquire(blocking, timeout if blocking else -1):
+        yield False
+        return
+
+    acquired = True
+    shared = None
+    try:
+        try:
+            shared = two_tier.shared_lock(name, timeout)
+            if shared is not None and not shared.acquire(
+                blocking=blocking, blocking_timeout=timeout if blocking else None
+            ):
+                shared = None
+                acquired = False
+        except Exception as e:
+            logger.warning(f"Cache lock unavailable for {name}: {str(e)}")
+            shared = None
+        yield acquired
+    finally:
+        if shared is not None:
+            try:
+                shared.release()
+            except Exception:
+                pass  # The lock expired while the value was being computed
+        local_lock.release()
+
+def cached_with_key(key_prefix, timeout=None, tags=(), stale_ttl=None):
+    """Custom caching decorator with dynamic key generation.
+
+    Only one caller per key recomputes a missing value; the others wait for
+    it. Once a value is older than ``timeout`` it is served stale for up to
+    ``stale_ttl`` more seconds (default: ``timeout``) while a single
+    background refresh runs. Cached functions must not depend on the request.
+    """
     def decorator(f):
+        def store(cache_key, value, versions):
+            ttl = jittered(timeout or current_app.config.get('CACHE_DEFAULT_TIMEOUT', 300))
+            stale = ttl if stale_ttl is None else stale_ttl
+            two_tier.set(key_prefix, cache_key, {'value': value, 'fresh_until': time.time() + ttl},
+                         timeout=ttl + stale, tags=tags, versions=versions)
+
+        def refresh(app, cache_key, args, kwargs):
+            with app.app_context():
+                with single_flight(f"{key_prefix}:{cache_key}", blocking=False) as acquired:
+                    if not acquired:
+                        return
+                    entry = two_tier.get(key_prefix, cache_key)
+                    if entry is not None and entry['fresh_until'] > time.time():
+                        return
+                    try:
+                        versions = two_tier.tag_versions(tags)
+                        store(cache_key, f(*args, **kwargs), versions)
+                    except Exception as e:
+                        app.logger.error(f"Background refresh of {key_prefix}:{cache_key} failed: {str(e)}")
+
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            cache_key = f"{key_prefix}:{':'.join(str(arg) for arg in args)}"
-            if kwargs:
-                cache_key += f":{':'.join(f'{k}={v}' for k, v in sorted(kwargs.items()))}"
-            
+            cache_key = make_cache_key(*args, **kwargs)
+
             # Try to get from cache
-            rv = cache.get(cache_key)
-            if rv is not None:
-                current_app.logger.debug(f"Cache hit for key: {cache_key}")
-                return rv
-            
-            # If not in cache, compute and store
-            rv = f(*args, **kwargs)
-            cache.set(cache_key, rv, timeout=timeout)
-            current_app.logger.debug(f"Cache miss for key: {cache_key}")
+            entry = two_tier.get(key_prefix, cache_key)
+            if entry is not None:
+                if entry['fresh_until'] <= time.time():
+                    _refresh_executor.submit(
+                        refresh, current_app._get_current_object(), cache_key, args, kwargs
+                    )
+                current_app.logger.debug(f"Cache hit for key: {key_prefix}:{cache_key}")
+                return entry['value']
+
+            # If not in cache, compute it once and let concurrent callers wait
+            with single_flight(f"{key_prefix}:{cache_key}"):
+                entry = two_tier.get(key_prefix, cache_key)
+                if entry is not None:
+                    return entry['value']
+                # Take the tag versions before computing, so an invalidation
+                # during the computation leaves the result uncached
+                versions = two_tier.tag_versions(tags)
+                rv = f(*args, **kwargs)
+                store(cache_key, rv, versions)
+            current_app.logger.debug(f"Cache miss for key: {key_prefix}:{cache_key}")
             return rv
         return decorated_function
     return decorator
 
-def invalidate_cache(pattern):
-    """Invalidate cache keys matching the pattern."""
-    if hasattr(cache, 'delete_memoized'):
-        cache.delete_memoized(pattern)
-    else:
-        # For simple cache, we can't do pattern matching
-        cache.clear()
+def invalidate_cache(*tags):
+    """Invalidate cached entries carrying any of the tags."""
+    two_tier.invalidate_tags(*tags)
 
 class CacheService:
     """Service for managing application caching."""
-    
+
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(CacheService, cls).__new__(cls)
         return cls._instance
-    
+
     def __init__(self):
         """Initialize cache service."""
         if not hasattr(self, 'initialized'):
             self.initialized = True
-    
+
+    @staticmethod
+    def get(namespace, key):
+        """Get a cached value."""
+        return two_tier.get(namespace, key)
+
+    @staticmethod
+    def set(namespace, key, value, timeout=None, tags=()):
+        """Cache a value, optionally tagged for group invalidation."""
+        two_tier.set(namespace, key, value, timeout=timeout, tags=tags)
+
+    @staticmethod
+    def invalidate_tags(*tags):
+        """Invalidate all entries carrying any of the tags in every worker."""
+        two_tier.invalidate_tags(*tags)
+
+    @staticmethod
+    def stats():
+        """Per-namespace hit ratios for this worker."""
+        return two_tier.stats()
+
     @staticmethod
     def cache_user(user_id, user_data, timeout=300):
         """Cache user data."""
-        key = f"user:{user_id}"
-        cache.set(key, user_data, timeout=timeout)
-    
+        two_tier.set('user', user_id, user_data, timeout=timeout, tags=[f"user:{user_id}"])
+
     @staticmethod
     def get_cached_user(user_id):
         """Get cached user data."""
-        return cache.get(f"user:{user_id}")
-    
+        return two_tier.get('user', user_id)
+
     @staticmethod
     def cache_attendance(date, class_id, attendance_data, timeout=3600):
         """Cache attendance data."""
-        key = f"attendance:{date}:{class_id}"
-        cache.set(key, attendance_data, timeout=timeout)
-    
+        two_tier.set('attendance', f"{date}:{class_id}", attendance_data,
+                     timeout=timeout, tags=[f"class:{class_id}"])
+
     @staticmethod
     def get_cached_attendance(date, class_id):
         """Get cached attendance data."""
-        return cache.get(f"attendance:{date}:{class_id}")
-    
+        return two_tier.get('attendance', f"{date}:{class_id}")
+
     @staticmethod
     def cache_subject_list(timeout=3600):
         """Decorator for caching subject lists."""
         def decorator(f):
             @wraps(f)
             def decorated_function(*args, **kwargs):
-                key = "subject_list"
-                result = cache.get(key)
+                result = two_tier.get('subject_list', 'all')
                 if result is None:
                     result = f(*args, **kwargs)
-                    cache.set(key, result, timeout=timeout)
+                    two_tier.set('subject_list', 'all', result, timeout=timeout, tags=['subjects'])
                 return result
             return decorated_function
         return decorator
-    
+
     @staticmethod
     def invalidate_user_cache(user_id):
         """Invalidate user cache."""
-        cache.delete(f"user:{user_id}")
-    
+        two_tier.invalidate_tags(f"user:{user_id}")
+
     @staticmethod
     def invalidate_attendance_cache(date, class_id):
         """Invalidate attendance cache."""
-        cache.delete(f"attendance:{date}:{class_id}")
-    
+        two_tier.delete('attendance', f"{date}:{class_id}")
+
     @staticmethod
     def invalidate_subject_list():
         """Invalidate subject list cache."""
-        cache.delete("subject_list") 
\ No newline at end of file
+        two_tier.invalidate_tags('subjects')
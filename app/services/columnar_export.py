@@ -0,0 +1,193 @@
+"""Columnar (Parquet / Arrow IPC) export of attendance history."""
+import os
+from datetime import datetime, date
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+DICTIONARY_FIELDS = ('class', 'division', 'class_id', 'status')
+
+ATTENDANCE_SCHEMA = pa.schema([
+    ('doc_id', pa.string()),
+    ('date', pa.date32()),
+    ('timestamp', pa.timestamp('us')),
+    ('student_id', pa.string()),
+    ('student_name', pa.string()),
+    ('class', pa.dictionary(pa.int32(), pa.string())),
+    ('division', pa.dictionary(pa.int32(), pa.string())),
+    ('class_id', pa.dictionary(pa.int32(), pa.string())),
+    ('status', pa.dictionary(pa.int32(), pa.string())),
+    ('subject_id', pa.string()),
+    ('subject_name', pa.string()),
+    ('marked_by', pa.string()),
+    ('confidence', pa.float64()),
+])
+
+# Dictionary columns as plain strings, for spooling before the dictionaries are known
+PLAIN_SCHEMA = pa.schema([
+    pa.field(field.name, pa.string()) if field.name in DICTIONARY_FIELDS else field
+    for field in ATTENDANCE_SCHEMA
+])
+
+BATCH_ROWS = 5000
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def _parse_timestamp(value):
+    if isinstance(value, datetime):
+        # Firestore timestamps are timezone-aware UTC values
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _plain_batch(records):
+    """Convert a list of attendance records into a batch of PLAIN_SCHEMA"""
+    columns = []
+    for field in PLAIN_SCHEMA:
+        name = field.name
+        if name == 'date':
+            values = [_parse_date(r.get('date')) for r in records]
+        elif name == 'timestamp':
+            values = [_parse_timestamp(r.get('timestamp')) for r in records]
+        elif name == 'confidence':
+            values = [_parse_float(r.get('confidence')) for r in records]
+        elif name == 'student_name':
+            values = [r.get('student_name') or r.get('name') for r in records]
+        else:
+            values = [None if r.get(name) in (None, '') else str(r.get(name)) for r in records]
+
+        columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=PLAIN_SCHEMA)
+
+def _encode(batch, dictionaries=None):
+    """Dictionary-encode a PLAIN_SCHEMA batch into ATTENDANCE_SCHEMA
+
+    With ``dictionaries`` every batch shares the given value lists, which the
+    IPC file format requires; without, each batch gets its own dictionaries.
+    """
+    columns = []
+    for field in ATTENDANCE_SCHEMA:
+        column = batch.column(field.name)
+        if field.name not in DICTIONARY_FIELDS:
+            columns.append(column)
+        elif dictionaries is None:
+            columns.append(column.dictionary_encode())
+        else:
+            dictionary = dictionaries[field.name]
+            indices = pc.index_in(column, value_set=dictionary).cast(pa.int32())
+            columns.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+    return pa.RecordBatch.from_arrays(columns, schema=ATTENDANCE_SCHEMA)
+
+def _month_of(record):
+    parsed = _parse_date(record.get('date'))
+    return parsed.strftime('%Y-%m') if parsed else 'unknown'
+
+class _PartitionWriter:
+    """Write one month partition as a Parquet or Arrow IPC file
+
+    Parquet stores dictionaries per row group, so batches are written as they
+    come. An IPC file allows only one dictionary per column, so Arrow batches
+    are first spooled to a plain-string stream next to the output while their
+    values are collected, and encoded against the partition's combined
+    dictionaries on close.
+    """
+
+    def __init__(self, directory, month, file_format):
+        partition_dir = os.path.join(directory, f"month={month}")
+        os.makedirs(partition_dir, exist_ok=True)
+        extension = 'parquet' if file_format == 'parquet' else 'arrow'
+        # Unordered input can revisit a month, so never overwrite an earlier part
+        index = len(os.listdir(partition_dir))
+        self.path = os.path.join(partition_dir, f"part-{index}.{extension}")
+        self.file_format = file_format
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(self.path, ATTENDANCE_SCHEMA, compression='zstd')
+        else:
+            self._spool_path = f"{self.path}.spool"
+            self._spool_sink = pa.OSFile(self._spool_path, 'wb')
+            self._writer = ipc.new_stream(self._spool_sink, PLAIN_SCHEMA)
+            self._values = {name: set() for name in DICTIONARY_FIELDS}
+
+    def write(self, records):
+        batch = _plain_batch(records)
+        if self.file_format == 'parquet':
+            self._writer.write_batch(_encode(batch))
+            return
+        for name in DICTIONARY_FIELDS:
+            self._values[name].update(v for v in pc.unique(batch.column(name)).to_pylist() if v is not None)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        if self.file_format == 'parquet':
+            return
+        self._spool_sink.close()
+
+        dictionaries = {name: pa.array(sorted(values), type=pa.string()) for name, values in self._values.items()}
+        with pa.OSFile(self.path, 'wb') as sink, pa.memory_map(self._spool_path) as source:
+            with ipc.new_file(sink, ATTENDANCE_SCHEMA) as writer:
+                for batch in ipc.open_stream(source):
+                    writer.write_batch(_encode(batch, dictionaries))
+        os.remove(self._spool_path)
+
+def write_partitioned(records, directory, file_format='parquet'):
+    """Write records into month=YYYY-MM partitions under directory
+
+    Records are expected in date order, so each month is written by a single
+    open writer and only BATCH_ROWS records are held in memory at a time.
+
+    Args:
+        records: Iterable of attendance record dicts
+        directory: Output directory for the partitions
+        file_format: 'parquet' or 'arrow'
+
+    Returns:
+        list: Paths of the files written
+    """
+    if file_format not in ('parquet', 'arrow'):
+        raise ValueError(f"Unsupported columnar format: {file_format}")
+
+    paths = []
+    writer = None
+    current_month = None
+    pending = []
+
+    for record in records:
+        month = _month_of(record)
+        if month != current_month:
+            if writer:
+                if pending:
+                    writer.write(pending)
+                writer.close()
+                pending = []
+            writer = _PartitionWriter(directory, month, file_format)
+            paths.append(writer.path)
+            current_month = month
+
+        pending.append(record)
+        if len(pending) >= BATCH_ROWS:
+            writer.write(pending)
+            pending = []
+
+    if writer:
+        if pending:
+            writer.write(pending)
+        writer.close()
+    return paths
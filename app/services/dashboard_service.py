@@ -0,0 +1,131 @@
+"""Concurrent loading of the independent queries behind the dashboard."""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import current_app
+from app.services.attendance_repository import AttendanceRepository, STATUS_FIELDS, RECENT_FIELDS
+from app.services.rollup_service import get_daily_rollups
+from app.services.stats_service import count_students, count_subjects
+from app.utils.queries import stream_where_in
+
+# Shared across requests so a dashboard hit does not pay for thread start-up
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='dashboard')
+
+class DashboardLoader:
+    """Run the dashboard's queries in parallel under a total deadline.
+
+    Each query runs on the shared pool inside an application context. Queries
+    that miss the deadline fall back to their default value, so a slow
+    Firestore call degrades one widget instead of the whole page.
+    """
+
+    def __init__(self, role, classes=None, user_id=None, class_id=None, deadline=None):
+        self.role = role
+        self.classes = list(classes or [])
+        self.user_id = user_id
+        self.class_id = class_id
+        self.deadline = deadline or current_app.config.get('DASHBOARD_DEADLINE_SECONDS', 5)
+
+    def load(self, start_date, end_date, recent_limit=5):
+        """Load counts, daily attendance and recent records for a date range"""
+        app = current_app._get_current_object()
+        tasks = {
+            'total_students': (self._total_students, 0),
+            'total_subjects': (self._total_subjects, 0),
+            'daily_attendance': (lambda: self._daily_attendance(start_date, end_date), {}),
+            'recent_records': (lambda: self._recent_records(recent_limit), [])
+        }
+
+        def run_in_context(name, func):
+            with app.app_context():
+                started = time.time()
+                result = func()
+                app.logger.debug(f"Dashboard query {name} took {time.time() - started:.2f}s")
+                return result
+
+        futures = {
+            name: _executor.submit(run_in_context, name, func)
+            for name, (func, _) in tasks.items()
+        }
+        done, not_done = wait(futures.values(), timeout=self.deadline)
+
+        results = {}
+        for name, future in futures.items():
+            default = tasks[name][1]
+            if future in not_done:
+                future.cancel()
+                current_app.logger.warning(f"Dashboard query {name} missed the {self.deadline}s deadline")
+                results[name] = default
+            elif future.exception():
+                current_app.logger.error(f"Dashboard query {name} failed: {str(future.exception())}")
+                results[name] = default
+            else:
+                results[name] = future.result()
+
+        results['recent_records'] = self._resolve_names(results['recent_records'])
+        return results
+
+    def _class_scope(self):
+        return tuple(sorted(self.classes))
+
+    def _total_students(self):
+        if self.role == 'teacher':
+            return count_students(self._class_scope())
+        if self.role == 'student':
+            return 1  # Only themselves
+        return count_students()
+
+    def _total_subjects(self):
+        if self.role == 'teacher':
+            return count_subjects(self._class_scope())
+        if self.role == 'student':
+            return count_subjects((self.class_id,))
+        return count_subjects()
+
+    def _daily_attendance(self, start_date, end_date):
+        if self.role != 'student':
+            # Admins and teachers read the per-class rollups maintained on write
+            return get_daily_rollups(
+                start_date, end_date,
+                class_ids=self.classes if self.role == 'teacher' else None
+            )
+
+        # Students only see their own records, which is a small query
+        records = AttendanceRepository().list_in_range(
+            start_date, end_date, student_id=self.user_id, fields=STATUS_FIELDS
+        )
+
+        daily_attendance = {}
+        for record in records:
+            date = record.get('date')
+            if not date or not record.get('student_id'):
+                continue
+            counts = daily_attendance.setdefault(date, {'present': 0, 'total': 0})
+            counts['total'] += 1
+            if record.get('status') == 'PRESENT':
+                counts['present'] += 1
+        return daily_attendance
+
+    def _recent_records(self, limit):
+        # For teachers, query their assigned classes and merge the newest records
+        return AttendanceRepository().list_recent(
+            limit,
+            class_ids=self.classes if self.role == 'teacher' else None,
+            fields=RECENT_FIELDS
+        )
+
+    def _resolve_names(self, records):
+        """Fill in missing student names with one batched users lookup"""
+        missing = list({
+            r.get('student_id') for r in records
+            if not (r.get('student_name') or r.get('name')) and r.get('student_id')
+        })
+        names = {}
+        query = current_app.db.collection('users').select(['student_id', 'name'])
+        for doc in stream_where_in(query, 'student_id', missing):
+            data = doc.to_dict()
+            names[data.get('student_id')] = data.get('name', 'Unknown')
+
+        for record in records:
+            if not (record.get('student_name') or record.get('name')):
+                record['student_name'] = names.get(record.get('student_id'), 'Unknown')
+        return records
@@ -1,6 +1,7 @@
 from flask import current_app, g
 from datetime import datetime
 from app.models.user import User
+from app.services.attendance_repository import AttendanceRepository
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
@@ -134,16 +135,7 @@ class DatabaseService:
     def get_all_attendance_records(self):
         """Get all attendance records"""
         try:
-            records = []
-            query = self.db.collection('attendance').order_by('timestamp', direction='DESCENDING')
-            docs = query.stream()
-            
-            for doc in docs:
-                record = doc.to_dict()
-                record['id'] = doc.id
-                records.append(record)
-            
-            return records
+            return self._with_id(AttendanceRepository(self.db).list_by_timestamp())
         except Exception as e:
             current_app.logger.error(f"Error getting all attendance records: {str(e)}")
             return []
@@ -151,27 +143,16 @@ class DatabaseService:
     def get_attendance_records(self, student_id=None, start_date=None, end_date=None):
         """Get attendance records with filters"""
         try:
-            records = []
-            query = self.db.collection('attendance')
-            
-            if student_id:
-                query = query.where('student_id', '==', student_id)
-            
-            if start_date:
-                query = query.where('timestamp', '>=', start_date.isoformat())
-            
-            if end_date:
-                query = query.where('timestamp', '<=', end_date.isoformat())
-            
-            query = query.order_by('timestamp', direction='DESCENDING')
-            docs = query.stream()
-            
-            for doc in docs:
-                record = doc.to_dict()
-                record['id'] = doc.id
-                records.append(record)
-            
-            return records
+            return self._with_id(AttendanceRepository(self.db).list_by_timestamp(
+                student_id=student_id, start=start_date, end=end_date
+            ))
         except Exception as e:
             current_app.logger.error(f"Error getting attendance records: {str(e)}")
-            return [] 
\ No newline at end of file
+            return []
+    
+    @staticmethod
+    def _with_id(records):
+        """Expose the document ID as ``id`` as callers of this service expect"""
+        for record in records:
+            record['id'] = record.pop('doc_id')
+        return records 
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""Bounded outbound email queue.
+
+Messages are written to a spool directory before they are queued, so mail
+accepted by a worker survives restarts. Each process owns its spool files
+through a random token and holds an exclusive ``flock`` on the token's lock
+file for as long as it lives; when its workers start, a process recovers
+the files of tokens whose lock is free, i.e. whose process is gone. Unlike
+PIDs, tokens are never reused, e.g. by a restarted container. A fixed pool of
+sender threads drains the queue, reusing one SMTP connection for up to
+``MAIL_MAX_EMAILS`` queued messages. Failed sends are retried with
+exponential backoff, and deduplication keys suppress repeats of the same
+notification within ``EMAIL_DEDUP_TTL``.
+
+The spool is only as durable as its directory. ``EMAIL_SPOOL_DIR`` defaults
+to ``instance/mail_spool``, which on hosts with an ephemeral filesystem
+(e.g. Render without a disk) is wiped on every deploy or restart, losing
+mail that was accepted but not yet sent; point it at persistent storage.
+"""
+from collections import deque
+from flask_mail import Message
+import fcntl
+import heapq
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from app.services.cache_service import cache
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_FIELDS = ('subject', 'recipients', 'sender', 'cc', 'bcc', 'reply_to', 'body', 'html')
+LATENCY_SAMPLES = 1000
+
+class EmailQueueFull(Exception):
+    """Raised when the queue is at capacity and a message is rejected"""
+    pass
+
+class EmailQueue:
+    """Spooled, bounded queue with a fixed sender pool per process"""
+
+    def __init__(self):
+        self.app = None
+        self.spool_dir = None
+        self.maxsize = 1000
+        self.workers = 2
+        self.max_attempts = 5
+        self.base_delay = 30
+        self.max_delay = 1800
+        self.dedup_ttl = 86400
+        self._queue = None
+        self._retries = []
+        self._retry_cond = threading.Condition()
+        self._pid = None
+        self._owner = None
+        self._owner_fd = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counters = {}
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def init_app(self, app):
+        config = app.config
+        self.app = app
+        self.spool_dir = config.get('EMAIL_SPOOL_DIR') or os.path.join(app.instance_path, 'mail_spool')
+        self.maxsize = config.get('EMAIL_QUEUE_SIZE', 1000)
+        self.workers = config.get('EMAIL_QUEUE_WORKERS', 2)
+        self.max_attempts = config.get('EMAIL_MAX_ATTEMPTS', 5)
+        self.base_delay = config.get('EMAIL_RETRY_BASE_DELAY', 30)
+        self.max_delay = config.get('EMAIL_RETRY_MAX_DELAY', 1800)
+        self.dedup_ttl = config.get('EMAIL_DEDUP_TTL', 86400)
+        self._reset_counters()
+        # Start senders with the first request so spooled mail is recovered without waiting for new mail
+        app.before_request(self._ensure_workers)
+
+    # Spool files: {id}.{owner}.sending while owned by a process, failed/{id}.json when
+    # given up. owners/{owner}.lock is flocked by the owning process while it runs.
+
+    def _path(self, job_id, owner=None):
+        return os.path.join(self.spool_dir, f"{job_id}.{owner or self._owner}.sending")
+
+    def _owner_lock_path(self, owner):
+        return os.path.join(self.spool_dir, 'owners', f"{owner}.lock")
+
+    def _claim_owner(self):
+        """Take a fresh owner token and hold its lock for the life of the process"""
+        if self._owner_fd is not None:
+            # Inherited from the parent process; closing it here leaves the parent's lock held
+            os.close(self._owner_fd)
+        os.makedirs(os.path.join(self.spool_dir, 'owners'), exist_ok=True)
+        self._owner = uuid.uuid4().hex
+        self._owner_fd = os.open(self._owner_lock_path(self._owner), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._owner_fd, fcntl.LOCK_EX)
+
+    def _owner_alive(self, owner):
+        """Whether the process owning a token still holds its lock"""
+        try:
+            fd = os.open(self._owner_lock_path(owner), os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            # Closing releases the lock if we got it
+            os.close(fd)
+        return False
+
+    def _write(self, job):
+        path = self._path(job['id'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _remove(self, job):
+        try:
+            os.remove(self._path(job['id']))
+        except FileNotFoundError:
+            pass
+
+    def _bury(self, job):
+        failed_dir = os.path.join(self.spool_dir, 'failed')
+        os.makedirs(failed_dir, exist_ok=True)
+        try:
+            os.replace(self._path(job['id']), os.path.join(failed_dir, f"{job['id']}.json"))
+        except FileNotFoundError:
+            pass
+
+    def _recover(self):
+        """Claim spool files of dead processes and queue them again"""
+        recovered = 0
+        alive = {self._owner: True}
+        for name in sorted(os.listdir(self.spool_dir)):
+            parts = name.split('.')
+            if len(parts) != 3 or parts[2] != 'sending':
+                continue
+            job_id, owner = parts
+            if owner not in alive:
+                alive[owner] = self._owner_alive(owner)
+            if alive[owner]:
+                continue
+            try:
+                # Renaming is atomic, so only one process claims each file
+                os.replace(self._path(job_id, owner), self._path(job_id))
+                with open(self._path(job_id)) as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not recover spooled email {name}: {str(e)}")
+                continue
+            self._queue.put(job)
+            recovered += 1
+        for owner, is_alive in alive.items():
+            if not is_alive:
+                try:
+                    os.remove(self._owner_lock_path(owner))
+                except FileNotFoundError:
+                    pass
+        if recovered:
+            self._count('recovered', recovered)
+            logger.info(f"Recovered {recovered} spooled emails")
+
+    # Workers
+
+    def _ensure_workers(self):
+        """Start the sender pool once per process, including after a fork"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._claim_owner()
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._retries = []
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f'email-sender-{i}', daemon=True).start()
+            threading.Thread(target=self._schedule_retries, name='email-retry', daemon=True).start()
+            threading.Thread(target=self._recover, name='email-recovery', daemon=True).start()
+
+    def _work(self):
+        batch_size = self.app.config.get('MAIL_MAX_EMAILS') or 50
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                logger.error(f"Email sender error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _message(job):
+        fields = dict(job['message'])
+        if isinstance(fields.get('sender'), list):
+            # (name, address) senders come back from JSON as lists
+            fields['sender'] = tuple(fields['sender'])
+        return Message(**fields)
+
+    def _send_batch(self, batch):
+        # Imported here because email_service queues its mail through this module
+        from app.services.email_service import mail
+
+        handled = set()
+        with self.app.app_context():
+            try:
+                with mail.connect() as connection:
+                    for job in batch:
+                        handled.add(job['id'])
+                        try:
+                            connection.send(self._message(job))
+                        except Exception as e:
+                            self._failed(job, e)
+                        else:
+                            self._sent(job)
+            except Exception as e:
+                # Connecting failed, so the rest of the batch was never attempted
+                for job in batch:
+                    if job['id'] not in handled:
+                        self._failed(job, e)
+
+    def _sent(self, job):
+        self._remove(job)
+        self._count('sent')
+        with self._stats_lock:
+            self._latencies.append(time.time() - job['enqueued_at'])
+
+    def _failed(self, job, error):
+        job['attempts'] += 1
+        job['last_error'] = str(error)
+        if job['attempts'] >= self.max_attempts:
+            self._bury(job)
+            self._count('failed')
+            logger.error(f"Giving up on email {job['id']} to {job['message']['recipients']}: {str(error)}")
+            return
+
+        delay = min(self.base_delay * 2 ** (job['attempts'] - 1), self.max_delay)
+        delay *= random.uniform(0.5, 1.0)
+        self._write(job)
+        self._count('retried')
+        with self._retry_cond:
+            heapq.heappush(self._retries, (time.time() + delay, job['id'], job))
+            self._retry_cond.notify()
+
+    def _schedule_retries(self):
+        while True:
+            with self._retry_cond:
+                while not self._retries or self._retries[0][0] > time.time():
+                    timeout = self._retries[0][0] - time.time() if self._retries else None
+                    self._retry_cond.wait(timeout)
+                _, _, job = heapq.heappop(self._retries)
+            # Retries were already accepted, so they wait for room instead of being rejected
+            self._queue.put(job)
+
+    # Public API
+
+    def enqueue(self, msg, dedup_key=None):
+        """Spool and queue a message
+
+        Args:
+            msg: flask_mail.Message; attachments are not supported
+            dedup_key: Optional key; repeats within EMAIL_DEDUP_TTL are dropped
+
+        Returns:
+            str: Job ID, or None if the message was a duplicate
+
+        Raises:
+            EmailQueueFull: If the queue is at capacity
+        """
+        self._ensure_workers()
+        dedup_cache_key = f"email-dedup:{dedup_key}" if dedup_key else None
+        if dedup_cache_key and not cache.add(dedup_cache_key, True, timeout=self.dedup_ttl):
+            self._count('deduplicated')
+            return None
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'message': {field: getattr(msg, field) for field in MESSAGE_FIELDS},
+            'dedup_key': dedup_key,
+            'attempts': 0,
+            'enqueued_at': time.time()
+        }
+        try:
+            if self._queue.full():
+                raise queue.Full
+            self._write(job)
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._remove(job)
+            if dedup_cache_key:
+                cache.delete(dedup_cache_key)
+            self._count('rejected')
+            raise EmailQueueFull(f"Email queue is full ({self.maxsize} messages)")
+        self._count('enqueued')
+        return job['id']
+
+    # Metrics
+
+    def _reset_counters(self):
+        with self._stats_lock:
+            self._counters = {name: 0 for name in
+                              ('enqueued', 'sent', 'retried', 'failed', 'deduplicated', 'rejected', 'recovered')}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def stats(self):
+        """Queue depth, counters and send latency of this process"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+        running = self._pid == os.getpid()
+        with self._retry_cond:
+            retry_pending = len(self._retries) if running else 0
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+        return {
+            **counters,
+            'depth': self._queue.qsize() if running else 0,
+            'capacity': self.maxsize,
+            'retry_pending': retry_pending,
+            'workers': self.workers if running else 0,
+            'latency_seconds': {
+                'samples': len(latencies),
+                'avg': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1], 3) if latencies else None
+            }
+        }
+
+email_queue = EmailQueue()
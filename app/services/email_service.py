@@ -1,26 +1,22 @@
 from flask import current_app, render_template
 from flask_mail import Mail, Message
-from threading import Thread
 from datetime import datetime
+from app.services.email_queue import email_queue
 
 mail = Mail()
 
-def send_async_email(app, msg):
-    """Send email asynchronously"""
-    with app.app_context():
-        try:
-            mail.send(msg)
-        except Exception as e:
-            current_app.logger.error(f"Error sending email: {str(e)}")
-
-def send_email(subject, recipients, template, **kwargs):
-    """Send an email using a template
+def send_email(subject, recipients, template, dedup_key=None, **kwargs):
+    """Queue an email rendered from a template
     
     Args:
         subject: Email subject
         recipients: List of recipient email addresses
         template: Name of the HTML template to use
+        dedup_key: Optional key; the same key is sent at most once per EMAIL_DEDUP_TTL
         **kwargs: Variables to pass to the template
+        
+    Returns:
+        str: Queued job ID, or None for a duplicate
     """
     try:
         msg = Message(
@@ -33,11 +29,8 @@ def send_email(subject, recipients, template, **kwargs):
         msg.html = render_template(f'email/{template}.html', **kwargs)
         msg.body = render_template(f'email/{template}.txt', **kwargs)
         
-        # Send asynchronously
-        Thread(
-            target=send_async_email,
-            args=(current_app._get_current_object(), msg)
-        ).start()
+        # Sent by the queue's worker pool, with retries
+        return email_queue.enqueue(msg, dedup_key=dedup_key)
         
     except Exception as e:
         current_app.logger.error(f"Error preparing email: {str(e)}")
@@ -140,7 +133,8 @@ def send_low_attendance_alert(user_email, student_name, subject_name, attendance
             student_name=student_name,
             subject_name=subject_name,
             attendance_percentage=attendance_percentage,
-            minimum_required=75  # Minimum required attendance percentage
+            minimum_required=current_app.config.get('LOW_ATTENDANCE_THRESHOLD', 75),
+            records_url=f"{current_app.config.get('APP_BASE_URL', '').rstrip('/')}/attendance/view"
         )
     except Exception as e:
         current_app.logger.error(f"Error sending low attendance alert: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,430 @@
+"""Bulk face enrollment from a ZIP archive of photos and a CSV manifest."""
+import csv
+import hashlib
+import io
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from PIL import Image
+from flask import current_app
+from firebase_admin import firestore
+from app.services.rekognition_service import RekognitionService, enhance_image
+
+REQUIRED_COLUMNS = ['name', 'student_id', 'class', 'division']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VALID_DIVISIONS = ['A', 'B', 'C', 'D']
+JOBS_COLLECTION = 'enrollment_jobs'
+
+class EnrollmentJobRunning(Exception):
+    """Raised when another live worker owns the enrollment job"""
+    pass
+
+def _job_is_live(data, now, stale_seconds):
+    """Whether a job document belongs to a running worker that still sends heartbeats"""
+    if data.get('status') != 'running':
+        return False
+    heartbeat = data.get('heartbeat_at') or data.get('started_at')
+    try:
+        return now - datetime.fromisoformat(heartbeat) < timedelta(seconds=stale_seconds)
+    except (TypeError, ValueError):
+        return False
+
+def expire_stale_jobs(db, stale_seconds=None):
+    """Mark running jobs whose worker stopped sending heartbeats as failed
+
+    Returns:
+        int: Number of jobs expired
+    """
+    stale_seconds = stale_seconds or current_app.config.get('BULK_ENROLL_STALE_SECONDS', 300)
+
+    @firestore.transactional
+    def expire(transaction, job_ref):
+        snapshot = job_ref.get(transaction=transaction)
+        data = snapshot.to_dict() if snapshot.exists else {}
+        if data.get('status') != 'running' or _job_is_live(data, datetime.utcnow(), stale_seconds):
+            return False
+        transaction.update(job_ref, {
+            'status': 'failed',
+            'error': 'Enrollment worker stopped responding. Upload the archive again to resume',
+            'owner': None,
+            'updated_at': datetime.utcnow().isoformat()
+        })
+        return True
+
+    expired = 0
+    for doc in db.collection(JOBS_COLLECTION).where('status', '==', 'running').stream():
+        if not _job_is_live(doc.to_dict(), datetime.utcnow(), stale_seconds) and expire(db.transaction(), doc.reference):
+            current_app.logger.warning(f"Expired stale bulk enrollment job {doc.id}")
+            expired += 1
+    return expired
+
+class BulkEnrollmentService:
+    """Enroll many students from an archive with bounded concurrency.
+
+    Rows are processed by a worker pool; calls to Rekognition are limited by a
+    semaphore so the pool can prepare images without exceeding the account's
+    TPS. Enrolled students are written to Firestore in batches together with
+    their per-row report entries and the job counters, so a batch is either
+    fully recorded or not at all. Re-running the same archive skips students
+    that are already enrolled and adopts faces an interrupted run indexed but
+    did not save, which makes an interrupted job resumable. A run claims its
+    job in a transaction and keeps a heartbeat on it; a job whose heartbeat
+    stops is taken over by the next run or expired by ``expire_stale_jobs``.
+    Writes are conditional on still owning the job, and a run that loses its
+    job stops enrolling, so two workers never save the same students.
+    """
+
+    def __init__(self, db, workers=None, rekognition_concurrency=None, batch_size=None):
+        self.db = db
+        self.workers = workers or current_app.config.get('BULK_ENROLL_WORKERS', 8)
+        self.batch_size = min(batch_size or current_app.config.get('BULK_ENROLL_BATCH_SIZE', 200), 240)
+        self._rekognition_slots = threading.BoundedSemaphore(
+            rekognition_concurrency or current_app.config.get('BULK_ENROLL_REKOGNITION_CONCURRENCY', 4)
+        )
+        self.rekognition_service = RekognitionService()
+        self.heartbeat_seconds = current_app.config.get('BULK_ENROLL_HEARTBEAT_SECONDS', 30)
+        self.stale_seconds = current_app.config.get('BULK_ENROLL_STALE_SECONDS', 300)
+        self.owner = uuid.uuid4().hex
+        # Set when another worker takes the job over; the run then stops
+        self._ownership_lost = threading.Event()
+
+    @staticmethod
+    def job_id_for(archive_path, manifest_bytes):
+        """Derive a stable job ID so re-uploading the same archive resumes the job"""
+        digest = hashlib.sha256(manifest_bytes)
+        with open(archive_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()[:32]
+
+    @staticmethod
+    def read_manifest(archive, manifest_bytes=None):
+        """Read CSV rows from the uploaded manifest or the first CSV inside the archive"""
+        if manifest_bytes is None:
+            csv_names = [n for n in archive.namelist() if n.lower().endswith('.csv')]
+            if not csv_names:
+                raise ValueError("No CSV manifest provided")
+            manifest_bytes = archive.read(csv_names[0])
+
+        reader = csv.DictReader(io.StringIO(manifest_bytes.decode('utf-8-sig')))
+        fields = [f.strip().lower() for f in (reader.fieldnames or [])]
+        missing = [c for c in REQUIRED_COLUMNS if c not in fields]
+        if missing:
+            raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+
+        return [
+            {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+            for row in reader
+        ]
+
+    @staticmethod
+    def index_photos(archive):
+        """Map lower-cased photo file names and stems to archive member names"""
+        photos = {}
+        for name in archive.namelist():
+            if name.endswith('/') or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            base = os.path.basename(name).lower()
+            photos[base] = name
+            photos.setdefault(os.path.splitext(base)[0], name)
+        return photos
+
+    def existing_student_ids(self, student_ids):
+        """Look up which student IDs are already enrolled using chunked 'in' queries"""
+        existing = set()
+        ids = list(student_ids)
+        for i in range(0, len(ids), 30):
+            query = self.db.collection('users').where('student_id', 'in', ids[i:i + 30]).select(['student_id'])
+            for doc in query.stream():
+                existing.add(doc.to_dict().get('student_id'))
+        return existing
+
+    def validate_row(self, row, allowed_classes=None):
+        """Validate a manifest row the same way the single /register endpoint does"""
+        errors = [f"{c.replace('_', ' ').capitalize()} is required" for c in REQUIRED_COLUMNS if not row.get(c)]
+        if errors:
+            return None, "; ".join(errors)
+
+        try:
+            student_class = int(row['class'])
+            if not (1 <= student_class <= 12):
+                return None, "Class must be between 1 and 12"
+        except (ValueError, TypeError):
+            return None, "Invalid class format. Must be a number between 1 and 12"
+
+        division = row['division'].upper()
+        if division not in VALID_DIVISIONS:
+            return None, "Division must be A, B, C, or D"
+
+        if allowed_classes is not None and f"{student_class}-{division}" not in allowed_classes:
+            return None, "You are not authorized to register students for this class"
+
+        return {
+            'name': row['name'],
+            'student_id': row['student_id'],
+            'class': student_class,
+            'division': division
+        }, None
+
+    def _enroll_row(self, app, archive_path, photo_name, student):
+        """Prepare one photo and index it; runs on a worker thread"""
+        with app.app_context():
+            if self._ownership_lost.is_set():
+                raise EnrollmentJobRunning('Enrollment job was taken over by another worker')
+            with zipfile.ZipFile(archive_path) as archive:
+                image_bytes = archive.read(photo_name)
+
+            pil_image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            buffered = io.BytesIO()
+            enhance_image(pil_image).save(buffered, format="JPEG")
+            enhanced_image_bytes = buffered.getvalue()
+
+            sanitized_name = "".join(c if c.isalnum() or c in "_-." else "_" for c in student['name'])
+            external_image_id = f"{sanitized_name}_{student['student_id']}"
+
+            with self._rekognition_slots:
+                faces = self.rekognition_service.detect_faces(enhanced_image_bytes)
+                if not faces:
+                    raise ValueError("No face detected in the image")
+                match = self.rekognition_service.search_face(faces[0], enhanced_image_bytes)
+                if match and match['student_id'] == student['student_id']:
+                    # Indexed by an interrupted run that never saved the student; adopt it
+                    face_id = match['face_id']
+                    external_image_id = match['external_image_id']
+                elif match:
+                    raise ValueError(f"This face is already registered for student ID {match['student_id']}")
+                else:
+                    record = self.rekognition_service.index_face(enhanced_image_bytes, external_image_id)
+                    face_id = record['Face']['FaceId']
+
+            return {
+                **student,
+                'role': 'student',
+                'class_id': f"{student['class']}-{student['division']}",
+                'created_at': datetime.utcnow().isoformat(),
+                'face_id': external_image_id,
+                'rekognition_face_id': face_id
+            }
+
+    def _write_if_owner(self, job_ref, stage):
+        """Run ``stage(transaction)`` in a transaction only while this run owns the job
+
+        Raises:
+            EnrollmentJobRunning: If another worker has taken the job over
+        """
+        @firestore.transactional
+        def write(transaction):
+            snapshot = job_ref.get(['owner'], transaction=transaction)
+            if not snapshot.exists or snapshot.to_dict().get('owner') != self.owner:
+                self._ownership_lost.set()
+                raise EnrollmentJobRunning(f"Enrollment job {job_ref.id} was taken over by another worker")
+            stage(transaction)
+
+        write(self.db.transaction())
+
+    def _commit(self, job_ref, pending, report_rows, counters):
+        """Write enrolled students, their report rows and job counters in one transaction"""
+        users = self.db.collection('users')
+        student_refs = [(users.document(), student_data) for student_data in pending]
+
+        def stage(transaction):
+            for student_ref, student_data in student_refs:
+                transaction.set(student_ref, student_data)
+            for row in report_rows:
+                transaction.set(job_ref.collection('rows').document(str(row['row'])), row)
+            transaction.set(job_ref, {
+                **{key: firestore.Increment(value) for key, value in counters.items()},
+                'updated_at': datetime.utcnow().isoformat()
+            }, merge=True)
+
+        try:
+            self._write_if_owner(job_ref, stage)
+        except EnrollmentJobRunning:
+            # The new owner adopts the indexed faces on resume, so keep them
+            raise
+        except Exception:
+            # Roll back the indexed faces so the collection does not gain orphans
+            face_ids = [s['rekognition_face_id'] for s in pending]
+            if face_ids:
+                try:
+                    self.rekognition_service.delete_faces(face_ids)
+                except Exception as e:
+                    current_app.logger.error(f"Error rolling back indexed faces: {str(e)}")
+            raise
+
+    def run(self, job_id, archive_path, manifest_bytes=None, allowed_classes=None, started_by=None):
+        """Process the whole archive and return the per-row report
+
+        Raises:
+            EnrollmentJobRunning: If another live worker is running the job, or
+                takes it over while this run is in progress
+        """
+        job_ref = self.db.collection(JOBS_COLLECTION).document(job_id)
+
+        with zipfile.ZipFile(archive_path) as archive:
+            rows = self.read_manifest(archive, manifest_bytes)
+            photos = self.index_photos(archive)
+
+        self.claim(job_ref, len(rows), started_by)
+        stop_heartbeat = threading.Event()
+        threading.Thread(
+            target=self._heartbeat, args=(current_app._get_current_object(), job_ref, stop_heartbeat),
+            name=f'enrollment-heartbeat-{job_id[:8]}', daemon=True
+        ).start()
+        try:
+            return self._process(job_id, job_ref, archive_path, rows, photos, allowed_classes)
+        finally:
+            stop_heartbeat.set()
+
+    def claim(self, job_ref, total, started_by=None):
+        """Take ownership of a job unless another live worker is running it
+
+        Raises:
+            EnrollmentJobRunning: If the job is running with a fresh heartbeat
+        """
+        @firestore.transactional
+        def claim_job(transaction):
+            snapshot = job_ref.get(transaction=transaction)
+            now = datetime.utcnow()
+            if snapshot.exists and _job_is_live(snapshot.to_dict(), now, self.stale_seconds):
+                raise EnrollmentJobRunning(f"Enrollment job {job_ref.id} is already running")
+            transaction.set(job_ref, {
+                'status': 'running',
+                'owner': self.owner,
+                'heartbeat_at': now.isoformat(),
+                'total': total,
+                'processed': 0,
+                'enrolled': 0,
+                'failed': 0,
+                'skipped': 0,
+                'started_by': started_by,
+                'started_at': now.isoformat()
+            }, merge=True)
+
+        claim_job(self.db.transaction())
+
+    def _heartbeat(self, app, job_ref, stop):
+        """Refresh the job's heartbeat until the run ends or another worker takes over"""
+        while not stop.wait(self.heartbeat_seconds):
+            try:
+                snapshot = job_ref.get(['owner'])
+                if snapshot.to_dict().get('owner') != self.owner:
+                    app.logger.warning(f"Enrollment job {job_ref.id} was taken over; stopping this run")
+                    self._ownership_lost.set()
+                    return
+                job_ref.update({'heartbeat_at': datetime.utcnow().isoformat()})
+            except Exception as e:
+                app.logger.warning(f"Enrollment heartbeat failed for {job_ref.id}: {str(e)}")
+
+    def _process(self, job_id, job_ref, archive_path, rows, photos, allowed_classes):
+        """Validate and enroll the rows of a claimed job"""
+        app = current_app._get_current_object()
+        report = []
+        tasks = {}
+        already_enrolled = self.existing_student_ids({r.get('student_id') for r in rows if r.get('student_id')})
+        seen_ids = set()
+
+        for index, row in enumerate(rows, start=2):  # Row 1 is the CSV header
+            entry = {'row': index, 'student_id': row.get('student_id', ''), 'name': row.get('name', '')}
+            student, error = self.validate_row(row, allowed_classes)
+            if error:
+                report.append({**entry, 'status': 'failed', 'message': error})
+                continue
+            if student['student_id'] in already_enrolled:
+                report.append({**entry, 'status': 'skipped', 'message': 'Student already enrolled'})
+                continue
+            if student['student_id'] in seen_ids:
+                report.append({**entry, 'status': 'failed', 'message': 'Duplicate student ID in CSV'})
+                continue
+
+            photo_key = (row.get('photo') or student['student_id']).lower()
+            photo_name = photos.get(photo_key) or photos.get(os.path.splitext(photo_key)[0])
+            if not photo_name:
+                report.append({**entry, 'status': 'failed', 'message': 'Photo not found in archive'})
+                continue
+
+            seen_ids.add(student['student_id'])
+            tasks[index] = (entry, photo_name, student)
+
+        # Rows rejected before any Rekognition work are recorded up front
+        for i in range(0, len(report), self.batch_size):
+            chunk = report[i:i + self.batch_size]
+            self._commit(job_ref, [], chunk, {
+                'processed': len(chunk),
+                'failed': sum(1 for r in chunk if r['status'] == 'failed'),
+                'skipped': sum(1 for r in chunk if r['status'] == 'skipped')
+            })
+
+        pending, pending_rows = [], []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self._enroll_row, app, archive_path, photo_name, student): entry
+                for entry, photo_name, student in tasks.values()
+            }
+            for future in as_completed(futures):
+                if self._ownership_lost.is_set():
+                    # Another worker resumes the job; indexed but unsaved faces are adopted there
+                    for other in futures:
+                        other.cancel()
+                    raise EnrollmentJobRunning(f"Enrollment job {job_id} was taken over by another worker")
+                entry = futures[future]
+                try:
+                    student_data = future.result()
+                    pending.append(student_data)
+                    pending_rows.append({**entry, 'status': 'enrolled', 'message': 'Registered successfully',
+                                         'face_id': student_data['face_id']})
+                except Exception as e:
+                    pending_rows.append({**entry, 'status': 'failed', 'message': str(e)})
+
+                if len(pending_rows) >= self.batch_size:
+                    self._flush(job_ref, pending, pending_rows, report)
+                    pending, pending_rows = [], []
+
+            if pending_rows:
+                self._flush(job_ref, pending, pending_rows, report)
+
+        report.sort(key=lambda r: r['row'])
+        summary = {
+            'status': 'completed',
+            'total': len(rows),
+            'enrolled': sum(1 for r in report if r['status'] == 'enrolled'),
+            'failed': sum(1 for r in report if r['status'] == 'failed'),
+            'skipped': sum(1 for r in report if r['status'] == 'skipped'),
+            'completed_at': datetime.utcnow().isoformat()
+        }
+        self._write_if_owner(job_ref, lambda transaction: transaction.set(
+            job_ref, {'status': 'completed', 'owner': None, 'completed_at': summary['completed_at']}, merge=True
+        ))
+        current_app.logger.info(f"Bulk enrollment {job_id} finished: {summary}")
+        return {'job_id': job_id, 'summary': summary, 'rows': report}
+
+    def _flush(self, job_ref, pending, pending_rows, report):
+        """Commit a batch, marking its rows failed if the write does not go through"""
+        try:
+            self._commit(job_ref, pending, pending_rows, {
+                'processed': len(pending_rows),
+                'enrolled': sum(1 for r in pending_rows if r['status'] == 'enrolled'),
+                'failed': sum(1 for r in pending_rows if r['status'] == 'failed')
+            })
+        except EnrollmentJobRunning:
+            raise
+        except Exception as e:
+            current_app.logger.error(f"Error saving enrollment batch: {str(e)}")
+            pending_rows = [
+                {**r, 'status': 'failed', 'message': 'Failed to save student data. Please retry the job'}
+                if r['status'] == 'enrolled' else r
+                for r in pending_rows
+            ]
+        report.extend(pending_rows)
+
+    def get_job(self, job_id):
+        """Return a job's progress counters and per-row report"""
+        doc = self.db.collection(JOBS_COLLECTION).document(job_id).get()
+        if not doc.exists:
+            return None
+        rows = [r.to_dict() for r in doc.reference.collection('rows').stream()]
+        rows.sort(key=lambda r: r.get('row', 0))
+        return {'job_id': job_id, **doc.to_dict(), 'rows': rows}
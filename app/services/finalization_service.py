@@ -0,0 +1,94 @@
+"""End-of-day finalisation that records absent students explicitly."""
+import hashlib
+from datetime import datetime
+from flask import current_app
+from app.services.attendance_repository import AttendanceRepository
+from app.services.rollup_service import commit_record_changes
+
+FINALIZATION_COLLECTION = 'attendance_finalizations'
+
+def absent_doc_id(student_id, date):
+    """Deterministic ID of the ABSENT record for a student-day"""
+    return hashlib.sha1(f"{student_id}|{date}|absent".encode('utf-8')).hexdigest()
+
+class AttendanceFinalizationService:
+    """Write ABSENT records for every rostered student without a record.
+
+    Absentees are the class roster minus the students with any record for the
+    day. Their records use deterministic IDs and are committed with rollups and
+    bitmaps in chunked transactions, so re-running a day is a no-op. A student
+    recognised after finalisation updates the ABSENT record in place.
+    """
+
+    def __init__(self, db, marked_by='system'):
+        self.db = db
+        self.marked_by = marked_by
+
+    def class_ids(self):
+        """All classes that have students"""
+        query = self.db.collection('users').where('role', '==', 'student').select(['class_id'])
+        return sorted({doc.to_dict().get('class_id') for doc in query.stream()} - {None, ''})
+
+    def roster(self, class_id):
+        query = self.db.collection('users')\
+            .where('role', '==', 'student')\
+            .where('class_id', '==', class_id)\
+            .select(['student_id', 'name', 'class', 'division'])
+        students = {}
+        for doc in query.stream():
+            data = doc.to_dict()
+            if data.get('student_id'):
+                students[data['student_id']] = data
+        return students
+
+    def finalize_class_day(self, class_id, date):
+        """Record absentees of one class-day and return a summary"""
+        roster = self.roster(class_id)
+        recorded = {
+            record.get('student_id')
+            for record in AttendanceRepository(self.db).list_by_date(date, class_ids=[class_id], fields=['student_id'])
+        }
+        absent = sorted(set(roster) - recorded)
+
+        timestamp = datetime.now().isoformat()
+        collection = self.db.collection('attendance')
+        changes = [
+            (collection.document(absent_doc_id(student_id, date)), None, {
+                'student_id': student_id,
+                'student_name': roster[student_id].get('name', ''),
+                'class': roster[student_id].get('class', ''),
+                'division': roster[student_id].get('division', ''),
+                'class_id': class_id,
+                'status': 'ABSENT',
+                'date': date,
+                'timestamp': timestamp,
+                'marked_by': self.marked_by,
+                'source': 'finalization'
+            })
+            for student_id in absent
+        ]
+        commit_record_changes(self.db, changes)
+
+        summary = {
+            'class_id': class_id,
+            'date': date,
+            'roster_size': len(roster),
+            'recorded': len(recorded & set(roster)),
+            'absent_marked': len(absent),
+            'finalized_at': datetime.utcnow().isoformat(),
+            'finalized_by': self.marked_by
+        }
+        self.db.collection(FINALIZATION_COLLECTION).document(f"{date}_{class_id}").set(summary)
+        current_app.logger.info(f"Finalized {class_id} on {date}: {len(absent)} marked absent")
+        return summary
+
+    def finalize_day(self, date, class_ids=None):
+        """Finalize every class, or the given ones, for a date"""
+        summaries = []
+        for class_id in class_ids or self.class_ids():
+            try:
+                summaries.append(self.finalize_class_day(class_id, date))
+            except Exception as e:
+                current_app.logger.error(f"Error finalizing {class_id} on {date}: {str(e)}")
+                summaries.append({'class_id': class_id, 'date': date, 'error': str(e)})
+        return summaries
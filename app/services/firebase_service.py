@@ -6,6 +6,8 @@ import tempfile
 import os
 from flask import current_app
 from datetime import datetime
+from app.services.user_cache import invalidate_user
+from app.services.subject_cache import get_subjects as get_cached_subjects
 
 def initialize_firebase(credentials_base64):
     """Initialize Firebase Admin SDK with credentials
@@ -85,6 +87,7 @@ def update_user(user_id, update_data):
         # Update user document
         doc_ref = current_app.db.collection('users').document(user_id)
         doc_ref.update(update_data)
+        invalidate_user(user_id)
         
         # Return updated user data
         updated_doc = doc_ref.get()
@@ -102,6 +105,7 @@ def delete_user(user_id):
     """Delete user from Firebase"""
     try:
         current_app.db.collection('users').document(user_id).delete()
+        invalidate_user(user_id)
         return True
     except Exception as e:
         current_app.logger.error(f"Error deleting user: {str(e)}")
@@ -111,8 +115,8 @@ def get_user_subjects(user_id):
     """Get subjects associated with a user"""
     try:
         # All users can see all subjects
-        subjects = current_app.db.collection('subjects').stream()
-        return [{'id': doc.id, **doc.to_dict()} for doc in subjects]
+        subjects, _ = get_cached_subjects()
+        return subjects
     except Exception as e:
         current_app.logger.error(f"Error getting user subjects: {str(e)}")
         raise 
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""In-process fan-out of notification events to server-sent event streams.
+
+Each open stream subscribes a bounded queue under its user ID. Events are
+published to the Redis channel ``{prefix}:{user_id}``; one listener thread
+per process pattern-subscribes to every user channel and hands events to
+the local subscribers of that user. The channel uses
+``NOTIFICATION_REDIS_URL``, or the cache's Redis when ``CACHE_TYPE`` is
+redis. Without either, events are delivered to the subscribers of the
+publishing process only, so a stream served by another worker never sees
+them.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import redis
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class NotificationBroker:
+    """Per-user subscriber queues fed from Redis pub/sub"""
+
+    def __init__(self):
+        self.prefix = 'notifications'
+        self._redis_url = None
+        self._redis = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def configure(self, app):
+        self.prefix = app.config.get('NOTIFICATION_CHANNEL_PREFIX', 'notifications')
+        self._redis_url = app.config.get('NOTIFICATION_REDIS_URL')
+        if not self._redis_url and app.config.get('CACHE_TYPE') == 'redis':
+            self._redis_url = app.config.get('CACHE_REDIS_URL')
+        if not self._redis_url and not (app.debug or app.testing):
+            app.logger.warning(
+                "No Redis configured for notifications (NOTIFICATION_REDIS_URL or CACHE_TYPE=redis): "
+                "events only reach streams served by the process that created them"
+            )
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(self._redis_url)
+        return self._redis
+
+    # Subscribers
+
+    def subscribe(self, user_id):
+        """Register a queue that receives the user's events"""
+        self._ensure_listener()
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def connections(self):
+        """Number of open subscriptions in this process"""
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _deliver(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client misses events; it resyncs its badge on reconnect
+                logger.warning(f"Dropping notification event for slow subscriber of {user_id}")
+
+    # Publishing
+
+    def publish(self, user_id, event):
+        """Send an event to every open stream of a user"""
+        if not self._redis_url:
+            self._deliver(user_id, event)
+            return
+        try:
+            self._client().publish(f"{self.prefix}:{user_id}", json.dumps(event, default=str))
+        except Exception as e:
+            logger.warning(f"Notification publish failed, delivering locally: {str(e)}")
+            self._deliver(user_id, event)
+
+    def _ensure_listener(self):
+        """Start the Redis listener once per process, including after a fork"""
+        if not self._redis_url or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._redis = None
+            threading.Thread(target=self._listen, name='notification-broker', daemon=True).start()
+
+    def _listen(self):
+        channel_start = len(self.prefix) + 1
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(self._redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{self.prefix}:*")
+                for message in pubsub.listen():
+                    channel = message.get('channel')
+                    if isinstance(channel, bytes):
+                        channel = channel.decode('utf-8')
+                    try:
+                        event = json.loads(message.get('data'))
+                    except (TypeError, ValueError):
+                        continue
+                    self._deliver(channel[channel_start:], event)
+            except Exception as e:
+                logger.warning(f"Notification listener reconnecting: {str(e)}")
+                time.sleep(1)
+
+broker = NotificationBroker()
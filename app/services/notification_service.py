@@ -1,49 +1,139 @@
 from typing import List, Optional
 from datetime import datetime
-from app.models.notification import Notification, NotificationType, NotificationPriority
+from app.models.notification import Notification, NotificationType, NotificationPriority, NotificationStatus
 from app.models.approval import ApprovalRequest
+from app.services.notification_broker import broker
 from google.cloud import firestore
 
+# Firestore batches accept at most 500 writes
+BATCH_LIMIT = 500
+# Per-user {'unread': n} documents kept in step with notification status
+COUNTERS_COLLECTION = 'notification_counters'
+
 class NotificationService:
-    def __init__(self, db: firestore.Client):
+    """Notifications on the Firestore AsyncClient.
+
+    Methods are coroutines; synchronous views run them with
+    ``app.services.async_firestore.run_async``.
+    """
+
+    def __init__(self, db: firestore.AsyncClient):
         self.db = db
         self._notification_ref = self.db.collection('notifications')
 
+    def _counter_ref(self, user_id: str) -> firestore.AsyncDocumentReference:
+        return self.db.collection(COUNTERS_COLLECTION).document(user_id)
+
     async def create_notification(self, notification: Notification) -> str:
         """Create a new notification."""
-        doc_ref = self._notification_ref.document()
-        notification.id = doc_ref.id
-        await doc_ref.set(notification.to_dict())
-        return doc_ref.id
+        ids = await self.create_notifications([notification])
+        return ids[0]
+
+    async def create_notifications(self, notifications: List[Notification]) -> List[str]:
+        """Create many notifications with batched writes, bumping each user's unread counter."""
+        ids = []
+        # Every chunk may also write one counter per notification
+        chunk_size = BATCH_LIMIT // 2
+        for start in range(0, len(notifications), chunk_size):
+            batch = self.db.batch()
+            unread = {}
+            for notification in notifications[start:start + chunk_size]:
+                doc_ref = self._notification_ref.document()
+                notification.id = doc_ref.id
+                batch.set(doc_ref, notification.to_dict())
+                ids.append(doc_ref.id)
+                if notification.status == NotificationStatus.UNREAD:
+                    unread[notification.user_id] = unread.get(notification.user_id, 0) + 1
+            for user_id, count in unread.items():
+                batch.set(self._counter_ref(user_id), {'unread': firestore.Increment(count)}, merge=True)
+            await batch.commit()
+
+            for notification in notifications[start:start + chunk_size]:
+                broker.publish(notification.user_id, {
+                    'event': 'notification',
+                    'notification': {'id': notification.id, **notification.to_dict()},
+                    'unread_delta': 1 if notification.status == NotificationStatus.UNREAD else 0
+                })
+        return ids
 
     async def get_user_notifications(self, user_id: str, limit: int = 50) -> List[Notification]:
         """Get notifications for a specific user."""
         docs = await self._notification_ref.where('user_id', '==', user_id)\
-            .where('status', '!=', 'archived')\
+            .where('status', 'in', [NotificationStatus.UNREAD.value, NotificationStatus.READ.value])\
             .order_by('created_at', direction=firestore.Query.DESCENDING)\
             .limit(limit)\
             .get()
-        return [Notification.from_dict(doc.to_dict()) for doc in docs]
+        notifications = []
+        for doc in docs:
+            notification = Notification.from_dict(doc.to_dict())
+            notification.id = doc.id
+            notifications.append(notification)
+        return notifications
+
+    async def _set_status(self, notification_id: str, user_id: str, status: NotificationStatus, updates: dict) -> bool:
+        """Change the status of a user's notification, keeping the unread counter in step.
 
-    async def mark_as_read(self, notification_id: str) -> None:
-        """Mark a notification as read."""
-        await self._notification_ref.document(notification_id).update({
-            'status': 'read',
+        Runs in a transaction so concurrent reads of the same notification
+        decrement the counter once. Returns False if the user has no such
+        notification.
+        """
+        doc_ref = self._notification_ref.document(notification_id)
+        counter_ref = self._counter_ref(user_id)
+
+        @firestore.async_transactional
+        async def update(transaction):
+            # Transactions are retried on contention, so only the last attempt counts
+            changed.clear()
+            doc = await doc_ref.get(transaction=transaction)
+            if not doc.exists or doc.get('user_id') != user_id:
+                return False
+            previous = doc.get('status')
+            if previous == status.value:
+                return True
+            transaction.update(doc_ref, {'status': status.value, **updates})
+            if previous == NotificationStatus.UNREAD.value:
+                transaction.set(counter_ref, {'unread': firestore.Increment(-1)}, merge=True)
+            changed.append(previous)
+            return True
+
+        changed = []
+        found = await update(self.db.transaction())
+        if changed:
+            # Other open tabs of the user update their list and badge
+            broker.publish(user_id, {
+                'event': 'status',
+                'id': notification_id,
+                'status': status.value,
+                'unread_delta': -1 if changed[-1] == NotificationStatus.UNREAD.value else 0
+            })
+        return found
+
+    async def mark_as_read(self, notification_id: str, user_id: str) -> bool:
+        """Mark a notification as read. Returns False if the user has no such notification."""
+        return await self._set_status(notification_id, user_id, NotificationStatus.READ, {
             'read_at': datetime.utcnow()
         })
 
-    async def archive_notification(self, notification_id: str) -> None:
-        """Archive a notification."""
-        await self._notification_ref.document(notification_id).update({
-            'status': 'archived'
-        })
+    async def archive_notification(self, notification_id: str, user_id: str) -> bool:
+        """Archive a notification. Returns False if the user has no such notification."""
+        return await self._set_status(notification_id, user_id, NotificationStatus.ARCHIVED, {})
 
     async def get_unread_count(self, user_id: str) -> int:
-        """Get count of unread notifications for a user."""
-        docs = await self._notification_ref.where('user_id', '==', user_id)\
-            .where('status', '==', 'unread')\
+        """Get count of unread notifications for a user from their counter document."""
+        counter = await self._counter_ref(user_id).get()
+        if counter.exists and counter.get('unread') is not None:
+            return max(int(counter.get('unread')), 0)
+        return await self.rebuild_unread_count(user_id)
+
+    async def rebuild_unread_count(self, user_id: str) -> int:
+        """Recount unread notifications with an aggregation query and store the counter."""
+        results = await self._notification_ref.where('user_id', '==', user_id)\
+            .where('status', '==', NotificationStatus.UNREAD.value)\
+            .count()\
             .get()
-        return len(docs)
+        count = int(results[0][0].value)
+        await self._counter_ref(user_id).set({'unread': count}, merge=True)
+        return count
 
     # Specific notification creators
     async def notify_attendance_marked(self, student_id: str, class_info: dict) -> None:
@@ -64,10 +154,8 @@ class NotificationService:
 
     async def notify_admins_new_approval(self, request: ApprovalRequest) -> None:
         """Notify admins about a new approval request."""
-        # Get admin user IDs from your user service
-        admin_ids = await self._get_admin_ids()
-        
-        for admin_id in admin_ids:
+        notifications = []
+        for admin_id in await self._get_admin_ids():
             notification = Notification(
                 NotificationType.APPROVAL_REQUIRED,
                 admin_id,
@@ -80,7 +168,8 @@ class NotificationService:
                 "Review Request",
                 f"/admin/approvals/{request.id}"
             )
-            await self.create_notification(notification)
+            notifications.append(notification)
+        await self.create_notifications(notifications)
 
     async def notify_request_approved(self, request: ApprovalRequest) -> None:
         """Notify requestor that their request was approved."""
@@ -132,8 +221,8 @@ class NotificationService:
 
     async def _get_admin_ids(self) -> List[str]:
         """Get list of admin user IDs."""
-        # Implement this based on your user management system
         admin_docs = await self.db.collection('users')\
             .where('role', '==', 'admin')\
+            .select(['role'])\
             .get()
-        return [doc.id for doc in admin_docs] 
\ No newline at end of file
+        return [doc.id for doc in admin_docs]
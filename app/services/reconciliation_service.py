@@ -0,0 +1,91 @@
+"""Reconciliation between the Rekognition face collection and Firestore users."""
+import time
+from datetime import datetime
+from flask import current_app
+from app.services.rekognition_service import RekognitionService
+from app.services.enrollment_service import JOBS_COLLECTION, expire_stale_jobs
+
+class FaceReconciliationService:
+    """Find and remove drift between indexed faces and enrolled students.
+
+    Orphaned faces are faces in the collection that no user references, left
+    behind by deleted users or failed registration rollbacks. Dangling users
+    reference a ``rekognition_face_id`` that no longer exists in the
+    collection. Orphans are deleted; dangling users are only reported, since
+    they need a new photo to fix.
+    """
+
+    def __init__(self, db, rekognition_service=None):
+        self.db = db
+        self.rekognition_service = rekognition_service or RekognitionService()
+
+    def _load_user_faces(self):
+        """Fetch the face references of every user in one projected scan"""
+        face_ids = {}
+        external_ids = set()
+        query = self.db.collection('users').select(['rekognition_face_id', 'face_id'])
+        for doc in query.stream():
+            data = doc.to_dict()
+            if data.get('rekognition_face_id'):
+                face_ids[data['rekognition_face_id']] = doc.id
+            if data.get('face_id'):
+                external_ids.add(data['face_id'])
+        return face_ids, external_ids
+
+    def _enrollment_running(self):
+        """Check whether a bulk enrollment job may have indexed faces not yet saved
+
+        Jobs whose worker died are expired first, so they do not block deletes forever.
+        """
+        expire_stale_jobs(self.db)
+        running = self.db.collection(JOBS_COLLECTION).where('status', '==', 'running').limit(1).get()
+        return len(list(running)) > 0
+
+    def run(self, dry_run=False, force=False, sample_size=50):
+        """Diff the collection against users, delete orphans and return drift metrics"""
+        started = time.time()
+        faces = self.rekognition_service.list_all_faces()
+        user_face_ids, user_external_ids = self._load_user_faces()
+
+        collection_face_ids = {face['FaceId'] for face in faces}
+        orphans = [
+            face['FaceId'] for face in faces
+            if face['FaceId'] not in user_face_ids
+            # Older registrations only stored the ExternalImageId
+            and face.get('ExternalImageId') not in user_external_ids
+        ]
+        dangling = [
+            user_id for face_id, user_id in user_face_ids.items()
+            if face_id not in collection_face_ids
+        ]
+
+        skipped_reason = None
+        deleted = []
+        if orphans and not dry_run:
+            if not force and self._enrollment_running():
+                skipped_reason = 'Bulk enrollment in progress'
+            else:
+                deleted = self.rekognition_service.delete_faces(orphans)
+
+        report = {
+            'collection_id': self.rekognition_service.collection_id,
+            'run_at': datetime.utcnow().isoformat(),
+            'dry_run': dry_run,
+            'total_faces': len(faces),
+            'users_with_faces': len(user_face_ids),
+            'orphan_faces': len(orphans),
+            'deleted_faces': len(deleted),
+            'dangling_users': len(dangling),
+            'drift_ratio': round(len(orphans) / len(faces), 4) if faces else 0.0,
+            'orphan_sample': orphans[:sample_size],
+            'dangling_user_sample': dangling[:sample_size],
+            'skipped_reason': skipped_reason,
+            'duration_seconds': round(time.time() - started, 2)
+        }
+
+        self.db.collection('reconciliation_runs').add(report)
+        current_app.logger.info(
+            f"Face reconciliation: {report['total_faces']} faces, {report['orphan_faces']} orphans, "
+            f"{report['deleted_faces']} deleted, {report['dangling_users']} dangling users"
+        )
+        return report
@@ -4,6 +4,25 @@ import base64
 from io import BytesIO
 from PIL import Image, ImageEnhance
 from flask import current_app
+import cv2
+import numpy as np
+
+def enhance_image(pil_image):
+    """
+    Enhance image quality to improve face detection in distant group photos.
+    This includes increasing brightness and contrast.
+    """
+    # Convert PIL image to OpenCV format
+    cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+
+    # Increase brightness and contrast
+    alpha = 1.2  # Contrast control (1.0-3.0)
+    beta = 30    # Brightness control (0-100)
+    enhanced_cv_image = cv2.convertScaleAbs(cv_image, alpha=alpha, beta=beta)
+
+    # Convert back to PIL Image
+    enhanced_pil_image = Image.fromarray(cv2.cvtColor(enhanced_cv_image, cv2.COLOR_BGR2RGB))
+    return enhanced_pil_image
 
 class RekognitionService:
     """Service for AWS Rekognition operations"""
@@ -72,6 +91,40 @@ class RekognitionService:
             current_app.logger.error(f"Error indexing face: {str(e)}")
             raise
     
+    def list_all_faces(self, page_size=4096):
+        """Page through every face in the collection"""
+        try:
+            faces = []
+            kwargs = {'CollectionId': self.collection_id, 'MaxResults': page_size}
+            while True:
+                response = self.client.list_faces(**kwargs)
+                faces.extend(response.get('Faces', []))
+                next_token = response.get('NextToken')
+                if not next_token:
+                    return faces
+                kwargs['NextToken'] = next_token
+                
+        except Exception as e:
+            current_app.logger.error(f"Error listing faces: {str(e)}")
+            raise
+    
+    def delete_faces(self, face_ids, batch_size=4096):
+        """Delete faces from the collection in batches and return the deleted IDs"""
+        deleted = []
+        face_ids = list(face_ids)
+        try:
+            for i in range(0, len(face_ids), batch_size):
+                response = self.client.delete_faces(
+                    CollectionId=self.collection_id,
+                    FaceIds=face_ids[i:i + batch_size]
+                )
+                deleted.extend(response.get('DeletedFaces', []))
+            return deleted
+            
+        except Exception as e:
+            current_app.logger.error(f"Error deleting faces: {str(e)}")
+            raise
+    
     def detect_faces(self, image_bytes):
         """Detect faces in an image"""
         try:
@@ -195,7 +248,9 @@ class RekognitionService:
                 
                 return {
                     'student_id': student_id,
-                    'confidence': confidence
+                    'confidence': confidence,
+                    'face_id': match['Face']['FaceId'],
+                    'external_image_id': external_id
                 }
             
             return None
@@ -0,0 +1,206 @@
+"""Class × day attendance matrices for reports.
+
+A report is assembled from the monthly attendance bitmaps of a class and
+cached under a version derived from the class-day rollups, which change on
+every attendance write, and from the version of the ``students`` cache tag,
+which changes whenever the roster does. JSON, XLSX and chart endpoints all render the same
+cached matrix.
+"""
+import hashlib
+import io
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from openpyxl import Workbook
+from app.services.bitmap_service import BITMAP_COLLECTION, decode_many
+from app.services.cache_service import two_tier, make_cache_key
+from app.services.rollup_service import rollup_ref
+from app.utils.queries import stream_where_in
+
+REPORT_NAMESPACE = 'reports:class'
+REPORT_CACHE_TIMEOUT = 3600
+MAX_REPORT_DAYS = 366
+
+# Matrix cell values
+NO_RECORD = -1
+ABSENT = 0
+PRESENT = 1
+
+class ClassReport:
+    """Students × days status matrix of one class with vectorised aggregates"""
+
+    def __init__(self, class_id, dates, student_ids, names, status, version):
+        self.class_id = class_id
+        self.dates = dates
+        self.student_ids = student_ids
+        self.names = names
+        self.status = status
+        self.version = version
+
+    @property
+    def recorded(self):
+        return self.status != NO_RECORD
+
+    @property
+    def present(self):
+        return self.status == PRESENT
+
+    def day_rates(self):
+        """Present percentage per day, NaN for days without records"""
+        recorded = self.recorded.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(recorded > 0, self.present.sum(axis=0) / recorded * 100, np.nan)
+
+    def student_rates(self):
+        """Present percentage per student, NaN for students without records"""
+        recorded = self.recorded.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(recorded > 0, self.present.sum(axis=1) / recorded * 100, np.nan)
+
+    def overall_rate(self):
+        recorded = int(self.recorded.sum())
+        return round(self.present.sum() / recorded * 100, 2) if recorded else None
+
+    @staticmethod
+    def _rounded(values):
+        return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+    def to_json(self):
+        day_rates = self._rounded(self.day_rates())
+        student_rates = self._rounded(self.student_rates())
+        return {
+            'class_id': self.class_id,
+            'version': self.version,
+            'dates': self.dates,
+            'overall_rate': self.overall_rate(),
+            'days': [
+                {'date': date, 'present': int(p), 'recorded': int(r), 'rate': rate}
+                for date, p, r, rate in zip(self.dates, self.present.sum(axis=0), self.recorded.sum(axis=0), day_rates)
+            ],
+            'students': [
+                {
+                    'student_id': sid,
+                    'name': self.names.get(sid, ''),
+                    'present': int(p),
+                    'recorded': int(r),
+                    'rate': rate,
+                    'statuses': row.tolist()
+                }
+                for sid, p, r, rate, row in zip(
+                    self.student_ids, self.present.sum(axis=1), self.recorded.sum(axis=1),
+                    student_rates, self.status
+                )
+            ]
+        }
+
+    def to_chart(self):
+        """Series for the daily rate line and the student rate distribution"""
+        student_rates = self.student_rates()
+        rated = student_rates[~np.isnan(student_rates)]
+        counts, edges = np.histogram(rated, bins=10, range=(0, 100))
+        return {
+            'labels': self.dates,
+            'daily_rates': self._rounded(self.day_rates()),
+            'distribution': {
+                'labels': [f"{int(lo)}-{int(hi)}%" for lo, hi in zip(edges[:-1], edges[1:])],
+                'counts': counts.tolist()
+            }
+        }
+
+    def to_xlsx(self):
+        """Render the matrix as a workbook and return it as a BytesIO"""
+        symbols = {PRESENT: 'P', ABSENT: 'A', NO_RECORD: ''}
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Attendance')
+        sheet.append(['Student ID', 'Name'] + self.dates + ['Present', 'Recorded', 'Rate %'])
+        for sid, row, p, r, rate in zip(self.student_ids, self.status, self.present.sum(axis=1),
+                                        self.recorded.sum(axis=1), self._rounded(self.student_rates())):
+            sheet.append([sid, self.names.get(sid, '')] + [symbols[int(v)] for v in row] + [int(p), int(r), rate])
+        sheet.append(['', 'Daily rate %'] + self._rounded(self.day_rates()))
+
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        return output
+
+def _dates(start_date, end_date):
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    if end < start:
+        raise ValueError('End date must not be before start date')
+    if (end - start).days >= MAX_REPORT_DAYS:
+        raise ValueError(f"Reports cover at most {MAX_REPORT_DAYS} days")
+    return [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+
+def report_version(class_id, dates):
+    """Hash the class-day rollup timestamps and the roster version
+
+    Rollups change on every attendance write; the ``students`` tag is
+    invalidated on every student create, update and delete, so renames and
+    class moves rebuild the report too.
+    """
+    refs = [rollup_ref(date, class_id) for date in dates]
+    digest = hashlib.sha1()
+    roster = two_tier.tag_versions(['students']) or {}
+    digest.update(f"roster={roster.get('students')};".encode('utf-8'))
+    for doc in current_app.db.get_all(refs):
+        if doc.exists:
+            digest.update(f"{doc.id}={doc.to_dict().get('updated_at')};".encode('utf-8'))
+    return digest.hexdigest()
+
+def build_class_report(class_id, dates, version):
+    """Assemble the students × days matrix from roster and bitmaps"""
+    db = current_app.db
+    months = sorted({date[:7] for date in dates})
+
+    roster = db.collection('users')\
+        .where('role', '==', 'student')\
+        .where('class_id', '==', class_id)\
+        .select(['student_id', 'name'])
+    names = {}
+    for doc in roster.stream():
+        data = doc.to_dict()
+        if data.get('student_id'):
+            names[data['student_id']] = data.get('name', '')
+
+    bitmaps = db.collection(BITMAP_COLLECTION).where('class_id', '==', class_id)
+    by_month = {}
+    for doc in stream_where_in(bitmaps, 'month', months):
+        data = doc.to_dict()
+        by_month.setdefault(data['month'], []).append(data)
+
+    # Students who left the class still appear if they have records in range
+    student_ids = sorted(set(names) | {d['student_id'] for docs in by_month.values() for d in docs})
+    row_of = {sid: i for i, sid in enumerate(student_ids)}
+    status = np.full((len(student_ids), len(dates)), NO_RECORD, dtype=np.int8)
+
+    for month in months:
+        columns = [i for i, date in enumerate(dates) if date.startswith(month)]
+        days = [int(dates[i][8:]) - 1 for i in columns]
+        docs = by_month.get(month, [])
+        if not docs:
+            continue
+        recorded = decode_many([d.get('recorded') for d in docs])[:, days]
+        present = decode_many([d.get('present') for d in docs])[:, days]
+        rows = [row_of[d['student_id']] for d in docs]
+        status[np.ix_(rows, columns)] = np.where(recorded, present.astype(np.int8), NO_RECORD)
+
+    return ClassReport(class_id, dates, student_ids, names, status, version)
+
+def get_class_report(class_id, start_date, end_date):
+    """Get the report of a class for a date range, rebuilding it only when attendance changed
+
+    Raises:
+        ValueError: If the date range is malformed or too long
+    """
+    dates = _dates(start_date, end_date)
+    version = report_version(class_id, dates)
+    key = make_cache_key(class_id, start_date, end_date, version)
+
+    report = two_tier.get(REPORT_NAMESPACE, key)
+    if report is None:
+        tags = [f"class:{class_id}"]
+        versions = two_tier.tag_versions(tags)
+        report = build_class_report(class_id, dates, version)
+        two_tier.set(REPORT_NAMESPACE, key, report, timeout=REPORT_CACHE_TIMEOUT, tags=tags, versions=versions)
+    return report
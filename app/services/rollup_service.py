@@ -0,0 +1,297 @@
+"""Daily per-class attendance rollups maintained on every attendance write.
+
+Each ``attendance_rollups/{date}_{class_id}`` document holds ``present`` and
+``total`` counters for one class-day; records without a class count under
+``{date}_unassigned``. School-wide totals are summed from the class-days
+when read, so no single document is written by every attendance write.
+Writers re-read the attendance record and stage the counter
+changes in the same transaction as the write, so the rollups never drift
+from the records they count.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from firebase_admin import firestore
+from app.services.attendance_repository import AttendanceRepository, ROLLUP_FIELDS
+
+ROLLUP_COLLECTION = 'attendance_rollups'
+# Written by older versions for school-wide totals; ignored and reset by rebuilds
+ALL_CLASSES = 'all'
+UNASSIGNED = 'unassigned'
+BATCH_WRITE_LIMIT = 500
+
+def class_id_for(record):
+    """Get the "class-division" ID of an attendance or student record"""
+    if record.get('class_id'):
+        return record['class_id']
+    if record.get('class') not in (None, '') and record.get('division'):
+        return f"{record['class']}-{record['division']}"
+    return None
+
+def rollup_ref(date, class_id):
+    """Get the rollup document for a class-day"""
+    return current_app.db.collection(ROLLUP_COLLECTION).document(f"{date}_{class_id}")
+
+def accumulate_record_change(deltas, old_record=None, new_record=None):
+    """Add a record change to a {(date, class_id): [present, total]} delta map
+
+    Bulk writers accumulate many changes and stage one write per class-day
+    with ``stage_rollup_deltas``, which keeps large batches under the write
+    limit.
+    """
+    changes = []
+    if old_record:
+        changes.append((old_record, -1))
+    if new_record:
+        changes.append((new_record, 1))
+
+    for record, sign in changes:
+        date = record.get('date')
+        if not date:
+            continue
+        entry = deltas.setdefault((date, class_id_for(record) or UNASSIGNED), [0, 0])
+        entry[0] += sign * (record.get('status') == 'PRESENT')
+        entry[1] += sign
+    return deltas
+
+def stage_rollup_deltas(batch, deltas):
+    """Stage accumulated rollup deltas, skipping class-days with no net change
+
+    Returns:
+        int: Number of rollup writes staged
+    """
+    staged = 0
+    for (date, class_id), (present, total) in deltas.items():
+        if not present and not total:
+            continue
+        batch.set(rollup_ref(date, class_id), {
+            'date': date,
+            'class_id': class_id,
+            'present': firestore.Increment(present),
+            'total': firestore.Increment(total),
+            'updated_at': datetime.utcnow().isoformat()
+        }, merge=True)
+        staged += 1
+    return staged
+
+def _stage_changes(db, transaction, changes):
+    """Read the current records and stage their writes with rollups and bitmaps
+
+    Every read happens before the first write, as transactions require.
+
+    Args:
+        db: Firestore client
+        transaction: Transaction to read and stage in
+        changes: List of (doc_ref, new_record) pairs, see ``commit_record_changes``
+
+    Returns:
+        list: (old_record, new_record) pairs that were staged
+    """
+    # bitmap_service builds on this module, so import it lazily
+    from app.services.bitmap_service import read_bitmap_state, stage_bitmap_changes
+
+    refs = [doc_ref for doc_ref, _ in changes]
+    current = {doc.reference.path: doc.to_dict() if doc.exists else None for doc in transaction.get_all(refs)}
+
+    writes = []
+    for doc_ref, new_record in changes:
+        old_record = current.get(doc_ref.path)
+        if callable(new_record):
+            new_record = new_record(old_record)
+        if new_record != old_record:
+            writes.append((doc_ref, old_record, new_record))
+    if not writes:
+        return []
+
+    record_changes = [(old_record, new_record) for _, old_record, new_record in writes]
+    changed_paths = {doc_ref.path for doc_ref, _, _ in writes}
+    snapshots, survivors = read_bitmap_state(db, transaction, record_changes, changed_paths)
+
+    deltas = {}
+    for doc_ref, old_record, new_record in writes:
+        if new_record is None:
+            transaction.delete(doc_ref)
+        else:
+            transaction.set(doc_ref, new_record)
+        accumulate_record_change(deltas, old_record, new_record)
+    stage_rollup_deltas(transaction, deltas)
+    stage_bitmap_changes(db, transaction, record_changes, snapshots, survivors)
+    return record_changes
+
+def commit_record_changes(db, changes):
+    """Commit attendance writes with their rollups and bitmaps in as few transactions as fit
+
+    Each record is re-read inside the transaction, so rollup deltas and
+    bitmaps are computed from what is stored at commit time and concurrent
+    writers retry instead of double-counting.
+
+    Args:
+        db: Firestore client
+        changes: List of (doc_ref, old_record, new_record) tuples. old_record
+            is the caller's last view of the record and only sizes the
+            commits. new_record is the record to store, None to delete it, or
+            a callable receiving the current record (None if missing) and
+            returning either. Changes that leave a record as it is are skipped.
+
+    Returns:
+        list: (old_record, new_record) pairs that were written
+    """
+    from app.services.bitmap_service import bitmap_keys
+
+    if not changes:
+        return []
+    estimated = [(old_record, old_record if callable(new_record) else new_record)
+                 for _, old_record, new_record in changes]
+    deltas = {}
+    for old_record, new_record in estimated:
+        accumulate_record_change(deltas, old_record, new_record)
+
+    # Split the changes when records, rollups and bitmaps exceed one commit
+    if len(changes) + len(deltas) + len(bitmap_keys(estimated)) > BATCH_WRITE_LIMIT and len(changes) > 1:
+        middle = len(changes) // 2
+        return commit_record_changes(db, changes[:middle]) + commit_record_changes(db, changes[middle:])
+
+    @firestore.transactional
+    def write(transaction):
+        return _stage_changes(db, transaction, [(doc_ref, new_record) for doc_ref, _, new_record in changes])
+
+    return write(db.transaction())
+
+def update_record(db, doc_ref, mutate):
+    """Read, change and write one attendance record with its rollups and bitmaps in a transaction
+
+    Args:
+        db: Firestore client
+        doc_ref: Attendance document reference
+        mutate: Callable receiving the current record (None if missing) and
+            returning the new record, or None to delete it. Exceptions it
+            raises abort the transaction and propagate to the caller.
+
+    Returns:
+        tuple: (old_record, new_record); equal when nothing changed
+    """
+    @firestore.transactional
+    def write(transaction):
+        written = _stage_changes(db, transaction, [(doc_ref, mutate)])
+        if written:
+            return written[0]
+        snapshot = doc_ref.get(transaction=transaction)
+        record = snapshot.to_dict() if snapshot.exists else None
+        return record, record
+
+    return write(db.transaction())
+
+def upsert_daily_attendance(attendance_data, update_fields):
+    """Create or update a student's attendance for the day, keeping rollups in step
+
+    The lookup of the day's record runs in the same transaction as the
+    write, so two concurrent marks of a student update one record.
+
+    Args:
+        attendance_data: Full record to add when the student has no record yet
+        update_fields: Fields to update on an existing record for the same date
+
+    Returns:
+        tuple: (document ID, True if a new record was created)
+    """
+    db = current_app.db
+    repository = AttendanceRepository(db)
+    query = repository.student_on_date_query(attendance_data['student_id'], attendance_data['date']).limit(1)
+    new_ref = repository.query().document()
+
+    @firestore.transactional
+    def write(transaction):
+        existing = next(iter(transaction.get(query)), None)
+        if existing is not None:
+            _stage_changes(db, transaction, [(existing.reference, lambda old: {**old, **update_fields})])
+            return existing.id, False
+        _stage_changes(db, transaction, [(new_ref, attendance_data)])
+        return new_ref.id, True
+
+    return write(db.transaction())
+
+def get_daily_rollups(start_date, end_date, class_ids=None):
+    """Sum rollups per date for a date range
+
+    Args:
+        start_date: First date (YYYY-MM-DD), inclusive
+        end_date: Last date (YYYY-MM-DD), inclusive
+        class_ids: Classes to include, or None for the whole school
+
+    Returns:
+        dict: {date: {'present': int, 'total': int}}
+    """
+    db = current_app.db
+    if class_ids is None:
+        # The whole school is every class-day rollup in the range
+        docs = db.collection(ROLLUP_COLLECTION)\
+            .where('date', '>=', start_date)\
+            .where('date', '<=', end_date)\
+            .select(['date', 'class_id', 'present', 'total'])\
+            .stream()
+    else:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        refs = []
+        day = start
+        while day <= end:
+            refs.extend(rollup_ref(day.strftime('%Y-%m-%d'), class_id) for class_id in class_ids)
+            day += timedelta(days=1)
+        docs = db.get_all(refs)
+
+    daily = {}
+    for doc in docs:
+        if not doc.exists:
+            continue
+        data = doc.to_dict()
+        if data.get('class_id') == ALL_CLASSES:
+            continue
+        counts = daily.setdefault(data['date'], {'present': 0, 'total': 0})
+        counts['present'] += max(data.get('present', 0), 0)
+        counts['total'] += max(data.get('total', 0), 0)
+    return daily
+
+def rebuild_rollups(start_date, end_date):
+    """Recompute rollups from attendance records, e.g. to backfill history
+
+    Returns:
+        int: Number of rollup documents written
+    """
+    db = current_app.db
+    counts = {}
+    records = AttendanceRepository(db).list_in_range(start_date, end_date, fields=ROLLUP_FIELDS)
+
+    for record in records:
+        date = record.get('date')
+        if not date:
+            continue
+        entry = counts.setdefault((date, class_id_for(record) or UNASSIGNED), {'present': 0, 'total': 0})
+        entry['total'] += 1
+        if record.get('status') == 'PRESENT':
+            entry['present'] += 1
+
+    # Reset rollups whose class-day no longer has any records
+    existing = db.collection(ROLLUP_COLLECTION)\
+        .where('date', '>=', start_date)\
+        .where('date', '<=', end_date)\
+        .select(['date', 'class_id'])
+    for doc in existing.stream():
+        data = doc.to_dict()
+        counts.setdefault((data.get('date'), data.get('class_id')), {'present': 0, 'total': 0})
+
+    batch = db.batch()
+    pending = 0
+    for (date, class_id), entry in counts.items():
+        batch.set(rollup_ref(date, class_id), {
+            'date': date,
+            'class_id': class_id,
+            **entry,
+            'updated_at': datetime.utcnow().isoformat()
+        })
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return len(counts)
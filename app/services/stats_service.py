@@ -0,0 +1,29 @@
+"""Dashboard statistics backed by Firestore count() aggregations."""
+from flask import current_app
+from app.services.cache_service import cached_with_key
+from app.utils.queries import chunked
+
+STATS_CACHE_TIMEOUT = 60
+
+def _count(query):
+    """Run a server-side count() aggregation and return the integer result"""
+    result = query.count(alias='total').get()
+    return int(result[0][0].value)
+
+@cached_with_key('stats:students', timeout=STATS_CACHE_TIMEOUT, tags=['students'])
+def count_students(class_ids=None):
+    """Count students, optionally restricted to a tuple of "class-division" IDs"""
+    query = current_app.db.collection('users').where('role', '==', 'student')
+    if class_ids is None:
+        return _count(query)
+
+    return sum(_count(query.where('class_id', 'in', chunk)) for chunk in chunked(class_ids))
+
+@cached_with_key('stats:subjects', timeout=STATS_CACHE_TIMEOUT, tags=['subjects'])
+def count_subjects(class_ids=None):
+    """Count subjects, optionally restricted to a tuple of "class-division" IDs"""
+    query = current_app.db.collection('subjects')
+    if class_ids is None:
+        return _count(query)
+
+    return sum(_count(query.where('class_id', 'in', chunk)) for chunk in chunked(class_ids))
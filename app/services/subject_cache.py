@@ -0,0 +1,54 @@
+"""Versioned, per-class cache of the subjects collection."""
+import hashlib
+import json
+from flask import current_app
+from app.services.cache_service import cached_with_key, invalidate_cache
+
+SUBJECTS_TAG = 'subjects'
+SUBJECTS_CACHE_TIMEOUT = 300
+
+@cached_with_key('subjects:snapshot', timeout=SUBJECTS_CACHE_TIMEOUT, tags=[SUBJECTS_TAG])
+def get_subject_snapshot():
+    """Load every subject once, indexed by ID and by class
+
+    Returns:
+        dict: ``version`` (content hash used as the ETag), ``subjects`` sorted
+        by ID, ``by_id`` and ``by_class`` mapping class_id to subject IDs
+    """
+    subjects = sorted(
+        ({'id': doc.id, **doc.to_dict()} for doc in current_app.db.collection('subjects').stream()),
+        key=lambda s: s['id']
+    )
+    by_class = {}
+    for subject in subjects:
+        by_class.setdefault(subject.get('class_id', ''), []).append(subject['id'])
+
+    payload = json.dumps(subjects, sort_keys=True, default=str)
+    return {
+        'version': hashlib.sha1(payload.encode('utf-8')).hexdigest(),
+        'subjects': subjects,
+        'by_id': {subject['id']: subject for subject in subjects},
+        'by_class': by_class
+    }
+
+def get_subjects(class_ids=None):
+    """Get subjects, optionally only those of the given classes
+
+    Returns:
+        tuple: (list of subject dicts, version string)
+    """
+    snapshot = get_subject_snapshot()
+    if class_ids is None:
+        return snapshot['subjects'], snapshot['version']
+
+    subject_ids = [sid for class_id in class_ids for sid in snapshot['by_class'].get(class_id, [])]
+    subjects = sorted((snapshot['by_id'][sid] for sid in subject_ids), key=lambda s: s['id'])
+    return subjects, snapshot['version']
+
+def subject_exists(subject_id):
+    """Check a subject ID against the cached snapshot"""
+    return subject_id in get_subject_snapshot()['by_id']
+
+def invalidate_subjects():
+    """Drop the cached snapshot and subject counts in every worker"""
+    invalidate_cache(SUBJECTS_TAG)
@@ -0,0 +1,42 @@
+"""Cache for the user Flask-Login loads on every authenticated request."""
+from flask import current_app
+from app.models.user import User
+from app.services.cache_service import two_tier
+
+USER_CACHE_NAMESPACE = 'user_session'
+
+def _tag(user_id):
+    return f"user:{user_id}"
+
+def load_cached_user(user_id, loader):
+    """Load a user from the two-tier cache, reading Firestore only on a miss
+
+    Only the fields needed to authorise requests are cached; the password
+    hash is never stored.
+
+    Args:
+        user_id: Firestore user document ID
+        loader: Callable returning the User for an ID, or None
+
+    Returns:
+        User or None
+    """
+    data = two_tier.get(USER_CACHE_NAMESPACE, user_id)
+    if data is not None:
+        return User.from_dict(data)
+
+    # An edit while the user loads must not leave the old copy cached
+    versions = two_tier.tag_versions([_tag(user_id)])
+    user = loader(user_id)
+    if user is None:
+        return None
+    two_tier.set(
+        USER_CACHE_NAMESPACE, user_id, user.to_dict(),
+        timeout=current_app.config.get('USER_CACHE_TTL', 300),
+        tags=[_tag(user_id)], versions=versions
+    )
+    return user
+
+def invalidate_user(user_id):
+    """Drop a user from every worker's cache after an edit"""
+    two_tier.invalidate_tags(_tag(user_id))
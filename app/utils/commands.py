@@ -0,0 +1,129 @@
+"""Flask CLI commands for administrative jobs."""
+import csv
+import click
+from flask import current_app
+
+def register_commands(app):
+    """Register custom CLI commands with the application."""
+
+    @app.cli.command('enroll-bulk')
+    @click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--manifest', type=click.Path(exists=True, dir_okay=False),
+                  help='CSV of name, student_id, class, division (defaults to the CSV inside the archive)')
+    @click.option('--report', type=click.Path(dir_okay=False), help='Write the per-row report to this CSV file')
+    @click.option('--workers', type=int, help='Number of worker threads')
+    @click.option('--concurrency', type=int, help='Maximum concurrent Rekognition calls')
+    def enroll_bulk(archive, manifest, report, workers, concurrency):
+        """Enroll students from a ZIP of photos and a CSV manifest."""
+        from app.services.enrollment_service import BulkEnrollmentService
+
+        manifest_bytes = None
+        if manifest:
+            with open(manifest, 'rb') as f:
+                manifest_bytes = f.read()
+
+        service = BulkEnrollmentService(
+            current_app.db,
+            workers=workers,
+            rekognition_concurrency=concurrency
+        )
+        job_id = BulkEnrollmentService.job_id_for(archive, manifest_bytes or b'')
+        click.echo(f"Starting enrollment job {job_id}")
+        result = service.run(job_id, archive, manifest_bytes, started_by='cli')
+
+        if report:
+            with open(report, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['row', 'student_id', 'name', 'status', 'message', 'face_id'])
+                writer.writeheader()
+                for row in result['rows']:
+                    writer.writerow({key: row.get(key, '') for key in writer.fieldnames})
+            click.echo(f"Report written to {report}")
+
+        summary = result['summary']
+        click.echo(
+            f"Enrolled {summary['enrolled']}, skipped {summary['skipped']}, "
+            f"failed {summary['failed']} of {summary['total']} rows"
+        )
+
+    @app.cli.command('reconcile-faces')
+    @click.option('--dry-run', is_flag=True, help='Report drift without deleting orphaned faces')
+    @click.option('--force', is_flag=True, help='Delete orphans even while a bulk enrollment is running')
+    def reconcile_faces(dry_run, force):
+        """Delete orphaned Rekognition faces and report drift against users."""
+        from app.services.reconciliation_service import FaceReconciliationService
+
+        report = FaceReconciliationService(current_app.db).run(dry_run=dry_run, force=force)
+        click.echo(
+            f"{report['total_faces']} faces, {report['users_with_faces']} users with faces, "
+            f"{report['orphan_faces']} orphans ({report['deleted_faces']} deleted), "
+            f"{report['dangling_users']} dangling users"
+        )
+        if report['skipped_reason']:
+            click.echo(f"Orphans not deleted: {report['skipped_reason']}")
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--days', type=int, default=30, help='Number of days back from today to rebuild')
+    @click.option('--start', help='First date to rebuild (YYYY-MM-DD), overrides --days')
+    @click.option('--end', help='Last date to rebuild (YYYY-MM-DD), defaults to today')
+    def rebuild_rollups_command(days, start, end):
+        """Recompute daily attendance rollups from attendance records."""
+        from datetime import datetime, timedelta
+        from app.services.rollup_service import rebuild_rollups
+
+        end = end or datetime.now().strftime('%Y-%m-%d')
+        start = start or (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+        written = rebuild_rollups(start, end)
+        click.echo(f"Rebuilt {written} rollup documents from {start} to {end}")
+
+    @app.cli.command('rebuild-bitmaps')
+    @click.option('--start', required=True, help='First date to rebuild (YYYY-MM-DD); whole months are rebuilt')
+    @click.option('--end', help='Last date to rebuild (YYYY-MM-DD), defaults to today')
+    def rebuild_bitmaps_command(start, end):
+        """Recompute per-student monthly attendance bitmaps from attendance records."""
+        from datetime import datetime
+        from app.services.bitmap_service import rebuild_bitmaps
+
+        end = end or datetime.now().strftime('%Y-%m-%d')
+        written = rebuild_bitmaps(start, end)
+        click.echo(f"Rebuilt {written} bitmap documents for {start[:7]} to {end[:7]}")
+
+    @app.cli.command('finalize-attendance')
+    @click.option('--date', help='Date to finalize (YYYY-MM-DD), defaults to today')
+    @click.option('--class-id', 'class_ids', multiple=True, help='Class to finalize (repeatable), defaults to all')
+    def finalize_attendance_command(date, class_ids):
+        """Mark rostered students without a record as ABSENT for a day."""
+        from datetime import datetime
+        from app.services.finalization_service import AttendanceFinalizationService
+
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        summaries = AttendanceFinalizationService(current_app.db).finalize_day(date, list(class_ids) or None)
+        for summary in summaries:
+            if 'error' in summary:
+                click.echo(f"{summary['class_id']}: failed ({summary['error']})")
+            else:
+                click.echo(f"{summary['class_id']}: {summary['absent_marked']} absent of {summary['roster_size']}")
+
+    @app.cli.command('send-low-attendance-alerts')
+    @click.option('--months', type=int, help='Months to look back, including the current one')
+    @click.option('--threshold', type=float, help='Alert students below this percentage')
+    @click.option('--dry-run', is_flag=True, help='Select students without sending email')
+    def send_low_attendance_alerts_command(months, threshold, dry_run):
+        """Email students whose attendance is below the threshold."""
+        from app.services.alert_service import run_low_attendance_alerts
+
+        run_id, summary = run_low_attendance_alerts(current_app.db, months=months, threshold=threshold, dry_run=dry_run)
+        click.echo(f"Run {run_id}: {summary['candidates']} below threshold, "
+                   f"{summary['sent']} sent, {summary['failed']} failed")
+
+    @app.cli.command('backfill-class-ids')
+    @click.option('--collection', 'collections', multiple=True, default=['users', 'attendance'],
+                  help='Collection to backfill (repeatable)')
+    def backfill_class_ids_command(collections):
+        """Write class_id on users and attendance records that lack it."""
+        from app.services.backfill_service import backfill_class_ids
+
+        for collection_name in collections:
+            result = backfill_class_ids(collection_name)
+            click.echo(f"{collection_name}: updated {result['updated']} of {result['scanned']} documents")
+
+    return app
@@ -5,6 +5,8 @@ import psutil
 import firebase_admin
 import boto3
 import redis
+from app.services.cache_service import CacheService
+from app.services.email_queue import email_queue
 from functools import wraps
 import time
 
@@ -148,7 +150,9 @@ def metrics():
                 'process_memory': psutil.Process().memory_info().rss,
                 'open_files': len(psutil.Process().open_files()),
                 'threads': psutil.Process().num_threads()
-            }
+            },
+            'cache': CacheService.stats(),
+            'email_queue': email_queue.stats()
         }
         
         return jsonify(metrics_data)
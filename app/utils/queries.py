@@ -0,0 +1,18 @@
+"""Firestore query helpers."""
+
+# Firestore 'in' filters accept at most 30 values
+FIRESTORE_IN_LIMIT = 30
+
+def chunked(values, size=FIRESTORE_IN_LIMIT):
+    """Split values into lists no longer than a Firestore 'in' filter allows"""
+    values = list(values)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+def stream_where_in(query, field, values):
+    """Stream documents matching field 'in' values, one query per chunk
+
+    Results of each chunk keep the query's ordering; callers that need a
+    global order across chunks must sort the combined results themselves.
+    """
+    for chunk in chunked(values):
+        yield from query.where(field, 'in', chunk).stream()
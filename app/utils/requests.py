@@ -0,0 +1,16 @@
+"""Request class with per-endpoint body size limits."""
+from flask import Request, current_app
+
+class EndpointLimitedRequest(Request):
+    """Request whose body limit can be changed per endpoint
+
+    ``MAX_CONTENT_LENGTH_BY_ENDPOINT`` maps endpoint names to limits in bytes;
+    other endpoints use ``MAX_CONTENT_LENGTH``.
+    """
+
+    @property
+    def max_content_length(self):
+        limits = current_app.config.get('MAX_CONTENT_LENGTH_BY_ENDPOINT') or {}
+        if self.endpoint in limits:
+            return limits[self.endpoint]
+        return super().max_content_length
@@ -1,8 +1,15 @@
 from flask import Flask
 from flask_login import LoginManager
 from app.services.db_service import DatabaseService
-from app.routes import auth_bp, main_bp, admin_bp, ai_bp, recognition_bp, attendance_bp, chat_bp, teacher_bp
+from app.routes import auth_bp, main_bp, admin_bp, ai_bp, recognition_bp, attendance_bp, chat_bp, teacher_bp, notification_bp
 from app.utils.errors import register_error_handlers
+from app.utils.commands import register_commands
+from app.services.cache_service import init_cache
+from app.services.email_service import mail
+from app.services.email_queue import email_queue
+from app.services.notification_broker import broker as notification_broker
+from app.services.user_cache import load_cached_user
+from app.utils.requests import EndpointLimitedRequest
 import os
 import boto3
 
@@ -22,10 +29,39 @@ def create_app():
     app = Flask(__name__,
                 template_folder='app/templates',
                 static_folder='app/static')
+    app.request_class = EndpointLimitedRequest
     
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
     app.config['WTF_CSRF_SECRET_KEY'] = os.getenv('WTF_CSRF_SECRET_KEY', 'your-csrf-secret-key')
     app.config['WTF_CSRF_ENABLED'] = True
+    app.config['CACHE_TYPE'] = os.getenv('CACHE_TYPE', 'simple')
+    app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+    
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
+    app.config['MAIL_MAX_EMAILS'] = int(os.getenv('MAIL_MAX_EMAILS', 50))
+    app.config['APP_BASE_URL'] = os.getenv('APP_BASE_URL', os.getenv('RENDER_EXTERNAL_URL', ''))
+    app.config['EMAIL_SPOOL_DIR'] = os.getenv('EMAIL_SPOOL_DIR')
+    app.config['NOTIFICATION_REDIS_URL'] = os.getenv('NOTIFICATION_REDIS_URL')
+    
+    # Bulk enrollment archives hold thousands of photos
+    app.config['MAX_CONTENT_LENGTH_BY_ENDPOINT'] = {
+        'recognition.register_bulk': int(os.getenv('BULK_ENROLL_MAX_ARCHIVE_MB', 512)) * 1024 * 1024
+    }
+    
+    # Initialize caching used by the user loader and dashboard stats
+    init_cache(app)
+    
+    # Initialize mail and the outbound email queue
+    mail.init_app(app)
+    email_queue.init_app(app)
+    
+    # Initialize notification push over Redis pub/sub
+    notification_broker.configure(app)
     
     # Initialize Firebase Admin
     db = DatabaseService()
@@ -49,11 +85,14 @@ def create_app():
     
     @login_manager.user_loader
     def load_user(user_id):
-        return db.get_user_by_id(user_id)
+        return load_cached_user(user_id, db.get_user_by_id)
     
     # Register error handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Register Blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -63,6 +102,7 @@ def create_app():
     app.register_blueprint(attendance_bp)
     app.register_blueprint(chat_bp)
     app.register_blueprint(teacher_bp)
+    app.register_blueprint(notification_bp)
     
     return app
 
@@ -0,0 +1,36 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from app.services.attendance_import import AttendanceImportService
+
+
+def _sheet(timestamps):
+    return pd.DataFrame({
+        'student_id': [f'S{i}' for i in range(len(timestamps))],
+        'name': ['Student'] * len(timestamps),
+        'subject_id': ['math'] * len(timestamps),
+        'subject_name': ['Maths'] * len(timestamps),
+        'timestamp': timestamps,
+        'status': ['present'] * len(timestamps),
+    })
+
+
+def test_normalise_mixed_offsets_and_naive_timestamps():
+    service = AttendanceImportService(db=None, role='admin')
+    df = service.normalise(_sheet(['2024-03-01T09:00:00+05:30', '2024-03-01 10:00:00', 'not a date']))
+
+    assert df['timestamp'].tolist()[:2] == [pd.Timestamp('2024-03-01 03:30:00'), pd.Timestamp('2024-03-01 10:00:00')]
+    assert pd.isna(df['timestamp'].iloc[2])
+    assert df['date'].tolist()[:2] == ['2024-03-01', '2024-03-01']
+
+
+def test_partition_keeps_each_class_on_one_group():
+    items = [(f'doc-{i}', {'class_id': class_id, 'student_id': f'S{i % 5}'})
+             for i, class_id in enumerate(['1-A', '2-B', '1-A', '3-C', '1-A', '2-B'])]
+
+    groups = AttendanceImportService.partition(items)
+
+    assert [len(group) for group in groups] == [3, 2, 1]
+    for group in groups:
+        assert len({record['class_id'] for _, record in group}) == 1
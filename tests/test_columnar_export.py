@@ -0,0 +1,54 @@
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from app.services import columnar_export
+
+
+def _records():
+    # Each batch of three carries class/status values the others lack
+    rows = [('1', 'A', 'PRESENT'), ('2', 'B', 'ABSENT'), ('3', 'C', 'PRESENT'),
+            ('4', 'D', 'ABSENT'), ('5', 'A', 'LATE'), ('6', 'B', None),
+            ('7', 'C', 'PRESENT')]
+    return [
+        {
+            'doc_id': f'doc-{i}',
+            'date': f'2024-03-{i + 1:02d}',
+            'timestamp': f'2024-03-{i + 1:02d}T09:00:00',
+            'student_id': f'S{i}',
+            'student_name': f'Student {i}',
+            'class': cls,
+            'division': division,
+            'class_id': f'{cls}-{division}',
+            'status': status,
+            'subject_id': 'math',
+            'confidence': 95.5,
+        }
+        for i, (cls, division, status) in enumerate(rows)
+    ]
+
+
+def _read(path, file_format):
+    if file_format == 'parquet':
+        return pq.read_table(path)
+    with pa.memory_map(path) as source:
+        return ipc.open_file(source).read_all()
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_month_spanning_several_batches(tmp_path, monkeypatch, file_format):
+    monkeypatch.setattr(columnar_export, 'BATCH_ROWS', 3)
+    records = _records()
+
+    paths = columnar_export.write_partitioned(records, str(tmp_path), file_format)
+
+    assert len(paths) == 1
+    assert sorted(p.name for p in (tmp_path / 'month=2024-03').iterdir()) == [f'part-0.{file_format}']
+    table = _read(paths[0], file_format)
+    assert table.num_rows == len(records)
+    assert table.column('class').to_pylist() == [r['class'] for r in records]
+    assert table.column('class_id').to_pylist() == [r['class_id'] for r in records]
+    assert table.column('status').to_pylist() == [r['status'] for r in records]
+    assert pa.types.is_dictionary(table.schema.field('status').type)